@@ -2,13 +2,17 @@ from django.contrib import admin
 
 from .forms import UserAdminForm
 from .models import (
+    AlertaStock,
     Cita,
     Farmaco,
     HistorialMedico,
+    MovimientoStock,
     Paciente,
     Producto,
     Propietario,
     Sucursal,
+    TrabajoExportacion,
+    TrabajoImagen,
     User,
     VacunaRecomendada,
     VacunaRegistro,
@@ -175,3 +179,53 @@ class VacunaRegistroAdmin(admin.ModelAdmin):
     list_filter = ("vacuna__especie", "fecha_aplicacion")
     search_fields = ("paciente__nombre", "vacuna__nombre")
     autocomplete_fields = ("paciente", "vacuna")
+
+
+@admin.register(TrabajoExportacion)
+class TrabajoExportacionAdmin(admin.ModelAdmin):
+    list_display = ("id", "tipo", "formato", "estado", "solicitado_por", "creado", "finalizado")
+    list_filter = ("estado", "tipo", "formato")
+    search_fields = ("solicitado_por__username", "nombre_archivo")
+    readonly_fields = ("creado", "iniciado", "finalizado")
+
+
+@admin.register(TrabajoImagen)
+class TrabajoImagenAdmin(admin.ModelAdmin):
+    list_display = ("id", "ruta", "estado", "creado", "finalizado")
+    list_filter = ("estado",)
+    search_fields = ("ruta",)
+    readonly_fields = ("creado", "iniciado", "finalizado")
+
+
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(admin.ModelAdmin):
+    list_display = ("creado", "farmaco", "motivo", "cantidad", "cita", "usuario")
+    list_filter = ("motivo", "farmaco__sucursal")
+    search_fields = ("farmaco__nombre",)
+    list_select_related = ("farmaco__sucursal", "usuario")
+    raw_id_fields = ("farmaco", "cita", "usuario")
+
+    # El libro sólo se agrega desde el código: no se edita ni se borra a mano.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(AlertaStock)
+class AlertaStockAdmin(admin.ModelAdmin):
+    list_display = ("farmaco", "sucursal", "stock", "consumo_diario", "dias_restantes", "bajo_minimo", "calculado")
+    list_filter = ("sucursal", "bajo_minimo")
+    search_fields = ("farmaco__nombre",)
+    list_select_related = ("farmaco", "sucursal")
+
+    # Se regeneran con el comando calcular_alertas_stock.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
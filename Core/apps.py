@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CoreConfig(AppConfig):
@@ -8,3 +9,11 @@ class CoreConfig(AppConfig):
     def ready(self):
         # Importar señales para que se registren al iniciar la app.
         from . import signals  # noqa: F401
+        from .schema import invalidar_tras_migrate
+
+        # El registro de tablas se calcula una sola vez por proceso y se
+        # descarta cada vez que se aplican migraciones.
+        post_migrate.connect(
+            invalidar_tras_migrate,
+            dispatch_uid="core_invalidar_tablas_disponibles",
+        )
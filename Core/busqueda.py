@@ -0,0 +1,455 @@
+"""Búsqueda de texto completo sobre historiales médicos.
+
+En SQLite se usa una tabla virtual FTS5 (``core_historial_fts``) cuyo
+``rowid`` es el id del historial; las señales de ``HistorialMedico`` la
+mantienen al día y ``reconstruir_indice_historiales`` la regenera completa
+(por ejemplo después de cargas masivas con ``bulk_create``). En PostgreSQL se
+usa ``SearchVector`` sobre los mismos campos, respaldado por un índice GIN de
+expresión creado en la migración. Con cualquier otro motor, o si la tabla no
+existe, se recurre a ``icontains``.
+
+Los nombres de paciente y propietario no forman parte del índice: se buscan
+sobre ``Paciente``, que es mucho más chica que los historiales.
+
+El buscador de propietarios usa otro esquema, portable a cualquier motor: una
+tabla de trigramas (``TrigramaPropietario``) con el nombre, usuario, teléfono
+(sólo dígitos), dirección y ciudad normalizados, que permite encontrar
+prefijos y fragmentos ("garc", "5551") con una búsqueda por índice.
+
+El catálogo de la tienda sigue el mismo esquema que los historiales, con su
+propia tabla FTS5 (``core_producto_fts``) sobre nombre y descripción.
+"""
+
+import re
+import unicodedata
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import (
+    HistorialMedico,
+    Paciente,
+    Producto,
+    Propietario,
+    TrigramaPropietario,
+    solo_digitos_telefono,
+)
+from .schema import tablas_disponibles
+
+
+TABLA_FTS = "core_historial_fts"
+CAMPOS_INDEXADOS = ("diagnostico", "tratamiento", "notas", "examenes")
+CONFIGURACION_POSTGRES = "spanish"
+# Cuántas coincidencias se ordenan por relevancia; el resto va después, por
+# fecha, pero sigue en los resultados y en los totales.
+RESULTADOS_RANQUEADOS = 500
+
+TABLA_FTS_PRODUCTOS = "core_producto_fts"
+CAMPOS_PRODUCTO = ("nombre", "descripcion")
+
+_PALABRA = re.compile(r"\w+", re.UNICODE)
+
+
+def _motor(using=DEFAULT_DB_ALIAS, tabla=TABLA_FTS):
+    connection = connections[using]
+    if connection.vendor == "sqlite":
+        return "fts5" if tabla in tablas_disponibles(using) else None
+    if connection.vendor == "postgresql":
+        return "postgres"
+    return None
+
+
+def _consulta_fts(texto):
+    # Cada palabra se cita para que el usuario no pueda inyectar operadores
+    # FTS5, y se busca como prefijo ("diag" encuentra "diagnóstico").
+    palabras = _PALABRA.findall(texto)
+    return " ".join(f'"{palabra}"*' for palabra in palabras)
+
+
+def _columnas_sql(connection, campos=CAMPOS_INDEXADOS):
+    return ", ".join(connection.ops.quote_name(campo) for campo in campos)
+
+
+def _vector_postgres(campos=CAMPOS_INDEXADOS):
+    from django.contrib.postgres.search import SearchVector
+
+    # Tiene que coincidir con la expresión de los índices GIN de las
+    # migraciones 0018 y 0026 para que el planificador pueda usarlos.
+    return SearchVector(*campos, config=CONFIGURACION_POSTGRES)
+
+
+def reconstruir_indice_historiales(using=DEFAULT_DB_ALIAS) -> int:
+    """Rebuild the FTS5 index from scratch; returns how many rows were indexed.
+
+    En PostgreSQL el índice GIN lo mantiene la base y no hace falta
+    reconstruirlo, así que se devuelve 0.
+    """
+
+    if _motor(using) != "fts5":
+        return 0
+
+    connection = connections[using]
+    columnas = _columnas_sql(connection)
+    tabla = connection.ops.quote_name(HistorialMedico._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_FTS}")
+        cursor.execute(
+            f"INSERT INTO {TABLA_FTS} (rowid, {columnas}) SELECT id, {columnas} FROM {tabla}"
+        )
+        return cursor.rowcount
+
+
+def indexar_historial(historial, using=DEFAULT_DB_ALIAS):
+    if _motor(using) != "fts5":
+        return
+
+    connection = connections[using]
+    marcadores = ", ".join(["%s"] * (len(CAMPOS_INDEXADOS) + 1))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid = %s", [historial.pk])
+        cursor.execute(
+            f"INSERT INTO {TABLA_FTS} (rowid, {_columnas_sql(connection)}) VALUES ({marcadores})",
+            [historial.pk, *(getattr(historial, campo) or "" for campo in CAMPOS_INDEXADOS)],
+        )
+
+
+def desindexar_historial(historial_id, using=DEFAULT_DB_ALIAS):
+    if _motor(using) != "fts5":
+        return
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid = %s", [historial_id])
+
+
+def _q_nombres(texto):
+    pacientes = Paciente.objects.filter(
+        Q(nombre__icontains=texto)
+        | Q(propietario__user__first_name__icontains=texto)
+        | Q(propietario__user__last_name__icontains=texto)
+    ).values("id")
+    return Q(paciente_id__in=pacientes)
+
+
+def buscar_historiales(queryset, texto, using=DEFAULT_DB_ALIAS):
+    """Filter ``queryset`` by ``texto`` and order it by relevance.
+
+    Los historiales que coinciden en el texto clínico aparecen primero
+    (según ``bm25`` o ``ts_rank``) y después los que sólo coinciden por el
+    nombre del paciente o del propietario, del más reciente al más antiguo.
+    """
+
+    texto = texto.strip()
+    if not texto:
+        return queryset
+
+    motor = _motor(using)
+
+    if motor == "postgres":
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        vector = _vector_postgres()
+        consulta = SearchQuery(texto, config=CONFIGURACION_POSTGRES, search_type="websearch")
+        return (
+            queryset.annotate(busqueda=vector, relevancia=SearchRank(vector, consulta))
+            .filter(Q(busqueda=consulta) | _q_nombres(texto))
+            .order_by("-relevancia", "-fecha")
+        )
+
+    if motor == "fts5":
+        consulta = _consulta_fts(texto)
+        if not consulta:
+            return queryset.filter(_q_nombres(texto)).order_by("-fecha")
+
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s "
+                f"ORDER BY rank LIMIT {RESULTADOS_RANQUEADOS}",
+                [consulta],
+            )
+            ids = [fila[0] for fila in cursor.fetchall()]
+
+        relevancia = Case(
+            *(When(id=historial_id, then=Value(posicion)) for posicion, historial_id in enumerate(ids)),
+            default=Value(len(ids)),
+            output_field=IntegerField(),
+        )
+        # El filtro usa todas las coincidencias, no sólo las ranqueadas.
+        coincidencias = RawSQL(
+            f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s", [consulta]
+        )
+        return (
+            queryset.filter(Q(id__in=coincidencias) | _q_nombres(texto))
+            .annotate(relevancia=relevancia)
+            .order_by("relevancia", "-fecha")
+        )
+
+    return queryset.filter(
+        Q(diagnostico__icontains=texto)
+        | Q(tratamiento__icontains=texto)
+        | Q(notas__icontains=texto)
+        | Q(examenes__icontains=texto)
+        | _q_nombres(texto)
+    )
+
+
+# ----------------------------
+# Productos
+# ----------------------------
+
+
+def reconstruir_indice_productos(using=DEFAULT_DB_ALIAS) -> int:
+    """Rebuild the catalog FTS5 index; returns how many products were indexed."""
+
+    if _motor(using, TABLA_FTS_PRODUCTOS) != "fts5":
+        return 0
+
+    connection = connections[using]
+    columnas = _columnas_sql(connection, CAMPOS_PRODUCTO)
+    tabla = connection.ops.quote_name(Producto._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_FTS_PRODUCTOS}")
+        cursor.execute(
+            f"INSERT INTO {TABLA_FTS_PRODUCTOS} (rowid, {columnas}) "
+            f"SELECT id, {columnas} FROM {tabla}"
+        )
+        return cursor.rowcount
+
+
+def indexar_producto(producto, using=DEFAULT_DB_ALIAS):
+    if _motor(using, TABLA_FTS_PRODUCTOS) != "fts5":
+        return
+
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_FTS_PRODUCTOS} WHERE rowid = %s", [producto.pk])
+        cursor.execute(
+            f"INSERT INTO {TABLA_FTS_PRODUCTOS} "
+            f"(rowid, {_columnas_sql(connection, CAMPOS_PRODUCTO)}) VALUES (%s, %s, %s)",
+            [producto.pk, producto.nombre or "", producto.descripcion or ""],
+        )
+
+
+def desindexar_producto(producto_id, using=DEFAULT_DB_ALIAS):
+    if _motor(using, TABLA_FTS_PRODUCTOS) != "fts5":
+        return
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_FTS_PRODUCTOS} WHERE rowid = %s", [producto_id])
+
+
+def buscar_productos(queryset, texto, using=DEFAULT_DB_ALIAS):
+    """Filter ``queryset`` to the products whose name or description match ``texto``.
+
+    Como en los historiales, cada palabra se busca como prefijo ("alim"
+    encuentra "Alimento") y sin distinguir acentos; el orden lo decide quien
+    llama.
+    """
+
+    texto = texto.strip()
+    if not texto:
+        return queryset
+
+    motor = _motor(using, TABLA_FTS_PRODUCTOS)
+
+    if motor == "postgres":
+        from django.contrib.postgres.search import SearchQuery
+
+        consulta = SearchQuery(texto, config=CONFIGURACION_POSTGRES, search_type="websearch")
+        return queryset.annotate(busqueda=_vector_postgres(CAMPOS_PRODUCTO)).filter(
+            busqueda=consulta
+        )
+
+    if motor == "fts5":
+        consulta = _consulta_fts(texto)
+        if not consulta:
+            return queryset.none()
+        # Subconsulta en lugar de traer los ids: se resuelve en un solo viaje.
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {TABLA_FTS_PRODUCTOS} WHERE {TABLA_FTS_PRODUCTOS} MATCH %s",
+                [consulta],
+            )
+        )
+
+    return queryset.filter(Q(nombre__icontains=texto) | Q(descripcion__icontains=texto))
+
+
+# ----------------------------
+# Propietarios
+# ----------------------------
+
+_TERMINO = re.compile(r"[a-z0-9]+")
+
+
+def normalizar_texto(valor: str) -> str:
+    """Lowercase ``valor`` and strip accents ("García" -> "garcia")."""
+
+    descompuesto = unicodedata.normalize("NFKD", valor or "")
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def _terminos(valor: str) -> list:
+    return _TERMINO.findall(normalizar_texto(valor))
+
+
+def terminos_propietario(propietario) -> set:
+    """Return the normalized words indexed for ``propietario``."""
+
+    user = propietario.user
+    terminos = set()
+    for valor in (
+        user.first_name,
+        user.last_name,
+        user.username,
+        propietario.direccion,
+        propietario.ciudad,
+    ):
+        terminos.update(_terminos(valor))
+    for telefono in (propietario.telefono, user.telefono):
+        digitos = solo_digitos_telefono(telefono)
+        if digitos:
+            terminos.add(digitos)
+    return terminos
+
+
+def _trigramas_termino(termino: str) -> set:
+    # Igual que pg_trgm: dos espacios al inicio marcan el comienzo de palabra.
+    relleno = f"  {termino} "
+    return {relleno[i : i + 3] for i in range(len(relleno) - 2)}
+
+
+def _trigramas_consulta(termino: str):
+    """Return (required, bonus) trigrams for one query word.
+
+    Con tres o más caracteres alcanza con que la palabra aparezca en
+    cualquier parte; los trigramas de inicio de palabra sólo suman puntaje.
+    Con menos caracteres se exige que sea el comienzo de una palabra.
+    """
+
+    if len(termino) >= 3:
+        requeridos = {termino[i : i + 3] for i in range(len(termino) - 2)}
+        return requeridos, {f"  {termino[0]}", f" {termino[:2]}"}
+    return {f" {termino}" if len(termino) == 2 else f"  {termino}"}, set()
+
+
+def _coincide(termino, terminos_indexados):
+    if len(termino) >= 3:
+        return any(termino in indexado for indexado in terminos_indexados)
+    return any(indexado.startswith(termino) for indexado in terminos_indexados)
+
+
+def _trigramas_propietario(propietario) -> set:
+    trigramas = set()
+    for termino in terminos_propietario(propietario):
+        trigramas |= _trigramas_termino(termino)
+    return trigramas
+
+
+def indexar_propietario(propietario):
+    TrigramaPropietario.objects.filter(propietario=propietario).delete()
+    TrigramaPropietario.objects.bulk_create(
+        [
+            TrigramaPropietario(propietario=propietario, trigrama=t)
+            for t in _trigramas_propietario(propietario)
+        ]
+    )
+
+
+def reconstruir_indice_propietarios(tamanio_lote=500, using=DEFAULT_DB_ALIAS) -> int:
+    """Rebuild the owner trigram index; returns how many owners were indexed.
+
+    Se inserta con ``executemany`` sobre tuplas: con cientos de miles de
+    propietarios son millones de filas y armar una instancia por trigrama
+    dominaba el tiempo de la reconstrucción.
+    """
+
+    connection = connections[using]
+    opciones = TrigramaPropietario._meta
+    sql = "INSERT INTO {} ({}, {}) VALUES (%s, %s)".format(
+        connection.ops.quote_name(opciones.db_table),
+        connection.ops.quote_name(opciones.get_field("propietario").column),
+        connection.ops.quote_name(opciones.get_field("trigrama").column),
+    )
+
+    TrigramaPropietario.objects.using(using).all().delete()
+    indexados = 0
+    filas = []
+    propietarios = Propietario.objects.using(using).select_related("user").order_by("id")
+    with connection.cursor() as cursor:
+        for propietario in propietarios.iterator(chunk_size=tamanio_lote):
+            filas.extend((propietario.pk, t) for t in _trigramas_propietario(propietario))
+            indexados += 1
+            if len(filas) >= tamanio_lote * 20:
+                cursor.executemany(sql, filas)
+                filas = []
+        if filas:
+            cursor.executemany(sql, filas)
+    return indexados
+
+
+def buscar_propietarios(texto, limite=None, queryset=None):
+    """Return owners matching ``texto`` ordered by relevance.
+
+    Primero se resuelven los candidatos sobre la tabla de trigramas (un
+    ``GROUP BY`` sobre el índice) y después se confirma cada candidato en
+    Python, porque dos trigramas pueden venir de palabras distintas.
+    """
+
+    palabras = _terminos(texto)
+    if not palabras:
+        return []
+
+    requeridos, bonus = set(), set()
+    for palabra in palabras:
+        palabra_requeridos, palabra_bonus = _trigramas_consulta(palabra)
+        requeridos |= palabra_requeridos
+        bonus |= palabra_bonus
+
+    candidatos = (
+        TrigramaPropietario.objects.filter(trigrama__in=requeridos | bonus)
+        .values("propietario_id")
+        .annotate(
+            requeridos=Count("trigrama", filter=Q(trigrama__in=requeridos)),
+            puntaje=Count("trigrama"),
+        )
+        .filter(requeridos=len(requeridos))
+        .order_by("-puntaje", "propietario_id")
+    )
+    if queryset is None:
+        queryset = Propietario.objects.all()
+    queryset = queryset.select_related("user")
+
+    # Con límite se leen candidatos por lotes hasta juntar ``limite``
+    # verificados, para que los que se descartan al verificar no desplacen
+    # coincidencias reales.
+    tamanio_lote = limite * 3 if limite is not None else None
+    puntajes = {}
+    resultados = []
+    inicio = 0
+    while True:
+        lote = candidatos if tamanio_lote is None else candidatos[inicio : inicio + tamanio_lote]
+        puntajes_lote = {fila["propietario_id"]: fila["puntaje"] for fila in lote}
+        if not puntajes_lote:
+            break
+        puntajes.update(puntajes_lote)
+        resultados.extend(
+            propietario
+            for propietario in queryset.filter(id__in=puntajes_lote)
+            if all(_coincide(p, terminos_propietario(propietario)) for p in palabras)
+        )
+        if (
+            tamanio_lote is None
+            or len(puntajes_lote) < tamanio_lote
+            or len(resultados) >= limite
+        ):
+            break
+        inicio += tamanio_lote
+
+    resultados.sort(
+        key=lambda propietario: (
+            -puntajes[propietario.id],
+            normalizar_texto(propietario.user.get_full_name() or propietario.user.username),
+        )
+    )
+    return resultados[:limite] if limite is not None else resultados
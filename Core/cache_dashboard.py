@@ -0,0 +1,106 @@
+"""Caché por rol, sucursal y usuario para las secciones del dashboard.
+
+Los administradores recargan el dashboard todo el tiempo y cada carga
+repetía conteos, agregados y listados. Acá se guardan en el framework de
+caché de Django, tanto datos de contexto (``contexto_en_cache``) como HTML
+ya renderizado (la etiqueta ``{% seccion_dashboard %}`` de
+``templatetags/cache_dashboard.py``), con un TTL corto.
+
+Las claves llevan el rol, el alcance (la sucursal del usuario, o ``todas``
+para superusuarios y usuarios sin sucursal), el usuario y dos versiones:
+una global y otra del alcance. Las señales no borran claves sueltas sino
+que cambian la versión de las sucursales tocadas y la de ``todas`` al
+confirmar la transacción, así que las entradas viejas dejan de leerse y
+vencen solas. Sólo se usan ``get``/``set``/``add``, lo que funciona igual
+con la caché en memoria local que con la basada en archivos.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .instrumentacion import contar_cache
+from .models import Cita
+
+DASHBOARD_CACHE_SEGUNDOS = 60
+ALCANCE_GLOBAL = "global"
+ALCANCE_TODAS = "todas"
+
+
+def _clave_version(alcance):
+    return f"core:dashboard:version:{alcance}"
+
+
+def alcance_usuario(user):
+    if user.is_superuser or not getattr(user, "sucursal_id", None):
+        return ALCANCE_TODAS
+    return user.sucursal_id
+
+
+def _versiones(*alcances):
+    claves = [_clave_version(alcance) for alcance in alcances]
+    versiones = cache.get_many(claves)
+    for clave in claves:
+        if clave not in versiones:
+            # Una versión nueva nunca coincide con una anterior desalojada.
+            cache.add(clave, time.time_ns(), None)
+            versiones[clave] = cache.get(clave)
+    return ".".join(str(versiones[clave]) for clave in claves)
+
+
+def clave_seccion(user, seccion):
+    alcance = alcance_usuario(user)
+    return (
+        f"core:dashboard:{seccion}:{user.rol}:{alcance}:{user.pk}:"
+        f"{_versiones(ALCANCE_GLOBAL, alcance)}"
+    )
+
+
+def leer_seccion(clave):
+    valor = cache.get(clave)
+    contar_cache(valor is not None)
+    return valor
+
+
+def guardar_seccion(clave, valor):
+    cache.set(clave, valor, DASHBOARD_CACHE_SEGUNDOS)
+
+
+def contexto_en_cache(user, seccion, calcular):
+    """Return ``calcular()`` from the cache, computing and storing it on a miss."""
+
+    clave = clave_seccion(user, seccion)
+    valor = leer_seccion(clave)
+    if valor is None:
+        valor = calcular()
+        guardar_seccion(clave, valor)
+    return valor
+
+
+def sucursales_de_paciente(paciente_id):
+    return set(
+        Cita.objects.filter(paciente_id=paciente_id)
+        .values_list("sucursal_id", flat=True)
+        .distinct()
+    )
+
+
+def invalidar_dashboard(*sucursal_ids, todo=False):
+    """Retire the cached sections of ``sucursal_ids`` once the transaction commits.
+
+    Siempre incluye el alcance ``todas``; con ``todo=True`` (datos que no
+    pertenecen a ninguna sucursal, como los productos) se invalida todo.
+    Hacerlo antes del commit dejaría que otro request vuelva a cachear los
+    datos viejos con la transacción todavía abierta.
+    """
+
+    if todo:
+        alcances = {ALCANCE_GLOBAL}
+    else:
+        alcances = {ALCANCE_TODAS} | {sucursal_id for sucursal_id in sucursal_ids if sucursal_id}
+    transaction.on_commit(
+        lambda: cache.set_many(
+            {_clave_version(alcance): time.time_ns() for alcance in alcances}, None
+        )
+    )
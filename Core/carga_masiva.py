@@ -0,0 +1,290 @@
+"""Ayudas para cargas masivas con ``bulk_create``.
+
+``bulk_create`` no llama a ``save()`` ni dispara señales, así que quien lo
+use tiene que completar a mano lo que esas rutas harían: el teléfono
+normalizado, la contraseña ya hasheada, los campos ``auto_now_add`` que
+queremos fijar y, al terminar, los datos derivados (índices de búsqueda,
+resúmenes del módulo de análisis, paneles de propietario y el libro de
+stock).
+
+``cargar_fixture`` usa todo eso para cargar un archivo JSONL: una fila por
+línea, con el modelo en ``"modelo"``, un alias opcional en ``"ref"`` para
+que otras filas lo referencien como ``"@alias"`` en sus claves foráneas y
+fechas relativas a hoy como ``{"dias": -3, "horas": 2}``.
+"""
+
+import json
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import islice
+
+from django.apps import apps
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .busqueda import (
+    reconstruir_indice_historiales,
+    reconstruir_indice_productos,
+    reconstruir_indice_propietarios,
+)
+from .catalogo import invalidar_catalogo
+from .inventario import invalidar_inventario
+from .models import (
+    Cita,
+    CitaFarmaco,
+    Farmaco,
+    MovimientoStock,
+    Propietario,
+    Sucursal,
+    User,
+    solo_digitos_telefono,
+)
+from .panel_propietario import recalcular_paneles
+from .resumenes import recalcular_resumenes
+
+TAMANIO_LOTE = 2000
+CONTRASENA_SINTETICA = "sabueso123"
+# make_password(CONTRASENA_SINTETICA) con PBKDF2, guardado para que generar
+# usuarios sintéticos no pague ni siquiera un hash por proceso.
+HASH_SINTETICO = (
+    "pbkdf2_sha256$1000000$fKzR0fsLmFPGKzpFQnnzkC$tVAKMbCVhdAG1T+qaezGh4H1QMjgRAkb/1RuiqlyzGk="
+)
+DIAS_POR_RECALCULO = 14
+
+
+def en_lotes(iterable, tamanio=TAMANIO_LOTE):
+    iterador = iter(iterable)
+    while lote := list(islice(iterador, tamanio)):
+        yield lote
+
+
+@lru_cache(maxsize=None)
+def hash_contrasena(contrasena=CONTRASENA_SINTETICA):
+    """Hash ``contrasena`` once per process and reuse it for every user.
+
+    La contraseña sintética usa el hash precalculado mientras PBKDF2 siga
+    en ``PASSWORD_HASHERS``; si no, no se podría verificar al iniciar sesión.
+    """
+
+    if contrasena == CONTRASENA_SINTETICA:
+        try:
+            identify_hasher(HASH_SINTETICO)
+        except ValueError:
+            pass
+        else:
+            return HASH_SINTETICO
+    return make_password(contrasena)
+
+
+def completar_telefono(objeto):
+    objeto.telefono_normalizado = solo_digitos_telefono(objeto.telefono)[:20]
+    return objeto
+
+
+@contextmanager
+def sin_auto_now(modelo, *campos):
+    """Let ``bulk_create`` keep explicit values on ``auto_now_add`` fields."""
+
+    originales = []
+    for nombre in campos:
+        campo = modelo._meta.get_field(nombre)
+        originales.append((campo, campo.auto_now_add))
+        campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, valor in originales:
+            campo.auto_now_add = valor
+
+
+def registrar_ingresos_iniciales(farmacos):
+    """Open the stock ledger for drugs created with ``bulk_create``."""
+
+    return MovimientoStock.objects.bulk_create(
+        [
+            MovimientoStock(
+                farmaco_id=farmaco.pk,
+                cantidad=farmaco.stock,
+                motivo=MovimientoStock.Motivo.INGRESO,
+            )
+            for farmaco in farmacos
+            if farmaco.stock
+        ],
+        batch_size=TAMANIO_LOTE,
+    )
+
+
+def completar_propietarios():
+    """Create the ``Propietario`` profile ``bootstrap_related_profiles`` would have."""
+
+    return Propietario.objects.bulk_create(
+        [
+            completar_telefono(
+                Propietario(user_id=pk, telefono=telefono, direccion=direccion)
+            )
+            for pk, telefono, direccion in User.objects.filter(
+                rol="OWNER", propietario__isnull=True
+            ).values_list("pk", "telefono", "direccion")
+        ],
+        batch_size=TAMANIO_LOTE,
+    )
+
+
+def vaciar_tablas(using=DEFAULT_DB_ALIAS):
+    """Empty every table of the app in one flush instead of model by model.
+
+    ``Model.objects.all().delete()`` junta en memoria todo lo que borra en
+    cascada y dispara señales fila por fila. Acá se usa el mismo SQL que
+    ``manage.py flush`` (``TRUNCATE`` en PostgreSQL, ``DELETE`` en SQLite),
+    limitado a las tablas de Core más el log del admin y las sesiones, que
+    apuntan a usuarios que dejan de existir.
+    """
+
+    sucursales = list(Sucursal.objects.using(using).values_list("pk", flat=True))
+    modelos = list(apps.get_app_config("Core").get_models(include_auto_created=True))
+    for app in ("admin", "sessions"):
+        if apps.is_installed(f"django.contrib.{app}"):
+            modelos.extend(apps.get_app_config(app).get_models())
+
+    connection = connections[using]
+    connection.ops.execute_sql_flush(
+        connection.ops.sql_flush(
+            no_style(),
+            [modelo._meta.db_table for modelo in modelos],
+            reset_sequences=True,
+            allow_cascade=True,
+        )
+    )
+    invalidar_inventario(*sucursales)
+    invalidar_catalogo()
+
+
+def _valor_fixture(campo, valor, referencias):
+    if campo.is_relation:
+        if not (isinstance(valor, str) and valor.startswith("@")):
+            raise ValueError(f"{campo.name}: se esperaba una referencia '@alias', no {valor!r}")
+        try:
+            return referencias[valor[1:]]
+        except KeyError:
+            raise ValueError(f"{campo.name}: la referencia {valor} no está definida antes") from None
+    if isinstance(valor, dict):
+        desplazamiento = timedelta(days=valor.get("dias", 0), hours=valor.get("horas", 0))
+        if isinstance(campo, models.DateTimeField):
+            return timezone.now() + desplazamiento
+        return timezone.localdate() + desplazamiento
+    if campo.attname == "password" and campo.model is User:
+        return hash_contrasena(valor)
+    return campo.to_python(valor)
+
+
+def _objeto_fixture(modelo, fila, referencias):
+    objeto = modelo()
+    for nombre, valor in fila.items():
+        campo = modelo._meta.get_field(nombre)
+        setattr(objeto, campo.attname, _valor_fixture(campo, valor, referencias))
+    if hasattr(objeto, "telefono_normalizado"):
+        completar_telefono(objeto)
+    return objeto
+
+
+def _insertar(modelo, pendientes, referencias):
+    creados = modelo.objects.bulk_create([objeto for _ref, objeto in pendientes])
+    for (ref, _objeto), creado in zip(pendientes, creados):
+        if ref:
+            referencias[ref] = creado.pk
+    if modelo is Farmaco:
+        registrar_ingresos_iniciales(creados)
+        invalidar_inventario(*{farmaco.sucursal_id for farmaco in creados})
+    return len(creados)
+
+
+def cargar_fixture(ruta):
+    """Insert the rows of a JSONL fixture with one ``bulk_create`` per run of a model.
+
+    Las filas consecutivas del mismo modelo se insertan juntas, así que una
+    fila sólo puede referenciar alias de filas de líneas anteriores y de
+    otro tramo. No corre ``save()`` ni señales: los perfiles de propietario
+    que falten, el libro de stock, los índices y los resúmenes se completan
+    aparte (ver ``cargar_datos``).
+    """
+
+    referencias = {}
+    creados = Counter()
+    modelo, pendientes = None, []
+    with open(ruta, encoding="utf-8") as archivo:
+        for numero, linea in enumerate(archivo, start=1):
+            if not linea.strip():
+                continue
+            try:
+                fila = json.loads(linea)
+                siguiente = apps.get_model("Core", fila.pop("modelo"))
+                ref = fila.pop("ref", None)
+                if pendientes and (siguiente is not modelo or len(pendientes) >= TAMANIO_LOTE):
+                    creados[modelo.__name__] += _insertar(modelo, pendientes, referencias)
+                    pendientes = []
+                modelo = siguiente
+                pendientes.append((ref, _objeto_fixture(modelo, fila, referencias)))
+            except (KeyError, LookupError, ValueError, FieldDoesNotExist, ValidationError) as error:
+                raise ValueError(f"{ruta}, línea {numero}: {error}") from error
+    if pendientes:
+        creados[modelo.__name__] += _insertar(modelo, pendientes, referencias)
+    return dict(creados)
+
+
+def cargar_datos(ruta, informar=None):
+    """Replace every row of the app with the contents of ``ruta``."""
+
+    with transaction.atomic():
+        vaciar_tablas()
+        creados = Counter(cargar_fixture(ruta))
+        creados["Propietario"] += len(completar_propietarios())
+        reconstruir_derivados(informar)
+    return {modelo: total for modelo, total in creados.items() if total}
+
+
+def _dia(valor):
+    return timezone.localdate(valor) if isinstance(valor, datetime) else valor
+
+
+def _rango_dias():
+    extremos = [
+        _dia(valor)
+        for valor in (
+            *Cita.objects.aggregate(
+                Min("fecha_solicitada"), Max("fecha_solicitada"), Min("fecha_hora"), Max("fecha_hora")
+            ).values(),
+            *CitaFarmaco.objects.aggregate(Min("registrado"), Max("registrado")).values(),
+        )
+        if valor is not None
+    ]
+    return (min(extremos), max(extremos)) if extremos else (None, None)
+
+
+def reconstruir_derivados(informar=None):
+    """Rebuild everything signals would have maintained after a bulk load."""
+
+    informar = informar or (lambda mensaje: None)
+
+    informar(f"Propietarios indexados: {reconstruir_indice_propietarios()}")
+    informar(f"Historiales indexados: {reconstruir_indice_historiales()}")
+    informar(f"Productos indexados: {reconstruir_indice_productos()}")
+
+    # Los resúmenes se recalculan por tramos para no cargar todo en memoria.
+    desde, hasta = _rango_dias()
+    filas = 0
+    while desde is not None and desde <= hasta:
+        tramo = [desde + timedelta(days=n) for n in range(DIAS_POR_RECALCULO)]
+        filas += recalcular_resumenes(dia for dia in tramo if dia <= hasta)
+        desde += timedelta(days=DIAS_POR_RECALCULO)
+    informar(f"Filas de resumen generadas: {filas}")
+
+    paneles = 0
+    for lote in en_lotes(Propietario.objects.values_list("pk", flat=True).iterator()):
+        paneles += len(recalcular_paneles(lote))
+    informar(f"Paneles de propietario: {paneles}")
@@ -0,0 +1,103 @@
+"""Catálogo de la tienda guardado en caché y versionado.
+
+La tienda es pública, se lee mucho más de lo que se edita y sólo cambia
+cuando un administrador guarda un producto. Los listados por categoría, los
+resultados de búsqueda y el detalle con sus productos relacionados se
+guardan en el framework de caché bajo claves que llevan la versión del
+catálogo; guardar o borrar un ``Producto`` cambia la versión al confirmar la
+transacción, así que las entradas viejas dejan de leerse y vencen solas.
+
+La versión es un ``time.time_ns()``: las vistas la usan como ``ETag`` y su
+hora como ``Last-Modified`` para que navegadores y proxies puedan reutilizar
+las páginas de los visitantes anónimos.
+"""
+
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .busqueda import buscar_productos
+from .instrumentacion import contar_cache
+from .models import Producto
+
+CATALOGO_CACHE_SEGUNDOS = 10 * 60
+# Cuánto pueden reutilizar las páginas navegadores y proxies sin preguntar.
+CATALOGO_PUBLICO_SEGUNDOS = 60
+CLAVE_VERSION = "core:catalogo:version"
+RELACIONADOS = 4
+
+
+def version_catalogo():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Una versión nueva nunca coincide con una anterior desalojada.
+        version = time.time_ns()
+        if not cache.add(CLAVE_VERSION, version, None):
+            version = cache.get(CLAVE_VERSION, version)
+    return version
+
+
+def actualizado_catalogo(version):
+    """Return the version as an aware datetime, truncated to whole seconds."""
+
+    return datetime.fromtimestamp(version // 10**9, tz=dt_timezone.utc)
+
+
+def _en_cache(clave, calcular):
+    valor = cache.get(clave)
+    contar_cache(valor is not None)
+    if valor is None:
+        valor = calcular()
+        if valor is not None:
+            cache.set(clave, valor, CATALOGO_CACHE_SEGUNDOS)
+    return valor
+
+
+def productos_catalogo(categoria=None, busqueda=""):
+    """Return the available products of ``categoria`` matching ``busqueda``, by name."""
+
+    if categoria not in dict(Producto.CATEGORIAS):
+        categoria = None
+    busqueda = busqueda.strip()
+
+    def calcular():
+        productos = Producto.objects.filter(disponible=True)
+        if categoria:
+            productos = productos.filter(categoria=categoria)
+        return list(buscar_productos(productos, busqueda).order_by("nombre"))
+
+    # La búsqueda es texto libre: se resume para acotar el largo de la clave.
+    huella = hashlib.md5(busqueda.encode(), usedforsecurity=False).hexdigest()
+    clave = f"core:catalogo:{version_catalogo()}:listado:{categoria or 'todas'}:{huella}"
+    return _en_cache(clave, calcular)
+
+
+def relacionados_de(producto):
+    return list(
+        Producto.objects.filter(disponible=True, categoria=producto.categoria)
+        .exclude(id=producto.id)
+        .order_by("-actualizado")[:RELACIONADOS]
+    )
+
+
+def detalle_catalogo(producto_id):
+    """Return ``(producto, relacionados)`` for an available product, or None.
+
+    Los ids inexistentes no se guardan, para que recorrer ids al azar no
+    llene la caché.
+    """
+
+    def calcular():
+        producto = Producto.objects.filter(disponible=True, id=producto_id).first()
+        if producto is None:
+            return None
+        return producto, relacionados_de(producto)
+
+    return _en_cache(f"core:catalogo:{version_catalogo()}:detalle:{producto_id}", calcular)
+
+
+def invalidar_catalogo():
+    transaction.on_commit(lambda: cache.set(CLAVE_VERSION, time.time_ns(), None))
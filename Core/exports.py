@@ -0,0 +1,431 @@
+"""Formatos de exportación para los reportes descargables.
+
+Cada reporte se describe como una lista de secciones (``title``,
+``description``, ``headers`` y ``rows``). Las filas pueden ser iterables
+perezosos; todos los formatos se generan por partes para que la memoria del
+worker no crezca con el tamaño del periodo exportado.
+
+Formatos disponibles:
+
+* ``html``: tabla HTML servida como ``application/vnd.ms-excel`` (legado).
+* ``csv``: secciones apiladas en un único CSV UTF-8.
+* ``xlsx``: libro Office Open XML con una hoja por sección y celdas tipadas.
+"""
+
+import csv
+import re
+import zipfile
+from datetime import date, datetime, time
+from decimal import Decimal
+from xml.sax.saxutils import escape as xml_escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.html import escape
+
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BUFFER_BYTES = 64 * 1024
+
+FORMATO_PREDETERMINADO = "html"
+
+
+def _format_excel_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime("%d/%m/%Y %H:%M")
+    if isinstance(value, date):
+        return value.strftime("%d/%m/%Y")
+    if isinstance(value, bool):
+        return "Sí" if value else "No"
+    return str(value)
+
+
+def _agrupar_fragmentos(fragmentos, limite=EXPORT_BUFFER_BYTES):
+    """Join small fragments into chunks of roughly ``limite`` bytes."""
+
+    buffer = []
+    tamanio = 0
+    for fragmento in fragmentos:
+        datos = fragmento.encode("utf-8") if isinstance(fragmento, str) else fragmento
+        buffer.append(datos)
+        tamanio += len(datos)
+        if tamanio >= limite:
+            yield b"".join(buffer)
+            buffer = []
+            tamanio = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+# ----------------------------
+# HTML (legado)
+# ----------------------------
+def _excel_row_html(row):
+    celdas = "".join(
+        f"<td>{escape(_format_excel_value(value)).replace(chr(10), '<br>')}</td>"
+        for value in row
+    )
+    return f"<tr>{celdas}</tr>"
+
+
+def secciones_html(sections):
+    """Yield the HTML workbook fragment by fragment."""
+
+    yield "<html><head><meta charset='utf-8'></head>"
+    yield "<body style='font-family:Arial,Helvetica,sans-serif;font-size:13px;'>"
+
+    for section in sections:
+        title = section.get("title")
+        description = section.get("description")
+        headers = section.get("headers", [])
+        rows = section.get("rows", [])
+
+        if title:
+            yield f"<h2 style='color:#0f172a;margin-bottom:0.35rem;'>{escape(title)}</h2>"
+        if description:
+            yield (
+                f"<p style='margin-top:0;margin-bottom:0.8rem;color:#334155;'>{escape(description)}</p>"
+            )
+
+        yield (
+            "<table border='1' cellspacing='0' cellpadding='6' style='border-collapse:collapse;margin-bottom:1.5rem;width:100%;'>"
+        )
+
+        if headers:
+            yield "<thead><tr>"
+            for header in headers:
+                yield (
+                    f"<th style='background-color:#0f172a;color:#ffffff;text-align:left;'>{escape(header)}</th>"
+                )
+            yield "</tr></thead>"
+
+        yield "<tbody>"
+        sin_filas = True
+        for row in rows:
+            sin_filas = False
+            yield _excel_row_html(row)
+        if sin_filas:
+            colspan = max(len(headers), 1)
+            yield (
+                f"<tr><td colspan='{colspan}' style='text-align:center;color:#64748b;'>Sin registros disponibles</td></tr>"
+            )
+        yield "</tbody></table>"
+
+    yield "</body></html>"
+
+
+# ----------------------------
+# CSV
+# ----------------------------
+class _Eco:
+    """Pseudo-buffer: ``csv.writer`` devuelve la línea en vez de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+def _valor_csv(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "Sí" if value else "No"
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime("%Y-%m-%d %H:%M")
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def secciones_csv(sections):
+    """Yield the sections stacked in one CSV, separated by a blank line."""
+
+    writer = csv.writer(_Eco())
+    # BOM para que Excel detecte UTF-8 al abrir el archivo.
+    yield "\ufeff"
+    for indice, section in enumerate(sections):
+        if indice:
+            yield writer.writerow([])
+        if section.get("title"):
+            yield writer.writerow([section["title"]])
+        if section.get("description"):
+            yield writer.writerow([section["description"]])
+        headers = section.get("headers", [])
+        if headers:
+            yield writer.writerow(headers)
+        for row in section.get("rows", []):
+            yield writer.writerow([_valor_csv(value) for value in row])
+
+
+# ----------------------------
+# XLSX
+# ----------------------------
+_EPOCH_EXCEL = datetime(1899, 12, 30)
+_CARACTERES_INVALIDOS_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+# Índices de cellXfs definidos en _XLSX_STYLES.
+_ESTILO_FECHA = 1
+_ESTILO_FECHA_HORA = 2
+_ESTILO_ENCABEZADO = 3
+
+_XLSX_CONTENT_TYPES_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+)
+
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+
+_XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="1"><numFmt numFmtId="164" formatCode="dd/mm/yyyy hh:mm"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    "</cellXfs>"
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    "</styleSheet>"
+)
+
+_XLSX_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    "<sheetData>"
+)
+_XLSX_SHEET_TAIL = "</sheetData></worksheet>"
+
+
+def _columna_excel(indice):
+    letras = ""
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _texto_xml(texto):
+    return xml_escape(_CARACTERES_INVALIDOS_XML.sub("", texto))
+
+
+def _serial_excel(value):
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.make_naive(timezone.localtime(value))
+    else:
+        value = datetime.combine(value, time())
+    delta = value - _EPOCH_EXCEL
+    return delta.days + delta.seconds / 86400
+
+
+def _celda_xlsx(referencia, value, estilo=None):
+    if value is None or value == "":
+        return ""
+    if isinstance(value, bool):
+        return f'<c r="{referencia}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c r="{referencia}"><v>{value}</v></c>'
+    if isinstance(value, datetime):
+        return (
+            f'<c r="{referencia}" s="{_ESTILO_FECHA_HORA}">'
+            f"<v>{_serial_excel(value)!r}</v></c>"
+        )
+    if isinstance(value, date):
+        return (
+            f'<c r="{referencia}" s="{_ESTILO_FECHA}">'
+            f"<v>{_serial_excel(value)!r}</v></c>"
+        )
+    atributo_estilo = f' s="{estilo}"' if estilo else ""
+    return (
+        f'<c r="{referencia}" t="inlineStr"{atributo_estilo}>'
+        f'<is><t xml:space="preserve">{_texto_xml(str(value))}</t></is></c>'
+    )
+
+
+def _fila_xlsx(numero, valores, estilo=None):
+    celdas = "".join(
+        _celda_xlsx(f"{_columna_excel(indice)}{numero}", value, estilo)
+        for indice, value in enumerate(valores)
+    )
+    return f'<row r="{numero}">{celdas}</row>'
+
+
+def _hoja_xlsx(section):
+    yield _XLSX_SHEET_HEAD
+    numero = 0
+    for texto, estilo in (
+        (section.get("title"), _ESTILO_ENCABEZADO),
+        (section.get("description"), None),
+    ):
+        if texto:
+            numero += 1
+            yield _fila_xlsx(numero, [texto], estilo)
+    if numero:
+        numero += 1
+    headers = section.get("headers", [])
+    if headers:
+        numero += 1
+        yield _fila_xlsx(numero, headers, _ESTILO_ENCABEZADO)
+    for row in section.get("rows", []):
+        numero += 1
+        yield _fila_xlsx(numero, row)
+    yield _XLSX_SHEET_TAIL
+
+
+def _nombre_hoja(titulo, indice, usados):
+    nombre = re.sub(r"[\[\]:*?/\\]", " ", titulo or "").strip()[:31] or f"Hoja {indice}"
+    base = nombre
+    sufijo = 2
+    while nombre.lower() in usados:
+        etiqueta = f" ({sufijo})"
+        nombre = f"{base[:31 - len(etiqueta)]}{etiqueta}"
+        sufijo += 1
+    usados.add(nombre.lower())
+    return nombre
+
+
+class _Sumidero:
+    """Destino no posicionable para ``zipfile``: acumula y entrega bytes."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def secciones_xlsx(sections):
+    """Yield an XLSX workbook with one worksheet per section."""
+
+    sections = list(sections)
+    sumidero = _Sumidero()
+    libro = zipfile.ZipFile(sumidero, "w", compression=zipfile.ZIP_DEFLATED)
+
+    hojas = []
+    usados = set()
+    for indice, section in enumerate(sections, start=1):
+        hojas.append((indice, _nombre_hoja(section.get("title"), indice, usados)))
+
+    overrides = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{indice}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for indice, _ in hojas
+    )
+    libro.writestr("[Content_Types].xml", f"{_XLSX_CONTENT_TYPES_HEAD}{overrides}</Types>")
+    libro.writestr("_rels/.rels", _XLSX_ROOT_RELS)
+    libro.writestr(
+        "xl/workbook.xml",
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+        + "".join(
+            f'<sheet name="{_texto_xml(nombre)}" sheetId="{indice}" r:id="rId{indice}"/>'
+            for indice, nombre in hojas
+        )
+        + "</sheets></workbook>",
+    )
+    libro.writestr(
+        "xl/_rels/workbook.xml.rels",
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        + "".join(
+            f'<Relationship Id="rId{indice}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            f'Target="worksheets/sheet{indice}.xml"/>'
+            for indice, _ in hojas
+        )
+        + f'<Relationship Id="rId{len(hojas) + 1}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/></Relationships>',
+    )
+    libro.writestr("xl/styles.xml", _XLSX_STYLES)
+    yield sumidero.vaciar()
+
+    for (indice, _), section in zip(hojas, sections):
+        with libro.open(f"xl/worksheets/sheet{indice}.xml", "w", force_zip64=True) as hoja:
+            for bloque in _agrupar_fragmentos(_hoja_xlsx(section)):
+                hoja.write(bloque)
+                datos = sumidero.vaciar()
+                if datos:
+                    yield datos
+        yield sumidero.vaciar()
+
+    libro.close()
+    yield sumidero.vaciar()
+
+
+FORMATOS_EXPORTACION = {
+    "html": {
+        "generador": secciones_html,
+        "content_type": "application/vnd.ms-excel",
+        "extension": "xls",
+    },
+    "csv": {
+        "generador": secciones_csv,
+        "content_type": "text/csv; charset=utf-8",
+        "extension": "csv",
+    },
+    "xlsx": {
+        "generador": secciones_xlsx,
+        "content_type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "extension": "xlsx",
+    },
+}
+
+
+def normalizar_formato(formato):
+    formato = (formato or "").strip().lower()
+    if formato in FORMATOS_EXPORTACION:
+        return formato
+    return FORMATO_PREDETERMINADO
+
+
+def generar_exportacion(sections, formato=FORMATO_PREDETERMINADO):
+    """Yield the encoded report in chunks for the given format."""
+
+    generador = FORMATOS_EXPORTACION[normalizar_formato(formato)]["generador"]
+    return _agrupar_fragmentos(generador(sections))
+
+
+def respuesta_exportacion(nombre_base, sections, formato=FORMATO_PREDETERMINADO):
+    formato = normalizar_formato(formato)
+    definicion = FORMATOS_EXPORTACION[formato]
+    response = StreamingHttpResponse(
+        generar_exportacion(sections, formato),
+        content_type=definicion["content_type"],
+    )
+    response["Content-Disposition"] = (
+        f"attachment; filename={nombre_base}.{definicion['extension']}"
+    )
+    return response
@@ -62,7 +62,7 @@ class ProductoForm(forms.ModelForm):
 class FarmacoForm(forms.ModelForm):
     class Meta:
         model = Farmaco
-        fields = ["sucursal", "nombre", "categoria", "descripcion", "stock"]
+        fields = ["sucursal", "nombre", "categoria", "descripcion", "stock", "stock_minimo"]
         widgets = {
             "descripcion": forms.Textarea(
                 attrs={
@@ -82,6 +82,9 @@ class FarmacoForm(forms.ModelForm):
         self.fields["stock"].widget.attrs.update(
             {"class": "form-control", "min": "0", "step": "1"}
         )
+        self.fields["stock_minimo"].widget.attrs.update(
+            {"class": "form-control", "min": "0", "step": "1"}
+        )
         self.fields["sucursal"].widget.attrs.update({"class": "form-select"})
 
         if sucursales is not None:
@@ -0,0 +1,158 @@
+"""Variantes reducidas de las fotos que suben los usuarios.
+
+Las fotos de mascotas, productos, sucursales, avatares y adjuntos de
+historiales se servían tal como se subieron: fotos de teléfono de 8 a 12 MB
+mostradas en tarjetas de pocos cientos de píxeles. Al guardar una foto nueva
+se encola un ``TrabajoImagen`` al confirmar la transacción y el comando
+``procesar_imagenes`` genera, fuera del request, versiones de
+``ANCHOS_VARIANTES`` píxeles de ancho en WebP y JPEG bajo ``variantes/``,
+con el nombre completo del original (``pacientes/toby.jpg`` ->
+``variantes/pacientes/toby.jpg.320w.webp``): ``toby.jpg`` y ``toby.png`` no
+comparten variantes y ninguna subida cae dentro de ``variantes/``.
+
+Las variantes se rotan según la orientación EXIF y se guardan sin metadatos
+(ubicación, modelo de cámara); el original no se modifica. Los templates las
+piden con ``templatetags/imagenes.py``, que usa el original mientras las
+variantes no existan.
+"""
+
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, models, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import HistorialMedico, Paciente, Producto, Sucursal, TrabajoImagen, User
+from .trabajos import tomar_siguiente_trabajo
+
+ANCHOS_VARIANTES = (320, 640, 1280)
+FORMATOS_VARIANTES = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+PREFIJO_VARIANTES = "variantes/"
+CAMPOS_IMAGEN = (
+    (Paciente, "foto"),
+    (Producto, "imagen"),
+    (Sucursal, "imagen"),
+    (User, "avatar"),
+    (HistorialMedico, "imagenes"),
+)
+
+
+def ruta_variante(ruta, ancho, extension):
+    return f"{PREFIJO_VARIANTES}{ruta}.{ancho}w.{extension}"
+
+
+def variantes_listas(ruta, storage=default_storage):
+    # La variante JPEG más grande es la última que se escribe.
+    return bool(ruta) and storage.exists(ruta_variante(ruta, ANCHOS_VARIANTES[-1], "jpg"))
+
+
+def _sin_transparencia(imagen):
+    if imagen.mode != "RGBA":
+        return imagen
+    fondo = Image.new("RGB", imagen.size, "white")
+    fondo.paste(imagen, mask=imagen.getchannel("A"))
+    return fondo
+
+
+def generar_variantes(ruta, storage=default_storage):
+    """Write every width and format of ``ruta``; returns the generated names."""
+
+    with storage.open(ruta, "rb") as archivo, Image.open(archivo) as original:
+        # En JPEG decodifica directamente a una escala reducida: abrir una
+        # foto de 12 MP completa es lo más caro de todo el proceso.
+        original.draft("RGB", (ANCHOS_VARIANTES[-1], ANCHOS_VARIANTES[-1]))
+        imagen = ImageOps.exif_transpose(original)
+    transparente = imagen.mode in ("RGBA", "LA", "PA") or "transparency" in imagen.info
+    imagen = imagen.convert("RGBA" if transparente else "RGB")
+    # Sin EXIF ni XMP: ``save`` sólo los escribe si vienen en ``info``.
+    imagen.info = {}
+
+    generadas = []
+    for ancho in ANCHOS_VARIANTES:
+        reducida = imagen.copy()
+        reducida.thumbnail((ancho, imagen.height), Image.Resampling.LANCZOS)
+        for extension, opciones in FORMATOS_VARIANTES.items():
+            salida = reducida if extension == "webp" else _sin_transparencia(reducida)
+            contenido = io.BytesIO()
+            salida.save(contenido, **opciones)
+            nombre = ruta_variante(ruta, ancho, extension)
+            # Se reemplaza en lugar de dejar que el storage agregue un sufijo;
+            # sólo se borra dentro de ``variantes/``, nunca una subida.
+            if nombre.startswith(PREFIJO_VARIANTES):
+                storage.delete(nombre)
+            generadas.append(storage.save(nombre, ContentFile(contenido.getvalue())))
+    return generadas
+
+
+def imagenes_subidas(instancia, update_fields=None):
+    """Return the image fields of ``instancia`` holding a new, unsaved upload."""
+
+    return [
+        campo.name
+        for campo in instancia._meta.concrete_fields
+        if isinstance(campo, models.ImageField)
+        and (update_fields is None or campo.name in update_fields)
+        and getattr(instancia, campo.attname)
+        and not getattr(instancia, campo.attname)._committed
+    ]
+
+
+def encolar_imagen(ruta):
+    if ruta and not TrabajoImagen.objects.filter(ruta=ruta, estado="pendiente").exists():
+        TrabajoImagen.objects.create(ruta=ruta)
+
+
+def programar_variantes(*rutas):
+    """Queue ``rutas`` for processing once the current transaction commits."""
+
+    for ruta in rutas:
+        transaction.on_commit(lambda ruta=ruta: encolar_imagen(ruta))
+
+
+def encolar_existentes():
+    """Queue every stored photo that still has no variants; returns how many."""
+
+    rutas = set()
+    for modelo, campo in CAMPOS_IMAGEN:
+        rutas.update(
+            modelo.objects.exclude(**{f"{campo}__isnull": True})
+            .exclude(**{campo: ""})
+            .values_list(campo, flat=True)
+        )
+    rutas -= set(TrabajoImagen.objects.filter(estado="pendiente").values_list("ruta", flat=True))
+    nuevas = [TrabajoImagen(ruta=ruta) for ruta in sorted(rutas) if not variantes_listas(ruta)]
+    TrabajoImagen.objects.bulk_create(nuevas, batch_size=500)
+    return len(nuevas)
+
+
+def procesar_trabajo_imagen(trabajo):
+    try:
+        generar_variantes(trabajo.ruta)
+    except Exception as exc:  # noqa: BLE001 - se informa en el trabajo
+        trabajo.estado = "error"
+        trabajo.error = str(exc) or exc.__class__.__name__
+    else:
+        trabajo.estado = "completado"
+        trabajo.error = ""
+    trabajo.finalizado = timezone.now()
+    trabajo.save(update_fields=["estado", "error", "finalizado"])
+    return trabajo
+
+
+def procesar_imagenes_pendientes(limite=None):
+    """Process queued photos until the queue is empty; returns how many ran."""
+
+    procesadas = 0
+    while limite is None or procesadas < limite:
+        close_old_connections()
+        trabajo = tomar_siguiente_trabajo(TrabajoImagen.objects.all())
+        if trabajo is None:
+            break
+        procesar_trabajo_imagen(trabajo)
+        procesadas += 1
+    return procesadas
@@ -0,0 +1,191 @@
+"""Instrumentación opcional de vistas: tiempo total, consultas y duplicados.
+
+Se activa con ``INSTRUMENTACION_ACTIVA = True`` en settings. Por cada
+request se mide el tiempo de la vista, la cantidad de consultas SQL, el
+tiempo pasado en la base y las consultas repetidas (misma SQL con los mismos
+parámetros, típico de un N+1), más los aciertos y fallos de las cachés que
+avisan con ``contar_cache`` (ver cache_dashboard.py). Las muestras se
+agrupan por nombre de URL en una ventana circular en memoria, por proceso, y
+se resumen en percentiles desde ``metricas_instrumentacion``. Con
+``INSTRUMENTACION_SERVER_TIMING`` además se agrega el header
+``Server-Timing`` para verlo desde el navegador.
+
+En respuestas en streaming sólo se mide hasta que la vista devuelve la
+respuesta, no la generación del cuerpo.
+"""
+
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+MUESTRAS_POR_RUTA = 500
+DUPLICADAS_POR_RUTA = 5
+RUTA_SIN_NOMBRE = "<sin ruta>"
+
+
+class _Medicion:
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.sentencias = Counter()
+        self.cache_aciertos = 0
+        self.cache_fallos = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo_db += time.perf_counter() - inicio
+            self.consultas += 1
+            self.sentencias[(sql, repr(params))] += 1
+
+    def duplicadas(self):
+        repetidas = Counter()
+        for (sql, _params), veces in self.sentencias.items():
+            if veces > 1:
+                repetidas[sql] += veces - 1
+        return repetidas
+
+
+class RegistroMetricas:
+    """Rolling, thread-safe window of samples per URL name."""
+
+    def __init__(self, maximo=MUESTRAS_POR_RUTA):
+        self.maximo = maximo
+        self._lock = threading.Lock()
+        self._muestras = defaultdict(lambda: deque(maxlen=self.maximo))
+        self._duplicadas = defaultdict(Counter)
+
+    def registrar(
+        self, ruta, duracion, consultas, tiempo_db, duplicadas, cache_aciertos=0, cache_fallos=0
+    ):
+        with self._lock:
+            self._muestras[ruta].append(
+                (
+                    duracion,
+                    consultas,
+                    tiempo_db,
+                    sum(duplicadas.values()),
+                    cache_aciertos,
+                    cache_fallos,
+                )
+            )
+            if duplicadas:
+                self._duplicadas[ruta].update(duplicadas)
+
+    def reiniciar(self):
+        with self._lock:
+            self._muestras.clear()
+            self._duplicadas.clear()
+
+    def resumen(self):
+        with self._lock:
+            muestras = {ruta: list(valores) for ruta, valores in self._muestras.items()}
+            duplicadas = {
+                ruta: contador.most_common(DUPLICADAS_POR_RUTA)
+                for ruta, contador in self._duplicadas.items()
+            }
+
+        rutas = []
+        for ruta, valores in muestras.items():
+            duraciones, consultas, tiempos_db, repetidas, aciertos, fallos = zip(*valores)
+            rutas.append(
+                {
+                    "ruta": ruta,
+                    "muestras": len(valores),
+                    "ms": _percentiles([d * 1000 for d in duraciones]),
+                    "consultas": _percentiles(consultas),
+                    "db_ms": _percentiles([t * 1000 for t in tiempos_db]),
+                    "duplicadas": _percentiles(repetidas),
+                    "cache": _tasa_cache(sum(aciertos), sum(fallos)),
+                    "sentencias_duplicadas": [
+                        {"sql": sql, "repeticiones": veces}
+                        for sql, veces in duplicadas.get(ruta, [])
+                    ],
+                }
+            )
+        rutas.sort(key=lambda item: item["ms"]["p95"], reverse=True)
+        return rutas
+
+
+def _percentiles(valores):
+    ordenados = sorted(valores)
+    ultimo = len(ordenados) - 1
+
+    def rango(p):
+        return round(ordenados[min(ultimo, int(p * len(ordenados)))], 2)
+
+    return {"p50": rango(0.50), "p95": rango(0.95), "p99": rango(0.99), "max": round(ordenados[-1], 2)}
+
+
+def _tasa_cache(aciertos, fallos):
+    total = aciertos + fallos
+    return {
+        "aciertos": aciertos,
+        "fallos": fallos,
+        "tasa_aciertos": round(aciertos / total * 100, 1) if total else None,
+    }
+
+
+registro = RegistroMetricas()
+_actual = threading.local()
+
+
+def contar_cache(acierto):
+    """Count a cache hit or miss against the request being measured, if any."""
+
+    medicion = getattr(_actual, "medicion", None)
+    if medicion is None:
+        return
+    if acierto:
+        medicion.cache_aciertos += 1
+    else:
+        medicion.cache_fallos += 1
+
+
+class InstrumentacionMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, "INSTRUMENTACION_ACTIVA", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = getattr(settings, "INSTRUMENTACION_SERVER_TIMING", False)
+
+    def __call__(self, request):
+        medicion = _actual.medicion = _Medicion()
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pila:
+                for conexion in connections.all():
+                    pila.enter_context(conexion.execute_wrapper(medicion))
+                response = self.get_response(request)
+        finally:
+            _actual.medicion = None
+        duracion = time.perf_counter() - inicio
+
+        coincidencia = getattr(request, "resolver_match", None)
+        ruta = (coincidencia.view_name if coincidencia else None) or RUTA_SIN_NOMBRE
+        duplicadas = medicion.duplicadas()
+        registro.registrar(
+            ruta,
+            duracion,
+            medicion.consultas,
+            medicion.tiempo_db,
+            duplicadas,
+            medicion.cache_aciertos,
+            medicion.cache_fallos,
+        )
+
+        if self.server_timing:
+            response["Server-Timing"] = (
+                f"app;dur={duracion * 1000:.1f}, "
+                f'db;dur={medicion.tiempo_db * 1000:.1f};desc="{medicion.consultas} consultas", '
+                f'dup;desc="{sum(duplicadas.values())} repetidas", '
+                f'cache;desc="{medicion.cache_aciertos} aciertos, {medicion.cache_fallos} fallos"'
+            )
+        return response
@@ -0,0 +1,95 @@
+"""Resumen de inventario de fármacos por sucursal, guardado en caché.
+
+El panel del veterinario y las pantallas de inventario piden el mismo resumen
+una y otra vez entre consultas, así que se arma en una sola pasada y se guarda
+en el framework de caché de Django. Se descarta al guardar o borrar un
+``Farmaco`` (señales) y cuando una consulta descuenta o repone stock.
+"""
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Farmaco
+
+
+INVENTARIO_CACHE_SEGUNDOS = 10 * 60
+
+
+def _clave_inventario(sucursal_id):
+    return f"core:inventario:sucursal:{sucursal_id}"
+
+
+def agrupar_por_categoria(farmacos):
+    """Group ``farmacos`` by category in one pass, keeping the choices order."""
+
+    grupos = {}
+    for farmaco in farmacos:
+        grupo = grupos.get(farmaco.categoria)
+        if grupo is None:
+            grupo = grupos[farmaco.categoria] = {
+                "codigo": farmaco.categoria,
+                "total_items": 0,
+                "total_stock": 0,
+                "items": [],
+            }
+        grupo["total_items"] += 1
+        grupo["total_stock"] += farmaco.stock
+        grupo["items"].append(farmaco)
+
+    categorias = []
+    for valor, etiqueta in Farmaco.Categoria.choices:
+        grupo = grupos.get(valor)
+        if grupo is not None:
+            categorias.append({"nombre": etiqueta, **grupo})
+    return categorias
+
+
+def _armar_inventario(sucursal):
+    farmacos = list(
+        Farmaco.objects.filter(sucursal=sucursal)
+        .order_by("categoria", "nombre")
+        .select_related("sucursal", "alerta")
+    )
+    alertas = [
+        farmaco.alerta for farmaco in farmacos if hasattr(farmaco, "alerta")
+    ]
+    return {
+        "farmacos": farmacos,
+        "resumen": {
+            "total_items": len(farmacos),
+            "total_stock": sum(farmaco.stock for farmaco in farmacos),
+            "ultima_actualizacion": max(
+                (farmaco.actualizado for farmaco in farmacos), default=None
+            ),
+            "categorias": agrupar_por_categoria(farmacos),
+            "criticos": [farmaco for farmaco in farmacos if farmaco.bajo_minimo],
+            # Todavía sobre el mínimo pero con agotamiento proyectado cercano.
+            "en_riesgo": sorted(
+                (alerta for alerta in alertas if not alerta.bajo_minimo),
+                key=lambda alerta: alerta.dias_restantes,
+            ),
+        },
+    }
+
+
+def inventario_por_sucursal(sucursal):
+    """Return the (possibly cached) inventory snapshot of ``sucursal``."""
+
+    clave = _clave_inventario(sucursal.pk)
+    inventario = cache.get(clave)
+    if inventario is None:
+        inventario = _armar_inventario(sucursal)
+        cache.set(clave, inventario, INVENTARIO_CACHE_SEGUNDOS)
+    return inventario
+
+
+def invalidar_inventario(*sucursal_ids):
+    """Drop the cached snapshots once the current transaction commits.
+
+    Borrar antes del commit dejaría que otro request vuelva a cachear el
+    stock viejo mientras la transacción sigue abierta.
+    """
+
+    claves = [_clave_inventario(sucursal_id) for sucursal_id in sucursal_ids if sucursal_id]
+    if claves:
+        transaction.on_commit(lambda: cache.delete_many(claves))
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from Core.resumenes import recalcular_resumenes
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula los resúmenes diarios del módulo de análisis. Sin opciones "
+        "reconstruye todo; con --dias sólo los últimos días (útil como cron "
+        "nocturno o después de cargas masivas)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dias",
+            type=int,
+            help="Recalcula sólo los últimos N días, incluido hoy.",
+        )
+
+    def handle(self, *args, **options):
+        dias = None
+        if options["dias"] is not None:
+            if options["dias"] <= 0:
+                raise CommandError("--dias debe ser mayor a cero.")
+            hoy = timezone.localdate()
+            dias = [hoy - timedelta(days=n) for n in range(options["dias"])]
+
+        filas = recalcular_resumenes(dias)
+        self.stdout.write(self.style.SUCCESS(f"Filas de resumen generadas: {filas}"))
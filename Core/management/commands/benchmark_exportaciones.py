@@ -0,0 +1,95 @@
+import json
+import random
+import time as reloj
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Core.exports import FORMATOS_EXPORTACION, generar_exportacion
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara bytes generados y tiempo de generación de cada formato de "
+        "exportación sobre filas sintéticas (sin tocar la base de datos)."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filas", type=int, default=10_000)
+        parser.add_argument("--repeticiones", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--json", action="store_true", help="Imprime el resultado en JSON."
+        )
+
+    def _filas(self, cantidad, seed):
+        aleatorio = random.Random(seed)
+        base = timezone.now()
+        for indice in range(cantidad):
+            momento = base - timedelta(minutes=aleatorio.randint(0, 60 * 24 * 30))
+            yield [
+                f"Sucursal {indice % 4}",
+                momento,
+                momento.date(),
+                aleatorio.choice(["Programada", "Atendida", "Cancelada"]),
+                aleatorio.choice(["Consulta", "Vacunación", "Cirugía"]),
+                f"Veterinario {indice % 40}",
+                f"Paciente {indice}",
+                f"Propietario {indice // 2}",
+                f"351{aleatorio.randint(1000000, 9999999)}",
+                f"propietario{indice // 2}@sabueso.test",
+                f"Fármaco {indice % 120}",
+                "Antibióticos",
+                aleatorio.randint(1, 5),
+                Decimal(aleatorio.randint(0, 9999)) / 100,
+                "Control de rutina sin observaciones.",
+            ]
+
+    def handle(self, *args, **options):
+        cantidad = options["filas"]
+        repeticiones = max(options["repeticiones"], 1)
+        resultados = []
+
+        for formato in FORMATOS_EXPORTACION:
+            tiempos = []
+            total_bytes = 0
+            for _ in range(repeticiones):
+                secciones = [
+                    {
+                        "title": "Dispensación detallada por cita",
+                        "headers": [f"Columna {i}" for i in range(15)],
+                        "rows": self._filas(cantidad, options["seed"]),
+                    }
+                ]
+                inicio = reloj.perf_counter()
+                total_bytes = sum(
+                    len(bloque) for bloque in generar_exportacion(secciones, formato)
+                )
+                tiempos.append(reloj.perf_counter() - inicio)
+
+            mejor = min(tiempos)
+            resultados.append(
+                {
+                    "formato": formato,
+                    "filas": cantidad,
+                    "bytes": total_bytes,
+                    "segundos": round(mejor, 4),
+                    "bytes_por_10k_filas": round(total_bytes * 10_000 / cantidad),
+                    "segundos_por_10k_filas": round(mejor * 10_000 / cantidad, 4),
+                }
+            )
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+
+        self.stdout.write(f"{'Formato':<8}{'Bytes/10k':>14}{'Seg/10k':>10}")
+        for resultado in resultados:
+            self.stdout.write(
+                f"{resultado['formato']:<8}"
+                f"{resultado['bytes_por_10k_filas']:>14,}"
+                f"{resultado['segundos_por_10k_filas']:>10.3f}"
+            )
@@ -0,0 +1,203 @@
+import json
+import statistics
+import subprocess
+import time as reloj
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from Core.models import Cita, CitaFarmaco, HistorialMedico, Paciente, Propietario, User
+
+# (escenario, perfil, nombre de URL, parámetros GET)
+ESCENARIOS = (
+    ("landing", None, "landing", {}),
+    ("tienda", None, "tienda", {}),
+    ("tienda_busqueda", None, "tienda", {"q": "alimento"}),
+    ("dashboard_admin", "admin", "dashboard", {}),
+    ("dashboard_vet", "vet", "dashboard", {}),
+    ("dashboard_propietario", "propietario", "dashboard", {}),
+    ("analisis", "admin", "dashboard_admin_analisis", {"inventario_periodo": "mes"}),
+    ("citas_admin", "admin", "listar_citas_admin", {}),
+    ("pacientes_admin", "admin", "listar_pacientes", {}),
+    ("mis_citas", "propietario", "mis_citas", {}),
+    ("historial_busqueda", "vet", "historial_medico_vet", {"q": "otitis"}),
+    ("propietarios_busqueda", "admin", "buscar_propietarios", {"q": "lopez"}),
+    ("propietarios_autocompletar", "admin", "autocompletar_propietarios", {"q": "mar"}),
+    ("inventario_vet", "vet", "inventario_farmacos_veterinario", {}),
+    ("exportar_inventario_csv", "admin", "exportar_inventario_excel", {"formato": "csv"}),
+)
+
+
+def _perfiles():
+    return {
+        "admin": User.objects.filter(is_superuser=True, rol="ADMIN").order_by("id").first(),
+        "vet": User.objects.filter(rol="VET", sucursal__isnull=False).order_by("id").first(),
+        "propietario": User.objects.filter(rol="OWNER", propietario__paciente__isnull=False)
+        .order_by("id")
+        .first(),
+    }
+
+
+def _commit_actual():
+    try:
+        resultado = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return resultado.stdout.strip() or None
+
+
+def _consumir(response):
+    if response.streaming:
+        return sum(len(bloque) for bloque in response.streaming_content)
+    return len(response.content)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide las vistas principales (dashboards, listados, búsquedas y "
+        "exportaciones) sobre los datos actuales y guarda el resultado en JSON "
+        "para comparar entre commits. Pensado para usarse después de "
+        "generar_datos_sinteticos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeticiones", type=int, default=5)
+        parser.add_argument(
+            "--escenario",
+            action="append",
+            dest="escenarios",
+            help="Limita la corrida a estos escenarios (se puede repetir).",
+        )
+        parser.add_argument(
+            "--frio",
+            action="store_true",
+            help="Vacía la caché antes de cada repetición.",
+        )
+        parser.add_argument(
+            "--salida",
+            help="Archivo JSON de salida (por defecto benchmarks/vistas-<commit>.json).",
+        )
+        parser.add_argument(
+            "--comparar",
+            help="JSON de una corrida anterior para mostrar la diferencia de medianas.",
+        )
+
+    def _medir(self, cliente, url, parametros, repeticiones, frio):
+        tiempos = []
+        consultas = []
+        estado = None
+        tamanio = 0
+        # La primera petición calienta conexiones, plantillas e imports.
+        _consumir(cliente.get(url, parametros))
+        for _ in range(repeticiones):
+            if frio:
+                cache.clear()
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = reloj.perf_counter()
+                response = cliente.get(url, parametros)
+                tamanio = _consumir(response)
+                tiempos.append((reloj.perf_counter() - inicio) * 1000)
+            consultas.append(len(capturadas))
+            estado = response.status_code
+        return {
+            "estado": estado,
+            "bytes": tamanio,
+            "consultas": max(consultas),
+            "ms": {
+                "min": round(min(tiempos), 2),
+                "mediana": round(statistics.median(tiempos), 2),
+                "max": round(max(tiempos), 2),
+            },
+        }
+
+    def handle(self, *args, **options):
+        repeticiones = max(options["repeticiones"], 1)
+        seleccion = set(options["escenarios"] or ())
+        escenarios = [e for e in ESCENARIOS if not seleccion or e[0] in seleccion]
+        if seleccion - {e[0] for e in escenarios}:
+            raise CommandError(
+                f"Escenarios desconocidos: {', '.join(sorted(seleccion - {e[0] for e in ESCENARIOS}))}"
+            )
+
+        perfiles = _perfiles()
+        clientes = {None: Client()}
+        for perfil, usuario in perfiles.items():
+            if usuario is not None:
+                clientes[perfil] = Client()
+                clientes[perfil].force_login(usuario)
+
+        resultados = []
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            for nombre, perfil, ruta, parametros in escenarios:
+                if perfil not in clientes:
+                    self.stderr.write(f"{nombre}: sin usuario con perfil '{perfil}', se omite.")
+                    continue
+                medicion = self._medir(
+                    clientes[perfil], reverse(ruta), parametros, repeticiones, options["frio"]
+                )
+                resultados.append({"escenario": nombre, "ruta": ruta, **medicion})
+                self.stdout.write(
+                    f"{nombre:<28}{medicion['estado']:>5}{medicion['consultas']:>7} q"
+                    f"{medicion['ms']['mediana']:>10.1f} ms"
+                )
+
+        commit = _commit_actual()
+        informe = {
+            "commit": commit,
+            "fecha": timezone.now().isoformat(),
+            "repeticiones": repeticiones,
+            "frio": options["frio"],
+            "motor": connection.vendor,
+            "datos": {
+                "propietarios": Propietario.objects.count(),
+                "pacientes": Paciente.objects.count(),
+                "citas": Cita.objects.count(),
+                "historiales": HistorialMedico.objects.count(),
+                "dispensaciones": CitaFarmaco.objects.count(),
+            },
+            "resultados": resultados,
+        }
+
+        etiqueta = commit or timezone.now().strftime("%Y%m%d%H%M%S")
+        salida = Path(
+            options["salida"] or Path(settings.BASE_DIR) / "benchmarks" / f"vistas-{etiqueta}.json"
+        )
+        salida.parent.mkdir(parents=True, exist_ok=True)
+        salida.write_text(json.dumps(informe, indent=2, ensure_ascii=False), encoding="utf-8")
+        self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {salida}"))
+
+        if options["comparar"]:
+            self._comparar(options["comparar"], resultados)
+
+    def _comparar(self, archivo, resultados):
+        try:
+            anterior = json.loads(Path(archivo).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as error:
+            raise CommandError(f"No se pudo leer {archivo}: {error}") from error
+
+        previos = {r["escenario"]: r for r in anterior.get("resultados", [])}
+        self.stdout.write(f"Comparación contra {anterior.get('commit') or archivo}:")
+        for resultado in resultados:
+            previo = previos.get(resultado["escenario"])
+            if previo is None:
+                continue
+            antes = previo["ms"]["mediana"]
+            ahora = resultado["ms"]["mediana"]
+            variacion = (ahora - antes) / antes * 100 if antes else 0
+            self.stdout.write(
+                f"{resultado['escenario']:<28}{antes:>10.1f} → {ahora:>8.1f} ms ({variacion:+.0f}%)"
+                f"  consultas {previo['consultas']} → {resultado['consultas']}"
+            )
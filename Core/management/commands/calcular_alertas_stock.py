@@ -0,0 +1,47 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Core.models import Sucursal
+from Core.stock import HORIZONTE_ALERTA_DIAS, VENTANA_CONSUMO_DIAS, calcular_alertas_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula las alertas de reposición de fármacos según el consumo "
+        "registrado en consultas. Pensado para ejecutarse periódicamente (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dias",
+            type=int,
+            default=VENTANA_CONSUMO_DIAS,
+            help="Días de consumo que se promedian para estimar el ritmo diario.",
+        )
+        parser.add_argument(
+            "--horizonte",
+            type=int,
+            default=HORIZONTE_ALERTA_DIAS,
+            help="Alerta los fármacos que se agotarían dentro de estos días.",
+        )
+
+    def handle(self, *args, **options):
+        if options["dias"] <= 0:
+            raise CommandError("--dias debe ser mayor a cero.")
+
+        alertas = calcular_alertas_stock(
+            ventana_dias=options["dias"], horizonte_dias=options["horizonte"]
+        )
+
+        por_sucursal = Counter(alerta.sucursal_id for alerta in alertas)
+        bajo_minimo = Counter(alerta.sucursal_id for alerta in alertas if alerta.bajo_minimo)
+        nombres = dict(
+            Sucursal.objects.filter(id__in=por_sucursal).values_list("id", "nombre")
+        )
+        for sucursal_id, total in sorted(por_sucursal.items()):
+            self.stdout.write(
+                f"{nombres.get(sucursal_id, sucursal_id)}: {total} alertas "
+                f"({bajo_minimo[sucursal_id]} bajo el mínimo)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Alertas de stock generadas: {len(alertas)}"))
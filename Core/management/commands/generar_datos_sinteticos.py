@@ -0,0 +1,58 @@
+import time as reloj
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Core.sinteticos import ESCALA_PREDETERMINADA, generar_datos_sinteticos
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera una clínica sintética grande (sucursales, veterinarios, "
+        "propietarios, mascotas, citas, historiales y fármacos dispensados) con "
+        "bulk_create y semilla fija, para medir rendimiento."
+    )
+
+    def add_arguments(self, parser):
+        for nombre, valor in ESCALA_PREDETERMINADA.items():
+            parser.add_argument(f"--{nombre}", type=int, default=valor)
+        parser.add_argument(
+            "--escala",
+            type=float,
+            default=1.0,
+            help="Multiplica propietarios, pacientes y citas (por ejemplo 0.01 para una prueba rápida).",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--prefijo",
+            default="sint",
+            help="Prefijo de usuarios y sucursales generados.",
+        )
+        parser.add_argument(
+            "--sin-derivados",
+            action="store_true",
+            help="No reconstruye índices de búsqueda ni resúmenes al terminar.",
+        )
+
+    def handle(self, *args, **options):
+        escala = {nombre: options[nombre] for nombre in ESCALA_PREDETERMINADA}
+        for nombre in ("propietarios", "pacientes", "citas"):
+            escala[nombre] = max(1, round(escala[nombre] * options["escala"]))
+
+        inicio = reloj.perf_counter()
+        try:
+            creados = generar_datos_sinteticos(
+                prefijo=options["prefijo"],
+                seed=options["seed"],
+                informar=self.stdout.write,
+                derivados=not options["sin_derivados"],
+                **escala,
+            )
+        except ValueError as error:
+            raise CommandError(str(error)) from error
+
+        resumen = ", ".join(f"{nombre}: {total}" for nombre, total in creados.items())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Datos sintéticos generados en {reloj.perf_counter() - inicio:.1f}s ({resumen})"
+            )
+        )
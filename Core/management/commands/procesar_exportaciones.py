@@ -0,0 +1,104 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from Core.trabajos import (
+    eliminar_exportaciones_vencidas,
+    procesar_pendientes,
+    reencolar_trabajos_colgados,
+)
+
+# Cada cuánto se borran los reportes vencidos mientras el comando escucha.
+LIMPIEZA_CADA_SEGUNDOS = 60 * 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Procesa la cola de exportaciones en segundo plano. Por defecto queda "
+        "escuchando la base de datos; con --una-vez vacía la cola y termina."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--una-vez",
+            action="store_true",
+            help="Procesa los trabajos pendientes y finaliza.",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=5.0,
+            help="Segundos de espera entre consultas a la cola.",
+        )
+        parser.add_argument(
+            "--hilos",
+            type=int,
+            default=1,
+            help="Cantidad de hilos que consumen la cola en paralelo.",
+        )
+        parser.add_argument(
+            "--minutos-colgado",
+            type=int,
+            default=30,
+            help="Reencola trabajos en proceso hace más de estos minutos.",
+        )
+        parser.add_argument(
+            "--dias-retencion",
+            type=int,
+            default=getattr(settings, "EXPORTACIONES_RETENCION_DIAS", 7),
+            help="Borra los reportes terminados hace más de estos días.",
+        )
+
+    def _limpiar(self, dias):
+        eliminados = eliminar_exportaciones_vencidas(dias)
+        if eliminados:
+            self.stdout.write(f"Reportes vencidos eliminados: {eliminados}")
+
+    def _consumir(self, una_vez, intervalo, dias_retencion=None):
+        procesados = 0
+        ultima_limpieza = time.monotonic()
+        try:
+            while True:
+                procesados += procesar_pendientes()
+                if (
+                    dias_retencion is not None
+                    and time.monotonic() - ultima_limpieza >= LIMPIEZA_CADA_SEGUNDOS
+                ):
+                    self._limpiar(dias_retencion)
+                    ultima_limpieza = time.monotonic()
+                if una_vez:
+                    return procesados
+                time.sleep(intervalo)
+        finally:
+            connections.close_all()
+
+    def handle(self, *args, **options):
+        reencolados = reencolar_trabajos_colgados(options["minutos_colgado"])
+        if reencolados:
+            self.stdout.write(f"Trabajos reencolados: {reencolados}")
+        self._limpiar(options["dias_retencion"])
+
+        hilos = max(options["hilos"], 1)
+        una_vez = options["una_vez"]
+        intervalo = options["intervalo"]
+
+        if hilos == 1:
+            procesados = self._consumir(una_vez, intervalo, options["dias_retencion"])
+        else:
+            with ThreadPoolExecutor(max_workers=hilos) as pool:
+                # Sólo el primer hilo repite la limpieza periódica.
+                futuros = [
+                    pool.submit(
+                        self._consumir,
+                        una_vez,
+                        intervalo,
+                        options["dias_retencion"] if indice == 0 else None,
+                    )
+                    for indice in range(hilos)
+                ]
+                procesados = sum(futuro.result() for futuro in futuros)
+
+        self.stdout.write(self.style.SUCCESS(f"Exportaciones procesadas: {procesados}"))
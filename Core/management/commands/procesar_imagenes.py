@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from Core.imagenes import encolar_existentes, procesar_imagenes_pendientes
+from Core.models import TrabajoImagen
+from Core.trabajos import reencolar_trabajos_colgados
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera las variantes reducidas (WebP y JPEG) de las fotos subidas. Por "
+        "defecto queda escuchando la cola; con --una-vez la vacía y termina."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--una-vez",
+            action="store_true",
+            help="Procesa las imágenes pendientes y finaliza.",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=5.0,
+            help="Segundos de espera entre consultas a la cola.",
+        )
+        parser.add_argument(
+            "--minutos-colgado",
+            type=int,
+            default=30,
+            help="Reencola imágenes en proceso hace más de estos minutos.",
+        )
+        parser.add_argument(
+            "--encolar-existentes",
+            action="store_true",
+            help="Encola antes las fotos ya guardadas que todavía no tienen variantes.",
+        )
+
+    def handle(self, *args, **options):
+        reencoladas = reencolar_trabajos_colgados(options["minutos_colgado"], TrabajoImagen)
+        if reencoladas:
+            self.stdout.write(f"Imágenes reencoladas: {reencoladas}")
+        if options["encolar_existentes"]:
+            self.stdout.write(f"Imágenes existentes encoladas: {encolar_existentes()}")
+
+        procesadas = 0
+        try:
+            while True:
+                procesadas += procesar_imagenes_pendientes()
+                if options["una_vez"]:
+                    break
+                time.sleep(options["intervalo"])
+        finally:
+            connections.close_all()
+
+        self.stdout.write(self.style.SUCCESS(f"Imágenes procesadas: {procesadas}"))
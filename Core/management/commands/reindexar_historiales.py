@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from Core.busqueda import reconstruir_indice_historiales
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye el índice de búsqueda de historiales médicos. Útil después "
+        "de cargas masivas que no disparan señales (bulk_create, SQL directo)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        with transaction.atomic(using=options["database"]):
+            indexados = reconstruir_indice_historiales(using=options["database"])
+        self.stdout.write(self.style.SUCCESS(f"Historiales indexados: {indexados}"))
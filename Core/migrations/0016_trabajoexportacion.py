@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0015_alter_cita_veterinario_alter_farmaco_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='rol',
+            field=models.CharField(choices=[('ADMIN', 'Administrador'), ('VET', 'Veterinario'), ('REP', 'Recepcionista'), ('OWNER', 'Propietario')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='TrabajoExportacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('inventario', 'Inventario farmacológico'), ('propietario', 'Expediente de propietario')], max_length=20)),
+                ('formato', models.CharField(choices=[('html', 'Excel (.xls)'), ('xlsx', 'Excel (.xlsx)'), ('csv', 'CSV')], default='html', max_length=10)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=20)),
+                ('archivo', models.FileField(blank=True, upload_to='exportaciones/')),
+                ('nombre_archivo', models.CharField(blank=True, max_length=200)),
+                ('error', models.TextField(blank=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('iniciado', models.DateTimeField(blank=True, null=True)),
+                ('finalizado', models.DateTimeField(blank=True, null=True)),
+                ('solicitado_por', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exportaciones', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-creado'],
+                'indexes': [models.Index(fields=['estado', 'creado'], name='core_export_cola_idx')],
+            },
+        ),
+    ]
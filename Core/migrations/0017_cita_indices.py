@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0016_trabajoexportacion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['sucursal', 'estado', 'fecha_hora'], name='core_cita_suc_est_fh_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['veterinario', 'estado', 'fecha_hora'], name='core_cita_vet_est_fh_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['sucursal', 'fecha_solicitada'], name='core_cita_suc_fsol_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['estado', 'fecha_hora'], name='core_cita_est_fh_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations
+
+# Copia del esquema de Core/busqueda.py al momento de esta migración: las
+# migraciones no importan código de la app, que puede cambiar después.
+TABLA_FTS = "core_historial_fts"
+INDICE_GIN = "core_historial_busqueda_gin"
+CAMPOS_INDEXADOS = ("diagnostico", "tratamiento", "notas", "examenes")
+
+
+def _indice_postgres():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return GinIndex(SearchVector(*CAMPOS_INDEXADOS, config="spanish"), name=INDICE_GIN)
+
+
+def crear_indice(apps, schema_editor):
+    HistorialMedico = apps.get_model("Core", "HistorialMedico")
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        columnas = ", ".join(connection.ops.quote_name(campo) for campo in CAMPOS_INDEXADOS)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5("
+            f"{columnas}, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {TABLA_FTS} (rowid, {columnas}) "
+            f"SELECT id, {columnas} "
+            f"FROM {connection.ops.quote_name(HistorialMedico._meta.db_table)}"
+        )
+    elif connection.vendor == "postgresql":
+        schema_editor.add_index(HistorialMedico, _indice_postgres())
+
+
+def eliminar_indice(apps, schema_editor):
+    HistorialMedico = apps.get_model("Core", "HistorialMedico")
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLA_FTS}")
+    elif connection.vendor == "postgresql":
+        schema_editor.remove_index(HistorialMedico, _indice_postgres())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0017_cita_indices'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:37
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copia del tokenizador de Core/busqueda.py al momento de esta migración: las
+# migraciones no importan código de la app, que puede cambiar después.
+_TERMINO = re.compile(r"[a-z0-9]+")
+
+
+def _terminos(valor):
+    descompuesto = unicodedata.normalize("NFKD", valor or "")
+    normalizado = "".join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+    return _TERMINO.findall(normalizado)
+
+
+def _trigramas_propietario(propietario):
+    user = propietario.user
+    terminos = set()
+    for valor in (
+        user.first_name,
+        user.last_name,
+        user.username,
+        propietario.direccion,
+        propietario.ciudad,
+    ):
+        terminos.update(_terminos(valor))
+    for telefono in (propietario.telefono, user.telefono):
+        digitos = "".join(ch for ch in (telefono or "") if ch.isdigit())
+        if digitos:
+            terminos.add(digitos)
+
+    trigramas = set()
+    for termino in terminos:
+        relleno = f"  {termino} "
+        trigramas |= {relleno[i : i + 3] for i in range(len(relleno) - 2)}
+    return trigramas
+
+
+def indexar_propietarios(apps, schema_editor):
+    Propietario = apps.get_model("Core", "Propietario")
+    TrigramaPropietario = apps.get_model("Core", "TrigramaPropietario")
+
+    lote = []
+    for propietario in Propietario.objects.select_related("user").order_by("id").iterator(chunk_size=500):
+        lote.extend(
+            TrigramaPropietario(propietario=propietario, trigrama=t)
+            for t in _trigramas_propietario(propietario)
+        )
+        if len(lote) >= 10_000:
+            TrigramaPropietario.objects.bulk_create(lote, batch_size=1000)
+            lote = []
+    TrigramaPropietario.objects.bulk_create(lote, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0018_historial_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrigramaPropietario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigrama', models.CharField(max_length=3)),
+                ('propietario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigramas', to='Core.propietario')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('trigrama', 'propietario'), name='core_trigrama_prop_uniq')],
+            },
+        ),
+        migrations.RunPython(indexar_propietarios, migrations.RunPython.noop),
+    ]
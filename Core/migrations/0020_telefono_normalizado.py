@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:38
+
+from django.db import migrations, models
+
+TAMANIO_LOTE = 1000
+
+
+def solo_digitos_telefono(telefono):
+    # Copia de Core.models.solo_digitos_telefono al momento de esta migración:
+    # las migraciones no importan código de la app, que puede cambiar después.
+    return "".join(ch for ch in (telefono or "") if ch.isdigit())
+
+
+def completar_telefonos(apps, schema_editor):
+    for nombre in ("User", "Propietario"):
+        modelo = apps.get_model("Core", nombre)
+        ultimo_id = 0
+        while True:
+            lote = list(
+                modelo.objects.filter(id__gt=ultimo_id)
+                .exclude(telefono="")
+                .order_by("id")
+                .only("id", "telefono")[:TAMANIO_LOTE]
+            )
+            if not lote:
+                break
+            for instancia in lote:
+                instancia.telefono_normalizado = solo_digitos_telefono(instancia.telefono)[:20]
+            modelo.objects.bulk_update(lote, ["telefono_normalizado"])
+            ultimo_id = lote[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0019_trigramapropietario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propietario',
+            name='telefono_normalizado',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='telefono_normalizado',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+        migrations.RunPython(completar_telefonos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def registrar_stock_inicial(apps, schema_editor):
+    Farmaco = apps.get_model("Core", "Farmaco")
+    MovimientoStock = apps.get_model("Core", "MovimientoStock")
+    MovimientoStock.objects.bulk_create(
+        [
+            MovimientoStock(farmaco_id=farmaco_id, cantidad=stock, motivo="ingreso")
+            for farmaco_id, stock in Farmaco.objects.filter(stock__gt=0).values_list("id", "stock").iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0020_telefono_normalizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.IntegerField()),
+                ('motivo', models.CharField(choices=[('ingreso', 'Ingreso inicial'), ('ajuste', 'Ajuste manual'), ('consumo', 'Consumo en consulta'), ('devolucion', 'Devolución de consulta')], max_length=20)),
+                ('creado', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cita', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_stock', to='Core.cita')),
+                ('farmaco', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='Core.farmaco')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_stock', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-creado', '-id'],
+                'indexes': [models.Index(fields=['farmaco', 'creado'], name='core_movstock_farm_idx')],
+            },
+        ),
+        migrations.RunPython(registrar_stock_inicial, migrations.RunPython.noop),
+    ]
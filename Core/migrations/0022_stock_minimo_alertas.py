@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0021_movimientostock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock', models.PositiveIntegerField()),
+                ('consumo_diario', models.FloatField()),
+                ('dias_restantes', models.FloatField(blank=True, null=True)),
+                ('bajo_minimo', models.BooleanField(default=False)),
+                ('calculado', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['sucursal', 'dias_restantes'],
+            },
+        ),
+        migrations.AddField(
+            model_name='farmaco',
+            name='stock_minimo',
+            field=models.PositiveIntegerField(default=5, help_text='Por debajo o igual a este stock el fármaco se considera crítico.'),
+        ),
+        migrations.AddIndex(
+            model_name='farmaco',
+            index=models.Index(condition=models.Q(('stock__lte', models.F('stock_minimo'))), fields=['sucursal', 'stock'], name='core_farmaco_bajo_min_idx'),
+        ),
+        migrations.AddField(
+            model_name='alertastock',
+            name='farmaco',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='alerta', to='Core.farmaco'),
+        ),
+        migrations.AddField(
+            model_name='alertastock',
+            name='sucursal',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas_stock', to='Core.sucursal'),
+        ),
+        migrations.AddIndex(
+            model_name='alertastock',
+            index=models.Index(fields=['sucursal', 'dias_restantes'], name='core_alerta_suc_dias_idx'),
+        ),
+    ]
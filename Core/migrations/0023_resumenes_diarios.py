@@ -0,0 +1,103 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+
+# Copia de la agregación de Core/resumenes.py al momento de esta migración,
+# con los campos que los resúmenes tienen acá: las migraciones no importan
+# código de la app, que puede cambiar después.
+def completar_resumenes(apps, schema_editor):
+    Cita = apps.get_model("Core", "Cita")
+    CitaFarmaco = apps.get_model("Core", "CitaFarmaco")
+    ResumenCitasDiario = apps.get_model("Core", "ResumenCitasDiario")
+    ResumenDispensacionDiaria = apps.get_model("Core", "ResumenDispensacionDiaria")
+
+    dispensaciones = (
+        CitaFarmaco.objects.order_by()
+        .values(
+            "farmaco_id",
+            dia=TruncDate("registrado"),
+            sucursal_id=F("cita__sucursal_id"),
+            veterinario_id=F("cita__veterinario_id"),
+        )
+        .annotate(
+            cantidad=Sum("cantidad"),
+            dispensaciones=Count("id"),
+            pacientes=Count("cita__paciente_id", distinct=True),
+        )
+    )
+    citas = (
+        Cita.objects.order_by()
+        .values(
+            "sucursal_id",
+            "veterinario_id",
+            "estado",
+            dia=Coalesce(TruncDate("fecha_hora"), "fecha_solicitada"),
+        )
+        .annotate(
+            total=Count("id", distinct=True),
+            pacientes=Count("paciente_id", distinct=True),
+            propietarios_medicados=Count(
+                "paciente__propietario_id",
+                distinct=True,
+                filter=Q(administraciones_farmacos__isnull=False),
+            ),
+            farmacos=Coalesce(Sum("administraciones_farmacos__cantidad"), 0),
+        )
+    )
+    ResumenDispensacionDiaria.objects.bulk_create(
+        (ResumenDispensacionDiaria(**fila) for fila in dispensaciones), batch_size=1000
+    )
+    ResumenCitasDiario.objects.bulk_create(
+        (ResumenCitasDiario(**fila) for fila in citas), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0022_stock_minimo_alertas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenCitasDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('programada', 'Programada'), ('atendida', 'Atendida'), ('cancelada', 'Cancelada')], max_length=20)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('pacientes', models.PositiveIntegerField(default=0)),
+                ('propietarios_medicados', models.PositiveIntegerField(default=0)),
+                ('farmacos', models.PositiveIntegerField(default=0)),
+                ('sucursal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_citas', to='Core.sucursal')),
+                ('veterinario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resumenes_citas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-dia'],
+                'indexes': [models.Index(fields=['sucursal', 'dia'], name='core_rescita_suc_dia_idx'), models.Index(fields=['estado', 'veterinario'], name='core_rescita_est_vet_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenDispensacionDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('dispensaciones', models.PositiveIntegerField(default=0)),
+                ('pacientes', models.PositiveIntegerField(default=0)),
+                ('farmaco', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_dispensacion', to='Core.farmaco')),
+                ('sucursal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_dispensacion', to='Core.sucursal')),
+                ('veterinario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resumenes_dispensacion', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-dia'],
+                'indexes': [models.Index(fields=['sucursal', 'dia'], name='core_resdisp_suc_dia_idx'), models.Index(fields=['dia'], name='core_resdisp_dia_idx')],
+            },
+        ),
+        migrations.RunPython(completar_resumenes, migrations.RunPython.noop),
+    ]
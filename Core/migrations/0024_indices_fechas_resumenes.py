@@ -0,0 +1,58 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:59
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def recalcular_dispensaciones(apps, schema_editor):
+    # Sin el veterinario quedan filas repetidas por día, sucursal y fármaco.
+    # Copia de la agregación de Core/resumenes.py al momento de esta
+    # migración: las migraciones no importan código de la app.
+    CitaFarmaco = apps.get_model("Core", "CitaFarmaco")
+    ResumenDispensacionDiaria = apps.get_model("Core", "ResumenDispensacionDiaria")
+
+    filas = (
+        CitaFarmaco.objects.order_by()
+        .values(
+            "farmaco_id",
+            dia=TruncDate("registrado"),
+            sucursal_id=F("cita__sucursal_id"),
+        )
+        .annotate(
+            cantidad=Sum("cantidad"),
+            dispensaciones=Count("id"),
+            pacientes=Count("cita__paciente_id", distinct=True),
+        )
+    )
+    ResumenDispensacionDiaria.objects.all().delete()
+    ResumenDispensacionDiaria.objects.bulk_create(
+        (ResumenDispensacionDiaria(**fila) for fila in filas), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0023_resumenes_diarios'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='resumendispensaciondiaria',
+            name='veterinario',
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['fecha_hora'], name='core_cita_fh_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['fecha_solicitada'], name='core_cita_fsol_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='citafarmaco',
+            index=models.Index(fields=['registrado'], name='core_citafarm_reg_idx'),
+        ),
+        migrations.RunPython(recalcular_dispensaciones, migrations.RunPython.noop),
+    ]
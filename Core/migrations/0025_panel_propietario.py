@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0024_indices_fechas_resumenes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PanelPropietario',
+            fields=[
+                ('propietario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='panel', serialize=False, to='Core.propietario')),
+                ('mascotas', models.PositiveIntegerField(default=0)),
+                ('citas_proximas', models.PositiveIntegerField(default=0)),
+                ('citas_sin_horario', models.PositiveIntegerField(default=0)),
+                ('informes', models.PositiveIntegerField(default=0)),
+                ('profesionales', models.PositiveIntegerField(default=0)),
+                ('vigente_hasta', models.DateTimeField(blank=True, null=True)),
+                ('calculado', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['paciente', 'fecha_hora'], name='core_cita_pac_fh_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historialmedico',
+            index=models.Index(fields=['paciente', 'fecha'], name='core_hist_pac_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+# Copia del esquema de Core/busqueda.py al momento de esta migración: las
+# migraciones no importan código de la app, que puede cambiar después.
+TABLA_FTS_PRODUCTOS = "core_producto_fts"
+INDICE_GIN_PRODUCTOS = "core_producto_busqueda_gin"
+CAMPOS_PRODUCTO = ("nombre", "descripcion")
+
+
+def _indice_postgres():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return GinIndex(SearchVector(*CAMPOS_PRODUCTO, config="spanish"), name=INDICE_GIN_PRODUCTOS)
+
+
+def crear_indice(apps, schema_editor):
+    Producto = apps.get_model("Core", "Producto")
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        columnas = ", ".join(connection.ops.quote_name(campo) for campo in CAMPOS_PRODUCTO)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS_PRODUCTOS} USING fts5("
+            f"{columnas}, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {TABLA_FTS_PRODUCTOS} (rowid, {columnas}) "
+            f"SELECT id, {columnas} FROM {connection.ops.quote_name(Producto._meta.db_table)}"
+        )
+    elif connection.vendor == "postgresql":
+        schema_editor.add_index(Producto, _indice_postgres())
+
+
+def eliminar_indice(apps, schema_editor):
+    Producto = apps.get_model("Core", "Producto")
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLA_FTS_PRODUCTOS}")
+    elif connection.vendor == "postgresql":
+        schema_editor.remove_index(Producto, _indice_postgres())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0025_panel_propietario'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
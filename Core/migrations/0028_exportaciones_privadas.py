@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:34
+
+import Core.models
+from django.core.files.storage import FileSystemStorage
+from django.db import migrations, models
+
+
+def mover_reportes_existentes(apps, schema_editor):
+    # Los reportes ya generados estaban en MEDIA_ROOT, servidos por /media/.
+    TrabajoExportacion = apps.get_model("Core", "TrabajoExportacion")
+    publico = FileSystemStorage()
+    privado = TrabajoExportacion._meta.get_field("archivo").storage
+    nombres = TrabajoExportacion.objects.exclude(archivo="").values_list("archivo", flat=True)
+    for nombre in nombres:
+        if publico.exists(nombre) and not privado.exists(nombre):
+            with publico.open(nombre, "rb") as archivo:
+                privado.save(nombre, archivo)
+        publico.delete(nombre)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0027_trabajoimagen'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='trabajoexportacion',
+            name='archivo',
+            field=models.FileField(blank=True, storage=Core.models.AlmacenamientoExportaciones(), upload_to='exportaciones/'),
+        ),
+        migrations.RunPython(mover_reportes_existentes, migrations.RunPython.noop),
+    ]
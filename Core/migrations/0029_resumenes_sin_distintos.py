@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0028_exportaciones_privadas'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='resumencitasdiario',
+            name='pacientes',
+        ),
+        migrations.RemoveField(
+            model_name='resumencitasdiario',
+            name='propietarios_medicados',
+        ),
+        migrations.RemoveField(
+            model_name='resumendispensaciondiaria',
+            name='pacientes',
+        ),
+    ]
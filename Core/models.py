@@ -1,11 +1,40 @@
+import os
 from decimal import Decimal
 
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.files.storage import FileSystemStorage
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.utils import timezone
 
 
+def solo_digitos_telefono(telefono: str) -> str:
+    return "".join(ch for ch in (telefono or "") if ch.isdigit())
+
+
+class TelefonoNormalizadoMixin(models.Model):
+    """Keep ``telefono_normalizado`` (digits only, indexed) in sync on save.
+
+    ``bulk_create``/``update`` no pasan por ``save``: quien los use debe
+    completar el campo a mano.
+    """
+
+    telefono_normalizado = models.CharField(
+        max_length=20, blank=True, db_index=True, editable=False
+    )
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.telefono_normalizado = solo_digitos_telefono(self.telefono)[:20]
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "telefono" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "telefono_normalizado"}
+        super().save(*args, **kwargs)
+
+
 # ----------------------------
 # Sucursal
 # ----------------------------
@@ -25,7 +54,7 @@ class Sucursal(models.Model):
 # ----------------------------
 # Usuario con rol propio
 # ----------------------------
-class User(AbstractUser):
+class User(TelefonoNormalizadoMixin, AbstractUser):
     ROLES = (
         ("ADMIN", "Administrador"),
         ("VET", "Veterinario"),
@@ -46,13 +75,17 @@ class User(AbstractUser):
         related_name="usuarios",
     )
 
+    # Con el mixin primero, el Meta heredado sería el suyo y no el de AbstractUser.
+    class Meta(AbstractUser.Meta):
+        pass
+
     def __str__(self):
         return f"{self.username} ({self.get_rol_display()})"
 
 # ----------------------------
 # Propietario
 # ----------------------------
-class Propietario(models.Model):
+class Propietario(TelefonoNormalizadoMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     telefono = models.CharField(max_length=20, blank=True)
     direccion = models.CharField(max_length=200, blank=True)
@@ -62,6 +95,28 @@ class Propietario(models.Model):
     def __str__(self):
         return self.user.get_full_name() or self.user.username
 
+
+class TrigramaPropietario(models.Model):
+    """Índice de trigramas para el buscador de propietarios (ver busqueda.py)."""
+
+    propietario = models.ForeignKey(
+        Propietario,
+        on_delete=models.CASCADE,
+        related_name="trigramas",
+    )
+    trigrama = models.CharField(max_length=3)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["trigrama", "propietario"],
+                name="core_trigrama_prop_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.trigrama!r} → {self.propietario_id}"
+
 # ----------------------------
 # Paciente / Mascota
 # ----------------------------
@@ -122,6 +177,34 @@ class Cita(models.Model):
         help_text="Medicamentos del inventario utilizados durante la atención.",
     )
 
+    class Meta:
+        # Índices alineados con los filtros más frecuentes de las vistas:
+        # agenda por sucursal/veterinario y estado, listados por fecha
+        # solicitada y la próxima cita programada de la landing.
+        indexes = [
+            models.Index(
+                fields=["sucursal", "estado", "fecha_hora"],
+                name="core_cita_suc_est_fh_idx",
+            ),
+            models.Index(
+                fields=["veterinario", "estado", "fecha_hora"],
+                name="core_cita_vet_est_fh_idx",
+            ),
+            models.Index(
+                fields=["sucursal", "fecha_solicitada"],
+                name="core_cita_suc_fsol_idx",
+            ),
+            models.Index(
+                fields=["estado", "fecha_hora"],
+                name="core_cita_est_fh_idx",
+            ),
+            # Recalculo de resúmenes diarios por rango de fechas.
+            models.Index(fields=["fecha_hora"], name="core_cita_fh_idx"),
+            models.Index(fields=["fecha_solicitada"], name="core_cita_fsol_idx"),
+            # Próximas y últimas citas del propietario en su dashboard.
+            models.Index(fields=["paciente", "fecha_hora"], name="core_cita_pac_fh_idx"),
+        ]
+
     def __str__(self):
         veterinario_nombre = (
             self.veterinario.username if self.veterinario else "Sin asignar"
@@ -141,11 +224,7 @@ class Cita(models.Model):
 
     def telefono_contacto(self) -> str:
         propietario = self.paciente.propietario
-        telefono = propietario.telefono or propietario.user.telefono or ""
-        telefono = telefono.strip()
-        if not telefono:
-            return ""
-        return "".join(ch for ch in telefono if ch.isdigit())
+        return propietario.telefono_normalizado or propietario.user.telefono_normalizado
 
     def mensaje_whatsapp(self) -> str:
         propietario = self.paciente.propietario.user
@@ -227,16 +306,62 @@ class Farmaco(models.Model):
     )
     descripcion = models.TextField()
     stock = models.PositiveIntegerField(default=0)
+    stock_minimo = models.PositiveIntegerField(
+        default=5,
+        help_text="Por debajo o igual a este stock el fármaco se considera crítico.",
+    )
     creado = models.DateTimeField(auto_now_add=True)
     actualizado = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["sucursal__nombre", "categoria", "nombre"]
         unique_together = ("sucursal", "nombre")
+        indexes = [
+            # Índice parcial: sólo contiene las filas bajo el mínimo, que son
+            # las que consultan las alertas.
+            models.Index(
+                fields=["sucursal", "stock"],
+                condition=models.Q(stock__lte=models.F("stock_minimo")),
+                name="core_farmaco_bajo_min_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.nombre} - {self.sucursal.nombre}"
 
+    @property
+    def bajo_minimo(self) -> bool:
+        return self.stock <= self.stock_minimo
+
+
+class AlertaStock(models.Model):
+    """Proyección de agotamiento calculada por ``calcular_alertas_stock``."""
+
+    farmaco = models.OneToOneField(
+        Farmaco,
+        on_delete=models.CASCADE,
+        related_name="alerta",
+    )
+    sucursal = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name="alertas_stock",
+    )
+    stock = models.PositiveIntegerField()
+    consumo_diario = models.FloatField()
+    dias_restantes = models.FloatField(null=True, blank=True)
+    bajo_minimo = models.BooleanField(default=False)
+    calculado = models.DateTimeField()
+
+    class Meta:
+        ordering = ["sucursal", "dias_restantes"]
+        indexes = [
+            models.Index(fields=["sucursal", "dias_restantes"], name="core_alerta_suc_dias_idx"),
+        ]
+
+    def __str__(self):
+        return f"Alerta {self.farmaco_id} ({self.dias_restantes} días)"
+
 
 class CitaFarmaco(models.Model):
     cita = models.ForeignKey(
@@ -255,11 +380,60 @@ class CitaFarmaco(models.Model):
     class Meta:
         ordering = ["farmaco__nombre"]
         unique_together = ("cita", "farmaco")
+        indexes = [
+            # Ventanas de consumo (alertas de stock) y resúmenes diarios.
+            models.Index(fields=["registrado"], name="core_citafarm_reg_idx"),
+        ]
 
     def __str__(self):
         return f"{self.cita_id} - {self.farmaco.nombre} ({self.cantidad})"
 
 
+class MovimientoStock(models.Model):
+    """Movimiento del libro de stock (sólo se agregan filas, nunca se editan).
+
+    La suma de ``cantidad`` por fármaco reconstruye su stock; ver stock.py.
+    """
+
+    class Motivo(models.TextChoices):
+        INGRESO = ("ingreso", "Ingreso inicial")
+        AJUSTE = ("ajuste", "Ajuste manual")
+        CONSUMO = ("consumo", "Consumo en consulta")
+        DEVOLUCION = ("devolucion", "Devolución de consulta")
+
+    farmaco = models.ForeignKey(
+        "Farmaco",
+        on_delete=models.CASCADE,
+        related_name="movimientos",
+    )
+    cantidad = models.IntegerField()
+    motivo = models.CharField(max_length=20, choices=Motivo.choices)
+    cita = models.ForeignKey(
+        "Cita",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="movimientos_stock",
+    )
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="movimientos_stock",
+    )
+    creado = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-creado", "-id"]
+        indexes = [
+            models.Index(fields=["farmaco", "creado"], name="core_movstock_farm_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_motivo_display()}: {self.cantidad:+d} ({self.farmaco_id})"
+
+
 # ----------------------------
 # Historial Médico
 # ----------------------------
@@ -284,6 +458,11 @@ class HistorialMedico(models.Model):
         related_name="historial_medico",
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["paciente", "fecha"], name="core_hist_pac_fecha_idx"),
+        ]
+
     def __str__(self):
         return f"Historial de {self.paciente.nombre} - {self.fecha.strftime('%d/%m/%Y')}"
 
@@ -318,8 +497,7 @@ class Producto(models.Model):
     @property
     def telefono_whatsapp(self) -> str:
         """Return a digits-only phone number suitable for wa.me links."""
-        telefono = (self.telefono_contacto or "").strip()
-        return "".join(ch for ch in telefono if ch.isdigit())
+        return solo_digitos_telefono(self.telefono_contacto)
 
     @property
     def mensaje_whatsapp(self) -> str:
@@ -387,3 +565,186 @@ class VacunaRegistro(models.Model):
 
     def __str__(self):
         return f"{self.vacuna.nombre} - {self.paciente.nombre} ({self.fecha_aplicacion:%d/%m/%Y})"
+
+
+# ----------------------------
+# Exportaciones en segundo plano
+# ----------------------------
+class AlmacenamientoExportaciones(FileSystemStorage):
+    """Reportes generados, guardados fuera de ``MEDIA_ROOT``.
+
+    Tienen datos personales de los propietarios: no tienen URL pública y sólo
+    se entregan desde ``DescargarExportacionView``, que controla permisos. La
+    ubicación se lee de ``EXPORTACIONES_ROOT`` en cada uso.
+    """
+
+    @property
+    def base_location(self):
+        return getattr(settings, "EXPORTACIONES_ROOT", settings.BASE_DIR / "exportaciones")
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    @property
+    def base_url(self):
+        return None
+
+
+class TrabajoExportacion(models.Model):
+    TIPOS = (
+        ("inventario", "Inventario farmacológico"),
+        ("propietario", "Expediente de propietario"),
+    )
+    FORMATOS = (
+        ("html", "Excel (.xls)"),
+        ("xlsx", "Excel (.xlsx)"),
+        ("csv", "CSV"),
+    )
+    ESTADOS = (
+        ("pendiente", "Pendiente"),
+        ("procesando", "Procesando"),
+        ("completado", "Completado"),
+        ("error", "Error"),
+    )
+
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    formato = models.CharField(max_length=10, choices=FORMATOS, default="html")
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default="pendiente")
+    solicitado_por = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="exportaciones",
+    )
+    archivo = models.FileField(
+        upload_to="exportaciones/", storage=AlmacenamientoExportaciones(), blank=True
+    )
+    nombre_archivo = models.CharField(max_length=200, blank=True)
+    error = models.TextField(blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(blank=True, null=True)
+    finalizado = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-creado"]
+        indexes = [
+            models.Index(fields=["estado", "creado"], name="core_export_cola_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} ({self.get_estado_display()})"
+
+
+class TrabajoImagen(models.Model):
+    """Foto subida pendiente de generar sus variantes reducidas."""
+
+    ESTADOS = TrabajoExportacion.ESTADOS
+
+    # Nombre del original en el storage (el ``name`` del ImageField).
+    ruta = models.CharField(max_length=255)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default="pendiente")
+    error = models.TextField(blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(blank=True, null=True)
+    finalizado = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-creado"]
+        indexes = [
+            models.Index(fields=["estado", "creado"], name="core_imagen_cola_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.ruta} ({self.get_estado_display()})"
+
+
+# ----------------------------
+# Resúmenes diarios para el módulo de análisis
+# ----------------------------
+class ResumenDispensacionDiaria(models.Model):
+    """Unidades dispensadas por día, sucursal y fármaco."""
+
+    dia = models.DateField()
+    sucursal = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name="resumenes_dispensacion",
+    )
+    farmaco = models.ForeignKey(
+        Farmaco,
+        on_delete=models.CASCADE,
+        related_name="resumenes_dispensacion",
+    )
+    cantidad = models.PositiveIntegerField(default=0)
+    dispensaciones = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-dia"]
+        indexes = [
+            models.Index(fields=["sucursal", "dia"], name="core_resdisp_suc_dia_idx"),
+            models.Index(fields=["dia"], name="core_resdisp_dia_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.dia:%d/%m/%Y} - {self.farmaco_id}: {self.cantidad}"
+
+
+class ResumenCitasDiario(models.Model):
+    """Citas por día, sucursal, veterinario y estado."""
+
+    dia = models.DateField()
+    sucursal = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name="resumenes_citas",
+    )
+    veterinario = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="resumenes_citas",
+    )
+    estado = models.CharField(max_length=20, choices=Cita.ESTADOS)
+    total = models.PositiveIntegerField(default=0)
+    farmacos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-dia"]
+        indexes = [
+            models.Index(fields=["sucursal", "dia"], name="core_rescita_suc_dia_idx"),
+            models.Index(fields=["estado", "veterinario"], name="core_rescita_est_vet_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.dia:%d/%m/%Y} - {self.estado}: {self.total}"
+
+
+# ----------------------------
+# Panel del propietario
+# ----------------------------
+class PanelPropietario(models.Model):
+    """Contadores del dashboard del propietario (ver panel_propietario.py)."""
+
+    propietario = models.OneToOneField(
+        Propietario,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="panel",
+    )
+    mascotas = models.PositiveIntegerField(default=0)
+    citas_proximas = models.PositiveIntegerField(default=0)
+    citas_sin_horario = models.PositiveIntegerField(default=0)
+    informes = models.PositiveIntegerField(default=0)
+    profesionales = models.PositiveIntegerField(default=0)
+    # Hora de la próxima cita: pasado ese momento los contadores quedan viejos.
+    vigente_hasta = models.DateTimeField(null=True, blank=True)
+    calculado = models.DateTimeField()
+
+    def __str__(self):
+        return f"Panel de {self.propietario_id}"
+
+    @property
+    def citas_activas(self):
+        return self.citas_proximas + self.citas_sin_horario
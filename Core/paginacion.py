@@ -0,0 +1,155 @@
+"""Paginación por cursor (keyset) para listados grandes.
+
+En lugar de ``OFFSET`` cada página se pide "a partir de" la última fila vista,
+así la base sólo lee ``por_pagina + 1`` filas sin importar cuán lejos se
+navegue. El orden debe terminar en un campo único (normalmente ``id``) para
+que el cursor sea determinista. Los campos que admiten NULL se ordenan con
+los NULL al final en la dirección normal del listado.
+"""
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+
+POR_PAGINA_PREDETERMINADO = 50
+
+
+def _campos_orden(modelo, orden):
+    campos = []
+    for nombre in orden:
+        descendente = nombre.startswith("-")
+        nombre = nombre.lstrip("-")
+        campos.append((nombre, descendente, modelo._meta.get_field(nombre)))
+    return campos
+
+
+def _expresiones_orden(campos, invertir=False):
+    # Al invertir se recorre el listado de atrás hacia adelante, por eso los
+    # NULL (que van al final) pasan a ir primero.
+    nulos = {"nulls_first": True} if invertir else {"nulls_last": True}
+    expresiones = []
+    for nombre, descendente, _campo in campos:
+        expresion = F(nombre)
+        if descendente != invertir:
+            expresiones.append(expresion.desc(**nulos))
+        else:
+            expresiones.append(expresion.asc(**nulos))
+    return expresiones
+
+
+def _q_igual(nombre, valor):
+    if valor is None:
+        return Q(**{f"{nombre}__isnull": True})
+    return Q(**{nombre: valor})
+
+
+def _q_posterior(nombre, descendente, campo, valor):
+    """Filas que van estrictamente después de ``valor`` en el orden normal."""
+
+    if valor is None:
+        return None
+    condicion = Q(**{f"{nombre}__{'lt' if descendente else 'gt'}": valor})
+    if campo.null:
+        condicion |= Q(**{f"{nombre}__isnull": True})
+    return condicion
+
+
+def _q_anterior(nombre, descendente, campo, valor):
+    """Filas que van estrictamente antes de ``valor`` en el orden normal."""
+
+    if valor is None:
+        return Q(**{f"{nombre}__isnull": False})
+    return Q(**{f"{nombre}__{'gt' if descendente else 'lt'}": valor})
+
+
+def _filtro_cursor(campos, valores, armar_condicion):
+    filtro = Q(pk__in=[])
+    prefijo = Q()
+    for (nombre, descendente, campo), valor in zip(campos, valores):
+        condicion = armar_condicion(nombre, descendente, campo, valor)
+        if condicion is not None:
+            filtro |= prefijo & condicion
+        prefijo &= _q_igual(nombre, valor)
+    return filtro
+
+
+def codificar_cursor(objeto, campos):
+    valores = []
+    for nombre, _descendente, _campo in campos:
+        valor = getattr(objeto, nombre)
+        valores.append(valor.isoformat() if hasattr(valor, "isoformat") else valor)
+    contenido = json.dumps(valores, separators=(",", ":")).encode()
+    return urlsafe_b64encode(contenido).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor, campos):
+    """Return the cursor values, or None if the cursor is missing or invalid."""
+
+    if not cursor:
+        return None
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(urlsafe_b64decode(cursor + relleno))
+        if not isinstance(valores, list) or len(valores) != len(campos):
+            return None
+        return [
+            None if valor is None else campo.to_python(valor)
+            for (_nombre, _descendente, campo), valor in zip(campos, valores)
+        ]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def paginar_por_cursor(queryset, orden, despues=None, antes=None, por_pagina=POR_PAGINA_PREDETERMINADO):
+    """Return one page of ``queryset`` plus the cursors around it.
+
+    ``orden`` usa la notación de ``order_by`` (``"-campo"`` para descendente).
+    ``despues`` avanza hacia el final del listado y ``antes`` retrocede; un
+    cursor inválido se ignora y se muestra la primera página.
+    """
+
+    campos = _campos_orden(queryset.model, orden)
+    valores_antes = decodificar_cursor(antes, campos)
+    valores_despues = None if valores_antes else decodificar_cursor(despues, campos)
+
+    if valores_antes:
+        filas = list(
+            queryset.filter(_filtro_cursor(campos, valores_antes, _q_anterior))
+            .order_by(*_expresiones_orden(campos, invertir=True))[: por_pagina + 1]
+        )
+        hay_mas = len(filas) > por_pagina
+        items = filas[:por_pagina][::-1]
+        anterior = codificar_cursor(items[0], campos) if hay_mas else None
+        siguiente = codificar_cursor(items[-1], campos) if items else None
+    else:
+        if valores_despues:
+            queryset = queryset.filter(_filtro_cursor(campos, valores_despues, _q_posterior))
+        filas = list(queryset.order_by(*_expresiones_orden(campos))[: por_pagina + 1])
+        hay_mas = len(filas) > por_pagina
+        items = filas[:por_pagina]
+        siguiente = codificar_cursor(items[-1], campos) if hay_mas else None
+        anterior = codificar_cursor(items[0], campos) if valores_despues and items else None
+
+    return {"items": items, "siguiente": siguiente, "anterior": anterior}
+
+
+def urls_paginacion(request, pagina, despues_param="despues", antes_param="antes"):
+    """Build the previous/next links keeping the rest of the query string."""
+
+    parametros = request.GET.copy()
+    parametros.pop(despues_param, None)
+    parametros.pop(antes_param, None)
+
+    def construir(nombre, cursor):
+        if not cursor:
+            return ""
+        parametros_pagina = parametros.copy()
+        parametros_pagina[nombre] = cursor
+        return f"?{parametros_pagina.urlencode()}"
+
+    return {
+        "siguiente_url": construir(despues_param, pagina["siguiente"]),
+        "anterior_url": construir(antes_param, pagina["anterior"]),
+    }
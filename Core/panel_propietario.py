@@ -0,0 +1,143 @@
+"""Panel del propietario: una fila con los contadores de su dashboard.
+
+El dashboard del propietario cargaba todas sus mascotas, citas e historiales
+y los filtraba y ordenaba en Python en cada visita. Ahora los contadores
+salen de ``PanelPropietario`` (una fila por clave primaria) y las listas de
+próximas citas, citas recientes e historiales son consultas de cinco filas.
+
+Las señales de ``Cita``, ``HistorialMedico`` y ``Paciente`` marcan los
+propietarios afectados y su fila se recalcula al confirmar la transacción.
+Lo único que cambia sin escrituras es el paso del tiempo: la fila guarda en
+``vigente_hasta`` la hora de la próxima cita y se recalcula al leerla si ese
+momento ya pasó. Si todavía no existe (propietarios anteriores a la tabla o
+cargas masivas sin ``reconstruir_derivados``) se crea al primer acceso.
+"""
+
+import threading
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Cita, HistorialMedico, Paciente, PanelPropietario, Propietario
+
+CAMPOS_PANEL = (
+    "mascotas",
+    "citas_proximas",
+    "citas_sin_horario",
+    "informes",
+    "profesionales",
+    "vigente_hasta",
+    "calculado",
+)
+
+_estado = threading.local()
+
+
+def _conteo(queryset, campo, total=Count("pk")):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{campo: OuterRef("pk")})
+            .order_by()
+            .values(campo)
+            .annotate(total=total)
+            .values("total")
+        ),
+        0,
+    )
+
+
+def _calcular(propietario_ids, ahora):
+    citas = Cita.objects.all()
+    queryset = Propietario.objects.order_by()
+    if propietario_ids is not None:
+        queryset = queryset.filter(pk__in=propietario_ids)
+    filas = queryset.values(
+        "pk",
+        mascotas=_conteo(Paciente.objects.all(), "propietario"),
+        citas_proximas=_conteo(citas.filter(fecha_hora__gte=ahora), "paciente__propietario"),
+        citas_sin_horario=_conteo(citas.filter(fecha_hora__isnull=True), "paciente__propietario"),
+        informes=_conteo(HistorialMedico.objects.all(), "paciente__propietario"),
+        profesionales=_conteo(
+            citas.filter(veterinario__isnull=False),
+            "paciente__propietario",
+            Count("veterinario", distinct=True),
+        ),
+        vigente_hasta=Subquery(
+            citas.filter(paciente__propietario=OuterRef("pk"), fecha_hora__gte=ahora)
+            .order_by("fecha_hora")
+            .values("fecha_hora")[:1]
+        ),
+    )
+    return [
+        PanelPropietario(propietario_id=fila.pop("pk"), calculado=ahora, **fila)
+        for fila in filas
+    ]
+
+
+def recalcular_paneles(propietario_ids=None):
+    """Rebuild the panel rows of ``propietario_ids``, or of every owner."""
+
+    if propietario_ids is not None:
+        propietario_ids = {pk for pk in propietario_ids if pk}
+        if not propietario_ids:
+            return []
+    paneles = _calcular(propietario_ids, timezone.now())
+    # Upsert en lugar de borrar e insertar: dos requests que refrescan el
+    # mismo panel a la vez no chocan con la clave primaria.
+    return PanelPropietario.objects.bulk_create(
+        paneles,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["propietario"],
+        update_fields=CAMPOS_PANEL,
+    )
+
+
+def panel_propietario(propietario):
+    """Return the owner's panel, recomputing it when missing or stale.
+
+    Si ``propietario`` viene con ``select_related("panel")`` no hace consultas.
+    """
+
+    try:
+        panel = propietario.panel
+    except PanelPropietario.DoesNotExist:
+        panel = None
+    if panel is None or (panel.vigente_hasta and panel.vigente_hasta < timezone.now()):
+        panel = recalcular_paneles([propietario.pk])[0]
+    return panel
+
+
+def propietario_de(instancia):
+    """Owner id behind anything with a ``paciente`` FK, without loading it twice."""
+
+    if type(instancia).paciente.is_cached(instancia):
+        return instancia.paciente.propietario_id
+    # En borrados en cascada el paciente puede no existir más; su propio
+    # post_delete ya marca al propietario.
+    return (
+        Paciente.objects.filter(pk=instancia.paciente_id)
+        .values_list("propietario_id", flat=True)
+        .first()
+    )
+
+
+def _recalcular_pendientes():
+    pendientes = getattr(_estado, "propietarios", None)
+    if pendientes:
+        _estado.propietarios = set()
+        recalcular_paneles(pendientes)
+
+
+def programar_actualizacion_panel(*propietario_ids):
+    """Recompute the panels of ``propietario_ids`` once the transaction commits."""
+
+    propietario_ids = {pk for pk in propietario_ids if pk}
+    if not propietario_ids:
+        return
+    if not hasattr(_estado, "propietarios"):
+        _estado.propietarios = set()
+    _estado.propietarios |= propietario_ids
+    transaction.on_commit(_recalcular_pendientes)
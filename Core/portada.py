@@ -0,0 +1,83 @@
+"""Datos públicos de la landing, precalculados y guardados en caché.
+
+La landing es pública y recibe picos de tráfico de campañas y crawlers;
+cada visita contaba productos, propietarios, pacientes, veterinarios y
+citas y buscaba la próxima cita con tres joins. Ahora todo eso se calcula
+una vez y se guarda en una sola entrada de caché que se renueva cada
+``PORTADA_CACHE_SEGUNDOS``. Los contadores pueden atrasar hasta ese tiempo.
+Los productos sí se ven en la página, así que guardar o borrar un
+``Producto`` descarta la entrada al confirmar la transacción.
+
+Cada cálculo lleva una versión y su hora, que la vista usa como ``ETag`` y
+``Last-Modified``: un visitante anónimo que ya tiene la página recibe un
+304 sin que se toque la base.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Cita, Paciente, Producto, Propietario, User
+from .schema import modelos_disponibles
+
+PORTADA_CACHE_SEGUNDOS = 5 * 60
+# Cuánto pueden reutilizar la página navegadores y proxies sin preguntar.
+PORTADA_PUBLICA_SEGUNDOS = 60
+CLAVE_PORTADA = "core:portada:datos"
+
+
+def _calcular():
+    productos_destacados = []
+    total_productos = 0
+    if modelos_disponibles(Producto):
+        productos_destacados = list(Producto.objects.filter(disponible=True)[:6])
+        total_productos = Producto.objects.filter(disponible=True).count()
+
+    citas_programadas = Cita.objects.filter(estado="programada").exclude(
+        fecha_hora__isnull=True
+    )
+    cita_proxima = (
+        citas_programadas.filter(fecha_hora__gte=timezone.now())
+        .order_by("fecha_hora")
+        .select_related("paciente", "veterinario", "paciente__propietario__user")
+        .first()
+    )
+
+    nombre_veterinario = ""
+    nombre_propietario = ""
+    if cita_proxima:
+        if cita_proxima.veterinario:
+            nombre_veterinario = (
+                cita_proxima.veterinario.get_full_name() or cita_proxima.veterinario.username
+            )
+        propietario_user = cita_proxima.paciente.propietario.user
+        nombre_propietario = propietario_user.get_full_name() or propietario_user.username
+
+    return {
+        "productos_destacados": productos_destacados,
+        "total_productos": total_productos,
+        "total_propietarios": Propietario.objects.count(),
+        "total_pacientes": Paciente.objects.count(),
+        "total_veterinarios": User.objects.filter(rol="VET").count(),
+        "total_citas_programadas": citas_programadas.count(),
+        "cita_proxima": cita_proxima,
+        "cita_proxima_veterinario": nombre_veterinario,
+        "cita_proxima_propietario": nombre_propietario,
+    }
+
+
+def datos_portada():
+    """Return ``(contexto, version, actualizado)`` for the landing page."""
+
+    datos = cache.get(CLAVE_PORTADA)
+    if datos is None:
+        # Sin microsegundos: Last-Modified sólo tiene precisión de segundos.
+        datos = (_calcular(), str(time.time_ns()), timezone.now().replace(microsecond=0))
+        cache.set(CLAVE_PORTADA, datos, PORTADA_CACHE_SEGUNDOS)
+    return datos
+
+
+def invalidar_portada():
+    transaction.on_commit(lambda: cache.delete(CLAVE_PORTADA))
@@ -0,0 +1,156 @@
+"""Tablas de resumen diario que alimentan el módulo de análisis.
+
+El dashboard de análisis agregaba ``CitaFarmaco`` y ``Cita`` con joins hasta
+el propietario en cada carga. Ahora lee ``ResumenDispensacionDiaria`` y
+``ResumenCitasDiario``, una fila por día y dimensión, así que cambiar de
+periodo es sumar unas pocas filas. Sólo guardan valores que se pueden
+sumar entre días: los pacientes o propietarios distintos de un periodo no
+son la suma de los de cada día, y el dashboard los cuenta sobre las tablas
+base acotadas al periodo.
+
+Los resúmenes se recalculan por día completo (borrar e insertar), lo que
+los hace idempotentes: las señales marcan los días tocados y se recalculan
+al confirmar la transacción, y el comando ``actualizar_resumenes`` los
+reconstruye después de cargas masivas que no disparan señales.
+"""
+
+import threading
+from datetime import datetime, time, timedelta
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+_estado = threading.local()
+
+
+def dia_local(momento):
+    return timezone.localdate(momento) if momento else None
+
+
+def dia_cita(cita):
+    """Day a ``Cita`` is summarized under: its schedule, else its request date."""
+
+    fecha_solicitada = cita.fecha_solicitada
+    if isinstance(fecha_solicitada, datetime):
+        # El default del campo es timezone.now: hasta recargarse es un datetime.
+        fecha_solicitada = dia_local(fecha_solicitada)
+    return dia_local(cita.fecha_hora) or fecha_solicitada
+
+
+def _rango_dia(dia):
+    inicio = timezone.make_aware(datetime.combine(dia, time.min))
+    return inicio, inicio + timedelta(days=1)
+
+
+def _filtro_dias(campo, dias):
+    # Los días consecutivos se unen en un solo rango para aprovechar el índice.
+    tramos = []
+    for dia in sorted(dias):
+        if tramos and tramos[-1][1] == dia - timedelta(days=1):
+            tramos[-1][1] = dia
+        else:
+            tramos.append([dia, dia])
+
+    filtro = Q(pk__in=[])
+    for desde, hasta in tramos:
+        filtro |= Q(
+            **{f"{campo}__gte": _rango_dia(desde)[0], f"{campo}__lt": _rango_dia(hasta)[1]}
+        )
+    return filtro
+
+
+def _filas_dispensacion(dias):
+    CitaFarmaco = apps.get_model("Core", "CitaFarmaco")
+    queryset = CitaFarmaco.objects.all()
+    if dias is not None:
+        queryset = queryset.filter(_filtro_dias("registrado", dias))
+    return (
+        queryset.order_by()
+        .values(
+            "farmaco_id",
+            dia=TruncDate("registrado"),
+            sucursal_id=F("cita__sucursal_id"),
+        )
+        .annotate(
+            cantidad=Sum("cantidad"),
+            dispensaciones=Count("id"),
+        )
+    )
+
+
+def _filas_citas(dias):
+    Cita = apps.get_model("Core", "Cita")
+    queryset = Cita.objects.all()
+    if dias is not None:
+        queryset = queryset.filter(
+            _filtro_dias("fecha_hora", dias)
+            | Q(fecha_hora__isnull=True, fecha_solicitada__in=dias)
+        )
+    return (
+        queryset.order_by()
+        .values(
+            "sucursal_id",
+            "veterinario_id",
+            "estado",
+            dia=Coalesce(TruncDate("fecha_hora"), "fecha_solicitada"),
+        )
+        .annotate(
+            total=Count("id", distinct=True),
+            farmacos=Coalesce(Sum("administraciones_farmacos__cantidad"), 0),
+        )
+    )
+
+
+def recalcular_resumenes(dias=None):
+    """Rebuild the rollups for ``dias`` (an iterable of dates), or all of them."""
+
+    ResumenDispensacionDiaria = apps.get_model("Core", "ResumenDispensacionDiaria")
+    ResumenCitasDiario = apps.get_model("Core", "ResumenCitasDiario")
+    if dias is not None:
+        dias = sorted({dia for dia in dias if dia})
+        if not dias:
+            return 0
+
+    dispensaciones = [
+        ResumenDispensacionDiaria(**fila) for fila in _filas_dispensacion(dias)
+    ]
+    citas = [ResumenCitasDiario(**fila) for fila in _filas_citas(dias)]
+
+    with transaction.atomic():
+        anteriores_disp = ResumenDispensacionDiaria.objects.all()
+        anteriores_citas = ResumenCitasDiario.objects.all()
+        if dias is not None:
+            anteriores_disp = anteriores_disp.filter(dia__in=dias)
+            anteriores_citas = anteriores_citas.filter(dia__in=dias)
+        anteriores_disp.delete()
+        anteriores_citas.delete()
+        ResumenDispensacionDiaria.objects.bulk_create(dispensaciones, batch_size=1000)
+        ResumenCitasDiario.objects.bulk_create(citas, batch_size=1000)
+    return len(dispensaciones) + len(citas)
+
+
+def _recalcular_pendientes():
+    pendientes = getattr(_estado, "dias", None)
+    if pendientes:
+        _estado.dias = set()
+        recalcular_resumenes(pendientes)
+
+
+def programar_recalculo(*dias):
+    """Recompute ``dias`` once the current transaction commits.
+
+    Los días se acumulan por hilo: varias señales dentro de la misma
+    transacción terminan en un único recálculo. Si la transacción se
+    revierte, los días quedan para el próximo commit, lo cual es inocuo.
+    """
+
+    dias = {dia for dia in dias if dia}
+    if not dias:
+        return
+    if not hasattr(_estado, "dias"):
+        _estado.dias = set()
+    _estado.dias |= dias
+    transaction.on_commit(_recalcular_pendientes)
@@ -0,0 +1,56 @@
+"""Registro de tablas disponibles en la base de datos.
+
+Las vistas consultan si ciertas tablas existen (tienda, vacunas) para poder
+funcionar aunque falten migraciones. Listar las tablas en cada request es
+costoso, así que el resultado se guarda por alias de conexión y se descarta
+cuando se ejecuta ``migrate`` (señal ``post_migrate``).
+"""
+
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import OperationalError, ProgrammingError
+
+
+_tablas_por_alias = {}
+_lock = threading.Lock()
+
+
+def tablas_disponibles(using=DEFAULT_DB_ALIAS) -> frozenset:
+    """Return the set of table names present in the database ``using``."""
+
+    tablas = _tablas_por_alias.get(using)
+    if tablas is not None:
+        return tablas
+
+    with _lock:
+        tablas = _tablas_por_alias.get(using)
+        if tablas is None:
+            try:
+                tablas = frozenset(connections[using].introspection.table_names())
+            except (OperationalError, ProgrammingError):
+                # No se cachea: la base puede quedar disponible más adelante.
+                return frozenset()
+            _tablas_por_alias[using] = tablas
+    return tablas
+
+
+def modelos_disponibles(*modelos, using=DEFAULT_DB_ALIAS) -> bool:
+    """Return True if the tables of every given model exist."""
+
+    tablas = tablas_disponibles(using)
+    return all(modelo._meta.db_table in tablas for modelo in modelos)
+
+
+def invalidar_tablas_disponibles(using=None):
+    """Forget the cached table names (for one alias or for all of them)."""
+
+    with _lock:
+        if using is None:
+            _tablas_por_alias.clear()
+        else:
+            _tablas_por_alias.pop(using, None)
+
+
+def invalidar_tras_migrate(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    invalidar_tablas_disponibles(using)
@@ -1,11 +1,39 @@
 from django.apps import apps
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
+from .busqueda import (
+    desindexar_historial,
+    desindexar_producto,
+    indexar_historial,
+    indexar_producto,
+    indexar_propietario,
+)
+from .cache_dashboard import invalidar_dashboard, sucursales_de_paciente
+from .catalogo import invalidar_catalogo
+from .imagenes import imagenes_subidas, programar_variantes
+from .inventario import invalidar_inventario
+from .models import (
+    Cita,
+    CitaFarmaco,
+    Farmaco,
+    HistorialMedico,
+    MovimientoStock,
+    Paciente,
+    Producto,
+    Propietario,
+    Sucursal,
+)
+from .panel_propietario import programar_actualizacion_panel, propietario_de
+from .portada import invalidar_portada
+from .resumenes import dia_cita, dia_local, programar_recalculo
+
 
 User = get_user_model()
 
+CAMPOS_USUARIO_INDEXADOS = {"first_name", "last_name", "email", "username", "telefono"}
+
 
 @receiver(post_save, sender=User)
 def bootstrap_related_profiles(sender, instance, created, **kwargs):
@@ -27,3 +55,257 @@ def bootstrap_related_profiles(sender, instance, created, **kwargs):
                 "direccion": instance.direccion,
             },
         )
+
+
+@receiver(post_save, sender=HistorialMedico)
+def indexar_historial_guardado(sender, instance, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    indexar_historial(instance, using=using)
+
+
+@receiver(post_delete, sender=HistorialMedico)
+def desindexar_historial_eliminado(sender, instance, using=None, **kwargs):
+    desindexar_historial(instance.pk, using=using)
+
+
+@receiver(post_save, sender=Propietario)
+def indexar_propietario_guardado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    indexar_propietario(instance)
+
+
+@receiver(post_save, sender=User)
+def reindexar_propietario_de_usuario(
+    sender, instance, created, raw=False, update_fields=None, **kwargs
+):
+    # Al crearse, bootstrap_related_profiles ya crea (e indexa) el propietario.
+    if raw or created or instance.rol != "OWNER":
+        return
+    # Cada inicio de sesión guarda sólo last_login: no hace falta reindexar.
+    if update_fields is not None and not set(update_fields) & CAMPOS_USUARIO_INDEXADOS:
+        return
+    propietario = Propietario.objects.filter(user=instance).first()
+    if propietario is not None:
+        propietario.user = instance
+        indexar_propietario(propietario)
+
+
+@receiver(pre_save, sender=Farmaco)
+def recordar_estado_farmaco(sender, instance, raw=False, **kwargs):
+    # Si el fármaco cambia de sucursal hay que invalidar ambas, y si cambia el
+    # stock a mano se registra el ajuste en el libro de movimientos.
+    instance._sucursal_anterior_id = None
+    instance._stock_anterior = 0
+    if instance.pk and not raw:
+        anterior = (
+            Farmaco.objects.filter(pk=instance.pk).values_list("sucursal_id", "stock").first()
+        )
+        if anterior is not None:
+            instance._sucursal_anterior_id, instance._stock_anterior = anterior
+
+
+@receiver(post_save, sender=Farmaco)
+def registrar_ajuste_stock(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    diferencia = instance.stock - getattr(instance, "_stock_anterior", 0)
+    if diferencia:
+        MovimientoStock.objects.create(
+            farmaco=instance,
+            cantidad=diferencia,
+            motivo=(
+                MovimientoStock.Motivo.INGRESO if created else MovimientoStock.Motivo.AJUSTE
+            ),
+        )
+
+
+@receiver(post_save, sender=Farmaco)
+@receiver(post_delete, sender=Farmaco)
+def invalidar_inventario_farmaco(sender, instance, **kwargs):
+    invalidar_inventario(
+        instance.sucursal_id,
+        *{getattr(instance, "_sucursal_anterior_id", None)} - {instance.sucursal_id},
+    )
+
+
+@receiver(pre_save, sender=Cita)
+def recordar_estado_cita(sender, instance, raw=False, **kwargs):
+    # Si la cita cambia de día hay que recalcular también el resumen del día
+    # anterior; si cambia de veterinario o sucursal, además sus dispensaciones.
+    # Si cambia de paciente, el panel del propietario anterior.
+    instance._resumen_anterior = None
+    if instance.pk and not raw:
+        instance._resumen_anterior = (
+            Cita.objects.filter(pk=instance.pk)
+            .values_list(
+                "fecha_hora",
+                "fecha_solicitada",
+                "veterinario_id",
+                "sucursal_id",
+                "paciente__propietario_id",
+            )
+            .first()
+        )
+
+
+@receiver(post_save, sender=Cita)
+def actualizar_resumen_cita(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    dias = {dia_cita(instance)}
+    anterior = getattr(instance, "_resumen_anterior", None)
+    if anterior is not None:
+        fecha_hora, fecha_solicitada, veterinario_id, sucursal_id, _propietario_id = anterior
+        dias.add(dia_local(fecha_hora) or fecha_solicitada)
+        if (veterinario_id, sucursal_id) != (instance.veterinario_id, instance.sucursal_id):
+            dias.update(
+                dia_local(registrado)
+                for registrado in instance.administraciones_farmacos.values_list(
+                    "registrado", flat=True
+                )
+            )
+    programar_recalculo(*dias)
+
+
+@receiver(post_delete, sender=Cita)
+def actualizar_resumen_cita_eliminada(sender, instance, **kwargs):
+    programar_recalculo(dia_cita(instance))
+
+
+@receiver(post_save, sender=CitaFarmaco)
+@receiver(post_delete, sender=CitaFarmaco)
+def actualizar_resumen_dispensacion(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # El resumen de citas del día de la cita también cuenta los fármacos.
+    cita = (
+        Cita.objects.filter(pk=instance.cita_id)
+        .values_list("fecha_hora", "fecha_solicitada")
+        .first()
+    )
+    programar_recalculo(
+        dia_local(instance.registrado),
+        cita and (dia_local(cita[0]) or cita[1]),
+    )
+
+
+@receiver(post_save, sender=Cita)
+def actualizar_panel_cita(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, "_resumen_anterior", None)
+    programar_actualizacion_panel(propietario_de(instance), anterior and anterior[-1])
+
+
+@receiver(post_delete, sender=Cita)
+@receiver(post_save, sender=HistorialMedico)
+@receiver(post_delete, sender=HistorialMedico)
+def actualizar_panel_paciente_relacionado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    programar_actualizacion_panel(propietario_de(instance))
+
+
+@receiver(pre_save, sender=Paciente)
+def recordar_propietario_paciente(sender, instance, raw=False, **kwargs):
+    instance._propietario_anterior_id = None
+    if instance.pk and not raw:
+        instance._propietario_anterior_id = (
+            Paciente.objects.filter(pk=instance.pk).values_list("propietario_id", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Paciente)
+@receiver(post_delete, sender=Paciente)
+def actualizar_panel_mascota(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    programar_actualizacion_panel(
+        instance.propietario_id, getattr(instance, "_propietario_anterior_id", None)
+    )
+
+
+@receiver(post_save, sender=Cita)
+@receiver(post_delete, sender=Cita)
+def invalidar_dashboard_cita(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, "_resumen_anterior", None)
+    invalidar_dashboard(instance.sucursal_id, anterior and anterior[3])
+
+
+@receiver(post_save, sender=Paciente)
+@receiver(post_delete, sender=Paciente)
+def invalidar_dashboard_paciente(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidar_dashboard(*sucursales_de_paciente(instance.pk))
+
+
+@receiver(post_save, sender=HistorialMedico)
+@receiver(post_delete, sender=HistorialMedico)
+def invalidar_dashboard_historial(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidar_dashboard(*sucursales_de_paciente(instance.paciente_id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidar_dashboard_usuario(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Cada inicio de sesión guarda last_login; eso no cambia el dashboard.
+    if raw or (update_fields and set(update_fields) == {"last_login"}):
+        return
+    invalidar_dashboard(instance.sucursal_id)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_dashboard_producto(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidar_dashboard(todo=True)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_portada_producto(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidar_portada()
+
+
+@receiver(post_save, sender=Producto)
+def indexar_producto_guardado(sender, instance, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    indexar_producto(instance, using=using)
+    invalidar_catalogo()
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto_eliminado(sender, instance, using=None, **kwargs):
+    desindexar_producto(instance.pk, using=using)
+    invalidar_catalogo()
+
+
+@receiver(pre_save, sender=Paciente)
+@receiver(pre_save, sender=Producto)
+@receiver(pre_save, sender=Sucursal)
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=HistorialMedico)
+def recordar_imagenes_subidas(sender, instance, raw=False, update_fields=None, **kwargs):
+    # El nombre definitivo del archivo se conoce recién después de guardar.
+    instance._imagenes_subidas = [] if raw else imagenes_subidas(instance, update_fields)
+
+
+@receiver(post_save, sender=Paciente)
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Sucursal)
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=HistorialMedico)
+def encolar_variantes_imagenes(sender, instance, raw=False, **kwargs):
+    campos = getattr(instance, "_imagenes_subidas", ())
+    programar_variantes(*(getattr(instance, campo).name for campo in campos))
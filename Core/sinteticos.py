@@ -0,0 +1,368 @@
+"""Generador determinista de una clínica sintética grande para benchmarks.
+
+Todo se inserta con ``bulk_create`` por lotes y con una semilla fija: dos
+corridas con los mismos parámetros sobre una base vacía generan los mismos
+datos (las fechas son relativas al día de la corrida). Los datos derivados
+que normalmente mantienen las señales se reconstruyen al final con
+``carga_masiva.reconstruir_derivados``.
+"""
+
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .carga_masiva import (
+    TAMANIO_LOTE,
+    completar_telefono,
+    en_lotes,
+    hash_contrasena,
+    reconstruir_derivados,
+    registrar_ingresos_iniciales,
+    sin_auto_now,
+)
+from .models import (
+    Cita,
+    CitaFarmaco,
+    Farmaco,
+    HistorialMedico,
+    Paciente,
+    Propietario,
+    Sucursal,
+    User,
+)
+
+ESCALA_PREDETERMINADA = {
+    "sucursales": 20,
+    "veterinarios": 500,
+    "propietarios": 200_000,
+    "pacientes": 400_000,
+    "citas": 5_000_000,
+}
+FARMACOS_POR_SUCURSAL = 60
+DIAS_HISTORIA = 365
+DIAS_FUTURO = 30
+
+NOMBRES = (
+    "Ana", "Bruno", "Carla", "Diego", "Elena", "Facundo", "Gabriela", "Hernán",
+    "Inés", "Julián", "Lucía", "Martín", "Natalia", "Óscar", "Paula", "Ramiro",
+    "Sofía", "Tomás", "Valeria", "Ximena",
+)
+APELLIDOS = (
+    "Acosta", "Benítez", "Córdoba", "Domínguez", "Fernández", "Giménez", "Herrera",
+    "Ibáñez", "Juárez", "López", "Medina", "Núñez", "Ortiz", "Peralta", "Quiroga",
+    "Romero", "Suárez", "Torres", "Vega", "Zárate",
+)
+MASCOTAS = (
+    "Luna", "Toby", "Milo", "Kira", "Rocco", "Nala", "Simba", "Mora", "Thor",
+    "Lola", "Coco", "Frida", "Bobby", "Maia", "Pancho", "Olivia",
+)
+ESPECIES = (
+    ("Perro", ("Mestizo", "Labrador", "Caniche", "Golden", "Bulldog")),
+    ("Gato", ("Común europeo", "Siamés", "Persa")),
+    ("Conejo", ("Enano", "Belier")),
+)
+DIAGNOSTICOS = (
+    ("Otitis externa", "Limpieza y gotas óticas por 7 días."),
+    ("Gastroenteritis leve", "Dieta blanda e hidratación."),
+    ("Dermatitis alérgica", "Antihistamínico y control en 15 días."),
+    ("Control anual", "Sin hallazgos. Refuerzo de vacunas."),
+    ("Fractura de falange", "Inmovilización y analgésicos."),
+    ("Parasitosis intestinal", "Antiparasitario interno en dosis única."),
+)
+
+
+def _nombre(aleatorio):
+    return aleatorio.choice(NOMBRES), aleatorio.choice(APELLIDOS)
+
+
+def _telefono(aleatorio):
+    return f"+54 351 {aleatorio.randint(4000000, 6999999)}"
+
+
+def _verificar_prefijo(prefijo):
+    if User.objects.filter(username__startswith=f"{prefijo}_").exists():
+        raise ValueError(
+            f"Ya hay usuarios con el prefijo '{prefijo}_'. Usá otro prefijo o una base vacía."
+        )
+
+
+def _crear_sucursales(prefijo, cantidad, aleatorio):
+    sucursales = Sucursal.objects.bulk_create(
+        [
+            Sucursal(
+                nombre=f"{prefijo} Sucursal {numero:02d}",
+                direccion=f"Calle {aleatorio.randint(1, 3000)}",
+                ciudad=aleatorio.choice(("Córdoba", "Rosario", "Mendoza", "Salta")),
+                telefono=_telefono(aleatorio),
+            )
+            for numero in range(1, cantidad + 1)
+        ]
+    )
+    categorias = Farmaco.Categoria.values
+    farmacos = Farmaco.objects.bulk_create(
+        [
+            Farmaco(
+                sucursal=sucursal,
+                nombre=f"Fármaco {numero:03d}",
+                categoria=categorias[numero % len(categorias)],
+                descripcion="Presentación sintética.",
+                stock=aleatorio.randint(0, 500),
+                stock_minimo=aleatorio.choice((5, 10, 20)),
+            )
+            for sucursal in sucursales
+            for numero in range(FARMACOS_POR_SUCURSAL)
+        ],
+        batch_size=TAMANIO_LOTE,
+    )
+    registrar_ingresos_iniciales(farmacos)
+
+    farmacos_por_sucursal = {}
+    for farmaco in farmacos:
+        farmacos_por_sucursal.setdefault(farmaco.sucursal_id, []).append(farmaco.pk)
+    return [sucursal.pk for sucursal in sucursales], farmacos_por_sucursal
+
+
+def _crear_veterinarios(prefijo, cantidad, sucursales, aleatorio):
+    veterinarios = []
+    for numero in range(cantidad):
+        nombre, apellido = _nombre(aleatorio)
+        veterinarios.append(
+            completar_telefono(
+                User(
+                    username=f"{prefijo}_vet_{numero}",
+                    password=hash_contrasena(),
+                    first_name=nombre,
+                    last_name=apellido,
+                    email=f"{prefijo}.vet{numero}@sabueso.test",
+                    rol="VET",
+                    telefono=_telefono(aleatorio),
+                    sucursal_id=sucursales[numero % len(sucursales)],
+                    especialidad=aleatorio.choice(("Clínica", "Cirugía", "Dermatología")),
+                )
+            )
+        )
+    veterinarios = User.objects.bulk_create(veterinarios, batch_size=TAMANIO_LOTE)
+
+    por_sucursal = {}
+    for veterinario in veterinarios:
+        por_sucursal.setdefault(veterinario.sucursal_id, []).append(veterinario.pk)
+    return por_sucursal
+
+
+def _crear_administrador(prefijo, sucursal_id):
+    # Superusuario para recorrer las vistas de administración en el benchmark.
+    return User.objects.create(
+        username=f"{prefijo}_admin",
+        password=hash_contrasena(),
+        email=f"{prefijo}.admin@sabueso.test",
+        rol="ADMIN",
+        sucursal_id=sucursal_id,
+        is_staff=True,
+        is_superuser=True,
+    )
+
+
+def _crear_propietarios(prefijo, cantidad, aleatorio, informar):
+    propietarios = []
+    for lote in en_lotes(range(cantidad)):
+        usuarios = []
+        for numero in lote:
+            nombre, apellido = _nombre(aleatorio)
+            usuarios.append(
+                completar_telefono(
+                    User(
+                        username=f"{prefijo}_prop_{numero}",
+                        password=hash_contrasena(),
+                        first_name=nombre,
+                        last_name=apellido,
+                        email=f"{prefijo}.prop{numero}@sabueso.test",
+                        rol="OWNER",
+                        telefono=_telefono(aleatorio),
+                    )
+                )
+            )
+        with transaction.atomic():
+            usuarios = User.objects.bulk_create(usuarios)
+            # bootstrap_related_profiles no corre con bulk_create: el perfil
+            # se crea acá con los mismos valores que copiaría la señal.
+            creados = Propietario.objects.bulk_create(
+                [
+                    completar_telefono(
+                        Propietario(
+                            user_id=usuario.pk,
+                            telefono=usuario.telefono,
+                            direccion=f"Calle {aleatorio.randint(1, 3000)}",
+                            ciudad="Córdoba",
+                        )
+                    )
+                    for usuario in usuarios
+                ]
+            )
+        propietarios.extend(propietario.pk for propietario in creados)
+        informar(f"Propietarios: {len(propietarios)}/{cantidad}")
+    return propietarios
+
+
+def _crear_pacientes(cantidad, propietarios, aleatorio, informar):
+    hoy = timezone.localdate()
+    pacientes = []
+    for lote in en_lotes(range(cantidad)):
+        nuevos = []
+        for numero in lote:
+            # Cada propietario tiene al menos una mascota; el resto se reparte.
+            if numero < len(propietarios):
+                propietario_id = propietarios[numero]
+            else:
+                propietario_id = aleatorio.choice(propietarios)
+            especie, razas = aleatorio.choice(ESPECIES)
+            nuevos.append(
+                Paciente(
+                    nombre=aleatorio.choice(MASCOTAS),
+                    especie=especie,
+                    raza=aleatorio.choice(razas),
+                    sexo=aleatorio.choice(("M", "H")),
+                    fecha_nacimiento=hoy - timedelta(days=aleatorio.randint(60, 15 * 365)),
+                    propietario_id=propietario_id,
+                )
+            )
+        pacientes.extend(paciente.pk for paciente in Paciente.objects.bulk_create(nuevos))
+        informar(f"Pacientes: {len(pacientes)}/{cantidad}")
+    return pacientes
+
+
+def _cita_aleatoria(aleatorio, paciente_id, sucursal_id, veterinarios, hoy):
+    dia = hoy + timedelta(days=aleatorio.randint(-DIAS_HISTORIA, DIAS_FUTURO))
+    momento = timezone.make_aware(
+        datetime.combine(dia, time(hour=aleatorio.randint(9, 19), minute=aleatorio.choice((0, 30))))
+    )
+    sorteo = aleatorio.random()
+    if dia >= hoy:
+        estado = "pendiente" if sorteo < 0.2 else "programada"
+    elif sorteo < 0.78:
+        estado = "atendida"
+    elif sorteo < 0.9:
+        estado = "cancelada"
+    else:
+        estado = "programada"
+    sin_horario = estado == "pendiente" or (estado == "cancelada" and sorteo > 0.88)
+    return Cita(
+        paciente_id=paciente_id,
+        sucursal_id=sucursal_id,
+        veterinario_id=None if estado == "pendiente" else aleatorio.choice(veterinarios),
+        fecha_solicitada=dia - timedelta(days=aleatorio.randint(0, 10)),
+        fecha_hora=None if sin_horario else momento,
+        tipo=aleatorio.choice(("consulta", "consulta", "consulta", "vacunacion", "cirugia")),
+        estado=estado,
+    )
+
+
+def _crear_citas(cantidad, pacientes, sucursales, veterinarios, farmacos, aleatorio, informar):
+    hoy = timezone.localdate()
+    # Cada paciente se atiende siempre en la misma sucursal.
+    sucursal_de = {paciente_id: sucursales[paciente_id % len(sucursales)] for paciente_id in pacientes}
+    creadas = 0
+    for lote in en_lotes(range(cantidad)):
+        citas = []
+        for _ in lote:
+            paciente_id = aleatorio.choice(pacientes)
+            sucursal_id = sucursal_de[paciente_id]
+            citas.append(
+                _cita_aleatoria(
+                    aleatorio, paciente_id, sucursal_id, veterinarios.get(sucursal_id, [None]), hoy
+                )
+            )
+        with transaction.atomic():
+            citas = Cita.objects.bulk_create(citas)
+            _crear_atenciones(citas, farmacos, aleatorio)
+
+        creadas += len(citas)
+        informar(f"Citas: {creadas}/{cantidad}")
+    return creadas
+
+
+def _crear_atenciones(citas, farmacos, aleatorio):
+    historiales = []
+    administraciones = []
+    for cita in citas:
+        if cita.estado != "atendida" or cita.fecha_hora is None:
+            continue
+        diagnostico, tratamiento = aleatorio.choice(DIAGNOSTICOS)
+        historiales.append(
+            HistorialMedico(
+                paciente_id=cita.paciente_id,
+                veterinario_id=cita.veterinario_id,
+                cita_id=cita.pk,
+                fecha=cita.fecha_hora,
+                diagnostico=diagnostico,
+                tratamiento=tratamiento,
+                peso=Decimal(aleatorio.randint(200, 4000)) / 100,
+            )
+        )
+        for farmaco_id in aleatorio.sample(farmacos[cita.sucursal_id], aleatorio.randint(0, 3)):
+            administraciones.append(
+                CitaFarmaco(
+                    cita_id=cita.pk,
+                    farmaco_id=farmaco_id,
+                    cantidad=aleatorio.randint(1, 4),
+                    registrado=cita.fecha_hora,
+                )
+            )
+    # fecha y registrado son auto_now_add: se fijan a la fecha de la cita.
+    with sin_auto_now(HistorialMedico, "fecha"), sin_auto_now(CitaFarmaco, "registrado"):
+        HistorialMedico.objects.bulk_create(historiales)
+        CitaFarmaco.objects.bulk_create(administraciones)
+
+
+def generar_datos_sinteticos(
+    prefijo="sint",
+    seed=42,
+    informar=None,
+    derivados=True,
+    **escala,
+):
+    """Insert a synthetic clinic; ``escala`` overrides ESCALA_PREDETERMINADA keys."""
+
+    informar = informar or (lambda mensaje: None)
+    cantidades = {**ESCALA_PREDETERMINADA, **escala}
+    aleatorio = random.Random(seed)
+    _verificar_prefijo(prefijo)
+
+    if cantidades["sucursales"] < 1 or (cantidades["pacientes"] and not cantidades["propietarios"]):
+        raise ValueError("Se necesita al menos una sucursal y propietarios para las mascotas.")
+    if cantidades["citas"] and not cantidades["pacientes"]:
+        raise ValueError("Se necesitan pacientes para generar citas.")
+
+    # Cada lote confirma por separado: una carga de millones de filas en una
+    # sola transacción haría crecer el journal sin necesidad.
+    with transaction.atomic():
+        sucursales, farmacos = _crear_sucursales(prefijo, cantidades["sucursales"], aleatorio)
+        veterinarios = _crear_veterinarios(
+            prefijo, cantidades["veterinarios"], sucursales, aleatorio
+        )
+        _crear_administrador(prefijo, sucursales[0])
+    propietarios = _crear_propietarios(prefijo, cantidades["propietarios"], aleatorio, informar)
+    pacientes = _crear_pacientes(cantidades["pacientes"], propietarios, aleatorio, informar)
+    citas = _crear_citas(
+        cantidades["citas"],
+        pacientes,
+        sucursales,
+        veterinarios,
+        farmacos,
+        aleatorio,
+        informar,
+    )
+
+    if derivados:
+        with transaction.atomic():
+            reconstruir_derivados(informar)
+
+    return {
+        "sucursales": len(sucursales),
+        "veterinarios": sum(len(ids) for ids in veterinarios.values()),
+        "propietarios": len(propietarios),
+        "pacientes": len(pacientes),
+        "citas": citas,
+    }
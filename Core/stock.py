@@ -0,0 +1,196 @@
+"""Libro de movimientos de stock, aplicación en bloque y alertas.
+
+Cada cambio de stock de un ``Farmaco`` queda registrado como
+``MovimientoStock``. Los consumos de una consulta se aplican con una
+cantidad fija de sentencias sin importar cuántos fármacos se usen: un único
+``UPDATE`` con ``CASE`` que sólo toca las filas con stock suficiente y un
+``bulk_create`` de los movimientos. Si alguna fila no se pudo actualizar se
+lanza ``StockInsuficienteError`` y la transacción se revierte entera.
+
+Las alertas de reposición (``AlertaStock``) se precalculan periódicamente con
+el comando ``calcular_alertas_stock`` a partir del consumo registrado en
+``CitaFarmaco``.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+from .inventario import invalidar_inventario
+from .models import AlertaStock, CitaFarmaco, Farmaco, MovimientoStock
+
+VENTANA_CONSUMO_DIAS = 30
+HORIZONTE_ALERTA_DIAS = 14
+
+
+class StockInsuficienteError(ValueError):
+    pass
+
+
+def _validar_fallidos(sucursal_id, deltas):
+    disponibles = {
+        farmaco.id: farmaco
+        for farmaco in Farmaco.objects.filter(sucursal_id=sucursal_id, id__in=deltas)
+    }
+    if set(deltas) - set(disponibles):
+        raise StockInsuficienteError(
+            "Uno de los fármacos seleccionados ya no pertenece al inventario de la sucursal."
+        )
+    for farmaco_id, delta in deltas.items():
+        farmaco = disponibles[farmaco_id]
+        if farmaco.stock + delta < 0:
+            raise StockInsuficienteError(
+                f"Stock insuficiente para {farmaco.nombre}. Disponible: {farmaco.stock}."
+            )
+    # Otra transacción liberó stock entre el UPDATE y esta lectura.
+    raise StockInsuficienteError("El stock cambió mientras se registraba la consulta. Intentalo nuevamente.")
+
+
+def aplicar_movimientos(sucursal_id, deltas, motivo, cita=None, usuario=None):
+    """Apply ``deltas`` ({farmaco_id: signed quantity}) and log them.
+
+    Debe llamarse dentro de ``transaction.atomic``. Los deltas negativos
+    descuentan stock y sólo se aplican si alcanza; los positivos reponen.
+    """
+
+    deltas = {farmaco_id: delta for farmaco_id, delta in deltas.items() if delta}
+    if not deltas:
+        return []
+
+    suficiente = Q()
+    for farmaco_id, delta in deltas.items():
+        if delta < 0:
+            suficiente |= Q(id=farmaco_id, stock__gte=-delta)
+        else:
+            suficiente |= Q(id=farmaco_id)
+
+    actualizados = (
+        Farmaco.objects.filter(sucursal_id=sucursal_id, id__in=deltas)
+        .filter(suficiente)
+        .update(
+            stock=Case(
+                *(
+                    When(id=farmaco_id, then=F("stock") + Value(delta))
+                    for farmaco_id, delta in deltas.items()
+                ),
+                default=F("stock"),
+                output_field=IntegerField(),
+            ),
+            actualizado=timezone.now(),
+        )
+    )
+    if actualizados != len(deltas):
+        _validar_fallidos(sucursal_id, deltas)
+
+    if callable(motivo):
+        motivos = {farmaco_id: motivo(delta) for farmaco_id, delta in deltas.items()}
+    else:
+        motivos = dict.fromkeys(deltas, motivo)
+
+    ahora = timezone.now()
+    return MovimientoStock.objects.bulk_create(
+        [
+            MovimientoStock(
+                farmaco_id=farmaco_id,
+                cantidad=delta,
+                motivo=motivos[farmaco_id],
+                cita=cita,
+                usuario=usuario,
+                creado=ahora,
+            )
+            for farmaco_id, delta in deltas.items()
+        ]
+    )
+
+
+def motivo_consulta(delta):
+    return MovimientoStock.Motivo.CONSUMO if delta < 0 else MovimientoStock.Motivo.DEVOLUCION
+
+
+def stock_segun_libro(farmacos=None):
+    """Return {farmaco_id: stock} replaying the ledger (optionally filtered)."""
+
+    movimientos = MovimientoStock.objects.all()
+    if farmacos is not None:
+        movimientos = movimientos.filter(farmaco__in=farmacos)
+    return dict(
+        movimientos.order_by()
+        .values("farmaco_id")
+        .annotate(total=Sum("cantidad"))
+        .values_list("farmaco_id", "total")
+    )
+
+
+def diferencias_stock(farmacos=None):
+    """Return {farmaco_id: (stock actual, stock según el libro)} that disagree."""
+
+    queryset = Farmaco.objects.all() if farmacos is None else farmacos
+    libro = stock_segun_libro(queryset)
+    return {
+        farmaco_id: (stock, libro.get(farmaco_id, 0))
+        for farmaco_id, stock in queryset.values_list("id", "stock")
+        if stock != libro.get(farmaco_id, 0)
+    }
+
+
+def calcular_alertas_stock(
+    ventana_dias=VENTANA_CONSUMO_DIAS,
+    horizonte_dias=HORIZONTE_ALERTA_DIAS,
+    ahora=None,
+):
+    """Recompute every ``AlertaStock`` and return the new alerts.
+
+    El consumo diario es lo dispensado en los últimos ``ventana_dias`` días
+    dividido por la ventana. Se genera alerta para los fármacos que ya están
+    bajo su mínimo o que, a ese ritmo, se agotan dentro de ``horizonte_dias``.
+    """
+
+    ahora = ahora or timezone.now()
+    consumo = dict(
+        CitaFarmaco.objects.filter(registrado__gte=ahora - timedelta(days=ventana_dias))
+        .order_by()
+        .values("farmaco_id")
+        .annotate(total=Sum("cantidad"))
+        .values_list("farmaco_id", "total")
+    )
+
+    # Dos consultas en lugar de un OR: con el OR el planner descarta el
+    # índice parcial de los fármacos bajo su mínimo y recorre la tabla.
+    campos = ("id", "sucursal_id", "stock", "stock_minimo")
+    farmacos = Farmaco.objects.order_by()
+    candidatos = {
+        fila[0]: fila
+        for fila in farmacos.filter(stock__lte=F("stock_minimo")).values_list(*campos)
+    }
+    candidatos.update(
+        (fila[0], fila) for fila in farmacos.filter(id__in=list(consumo)).values_list(*campos)
+    )
+
+    alertas = []
+    for farmaco_id, sucursal_id, stock, stock_minimo in candidatos.values():
+        consumo_diario = consumo.get(farmaco_id, 0) / ventana_dias
+        dias_restantes = stock / consumo_diario if consumo_diario else None
+        bajo_minimo = stock <= stock_minimo
+        if not bajo_minimo and (dias_restantes is None or dias_restantes > horizonte_dias):
+            continue
+        alertas.append(
+            AlertaStock(
+                farmaco_id=farmaco_id,
+                sucursal_id=sucursal_id,
+                stock=stock,
+                consumo_diario=round(consumo_diario, 3),
+                dias_restantes=None if dias_restantes is None else round(dias_restantes, 1),
+                bajo_minimo=bajo_minimo,
+                calculado=ahora,
+            )
+        )
+
+    with transaction.atomic():
+        sucursales = set(AlertaStock.objects.values_list("sucursal_id", flat=True))
+        AlertaStock.objects.all().delete()
+        AlertaStock.objects.bulk_create(alertas, batch_size=1000)
+        sucursales |= {alerta.sucursal_id for alerta in alertas}
+        invalidar_inventario(*sucursales)
+    return alertas
@@ -0,0 +1,37 @@
+from django import template
+
+from ..cache_dashboard import clave_seccion, guardar_seccion, leer_seccion
+
+register = template.Library()
+
+
+class SeccionDashboardNode(template.Node):
+    def __init__(self, nodelist, seccion):
+        self.nodelist = nodelist
+        self.seccion = seccion
+
+    def render(self, context):
+        user = context["request"].user
+        clave = clave_seccion(user, self.seccion.resolve(context))
+        html = leer_seccion(clave)
+        if html is None:
+            html = self.nodelist.render(context)
+            guardar_seccion(clave, html)
+        return html
+
+
+@register.tag
+def seccion_dashboard(parser, token):
+    """Cache the enclosed block per role, branch and user.
+
+    Uso: ``{% seccion_dashboard "agenda" %}...{% endseccion_dashboard %}``.
+    Lo que se calcula sólo dentro del bloque (querysets perezosos del
+    contexto) no se evalúa cuando la sección sale de la caché.
+    """
+
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' recibe sólo el nombre de la sección.")
+    nodelist = parser.parse(("endseccion_dashboard",))
+    parser.delete_first_token()
+    return SeccionDashboardNode(nodelist, parser.compile_filter(bits[1]))
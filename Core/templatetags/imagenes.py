@@ -0,0 +1,76 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from ..imagenes import ANCHOS_VARIANTES, ruta_variante, variantes_listas
+
+register = template.Library()
+
+
+def _ancho_variante(ancho):
+    # La variante más chica que cubre el ancho pedido, o la más grande.
+    ancho = int(ancho)
+    return next((a for a in ANCHOS_VARIANTES if a >= ancho), ANCHOS_VARIANTES[-1])
+
+
+def _srcset(archivo, extension):
+    return format_html_join(
+        ", ",
+        "{} {}w",
+        (
+            (archivo.storage.url(ruta_variante(archivo.name, ancho, extension)), ancho)
+            for ancho in ANCHOS_VARIANTES
+        ),
+    )
+
+
+@register.filter
+def variante(archivo, ancho):
+    """URL of the JPEG variant at least ``ancho`` pixels wide, or of the original.
+
+    Uso: ``<img src="{{ paciente.foto|variante:320 }}">``.
+    """
+
+    if not archivo:
+        return ""
+    if variantes_listas(archivo.name, archivo.storage):
+        return archivo.storage.url(ruta_variante(archivo.name, _ancho_variante(ancho), "jpg"))
+    return archivo.url
+
+
+@register.simple_tag
+def imagen_responsiva(archivo, alt="", clase="", sizes="100vw", ancho=640, diferida=True):
+    """Render a ``<picture>`` with WebP and JPEG variants and ``srcset``.
+
+    Uso: ``{% imagen_responsiva producto.imagen alt=producto.nombre
+    clase="w-full h-52 object-cover" sizes="(min-width: 1024px) 33vw, 100vw" %}``.
+    ``ancho`` elige el ``src`` de respaldo. Mientras no haya variantes se
+    muestra el original.
+    """
+
+    if not archivo:
+        return ""
+    carga = "lazy" if diferida else "eager"
+    if not variantes_listas(archivo.name, archivo.storage):
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+            archivo.url,
+            alt,
+            clase,
+            carga,
+        )
+    # display: contents deja que las clases de tamaño del <img> se resuelvan
+    # contra el contenedor, igual que sin el <picture>.
+    return format_html(
+        '<picture style="display: contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="{}" decoding="async">'
+        "</picture>",
+        _srcset(archivo, "webp"),
+        sizes,
+        archivo.storage.url(ruta_variante(archivo.name, _ancho_variante(ancho), "jpg")),
+        _srcset(archivo, "jpg"),
+        sizes,
+        alt,
+        clase,
+        carga,
+    )
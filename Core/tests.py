@@ -1,3 +1,1650 @@
-from django.test import TestCase
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    AlertaStock,
+    Cita,
+    CitaFarmaco,
+    Farmaco,
+    HistorialMedico,
+    MovimientoStock,
+    Paciente,
+    PanelPropietario,
+    Producto,
+    Propietario,
+    ResumenCitasDiario,
+    ResumenDispensacionDiaria,
+    Sucursal,
+    TrabajoExportacion,
+    TrabajoImagen,
+    TrigramaPropietario,
+    User,
+)
+from .carga_masiva import CONTRASENA_SINTETICA, HASH_SINTETICO, cargar_datos, hash_contrasena
+from .busqueda import (
+    TABLA_FTS,
+    buscar_propietarios,
+    reconstruir_indice_historiales,
+    reconstruir_indice_propietarios,
+)
+from .imagenes import ANCHOS_VARIANTES, procesar_imagenes_pendientes, ruta_variante
+from .instrumentacion import RUTA_SIN_NOMBRE, InstrumentacionMiddleware
+from .instrumentacion import registro as registro_metricas
+from .inventario import inventario_por_sucursal, invalidar_inventario
+from .panel_propietario import panel_propietario, recalcular_paneles
+from .resumenes import recalcular_resumenes
+from .sinteticos import generar_datos_sinteticos
+from .schema import invalidar_tablas_disponibles, modelos_disponibles
+from .stock import calcular_alertas_stock, diferencias_stock
+from .trabajos import eliminar_exportaciones_vencidas, encolar_exportacion, procesar_pendientes
+
+
+class DashboardVeterinariosViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Central", direccion="Av. 1")
+        cls.admin = User.objects.create_user(
+            username="admin", password="x", rol="ADMIN", sucursal=cls.sucursal
+        )
+        owner = User.objects.create_user(username="owner", password="x", rol="OWNER")
+        cls.paciente = Paciente.objects.create(
+            nombre="Firulais",
+            especie="Perro",
+            sexo="M",
+            fecha_nacimiento=date(2020, 1, 1),
+            propietario=Propietario.objects.get(user=owner),
+        )
+
+    def _crear_veterinario_con_citas(self, indice):
+        vet = User.objects.create_user(
+            username=f"vet{indice}", password="x", rol="VET", sucursal=self.sucursal
+        )
+        ahora = timezone.now()
+        for offset, estado in enumerate(["programada", "pendiente", "atendida"]):
+            Cita.objects.create(
+                paciente=self.paciente,
+                veterinario=vet,
+                sucursal=self.sucursal,
+                estado=estado,
+                fecha_hora=ahora + timedelta(days=offset + 1),
+            )
+        Cita.objects.create(
+            paciente=self.paciente,
+            veterinario=vet,
+            sucursal=self.sucursal,
+            estado="programada",
+        )
+        return vet
+
+    def _contar_consultas(self):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(reverse("dashboard_veterinarios"))
+        self.assertEqual(response.status_code, 200)
+        return len(contexto.captured_queries), response
+
+    def test_cantidad_de_consultas_constante(self):
+        self._crear_veterinario_con_citas(1)
+        consultas_un_vet, _ = self._contar_consultas()
+
+        for indice in range(2, 6):
+            self._crear_veterinario_con_citas(indice)
+        consultas_varios_vets, response = self._contar_consultas()
+
+        self.assertEqual(consultas_un_vet, consultas_varios_vets)
+        self.assertEqual(len(response.context["vet_stats"]), 5)
+
+    def test_contadores_y_proximas_citas_por_veterinario(self):
+        vet = self._crear_veterinario_con_citas(1)
+        _, response = self._contar_consultas()
+
+        stat = response.context["vet_stats"][0]
+        self.assertEqual(stat["veterinario"], vet)
+        self.assertEqual(stat["citas_totales"], 4)
+        self.assertEqual(stat["citas_programadas"], 2)
+        self.assertEqual(stat["citas_pendientes"], 1)
+        self.assertEqual(stat["citas_atendidas"], 1)
+        self.assertEqual(stat["citas_semana"], 1)
+        self.assertEqual(stat["tasa_atencion"], 33)
+        proximas = stat["proximas_citas"]
+        self.assertEqual([c.estado for c in proximas], ["programada", "programada"])
+        self.assertIsNotNone(proximas[0].fecha_hora)
+        self.assertIsNone(proximas[1].fecha_hora)
+
+
+class TablasDisponiblesTests(TestCase):
+    def test_introspeccion_se_cachea_hasta_invalidar(self):
+        invalidar_tablas_disponibles()
+        with CaptureQueriesContext(connection) as primera:
+            self.assertTrue(modelos_disponibles(Producto))
+        with CaptureQueriesContext(connection) as segunda:
+            self.assertTrue(modelos_disponibles(Producto))
+
+        self.assertGreater(len(primera.captured_queries), 0)
+        self.assertEqual(len(segunda.captured_queries), 0)
+
+        invalidar_tablas_disponibles()
+        with CaptureQueriesContext(connection) as tras_invalidar:
+            modelos_disponibles(Producto)
+        self.assertGreater(len(tras_invalidar.captured_queries), 0)
+
+
+class SerieIndicadoresTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Central", direccion="Av. 1")
+        cls.admin = User.objects.create_user(
+            username="admin", password="x", rol="ADMIN", sucursal=cls.sucursal
+        )
+        owner = User.objects.create_user(username="owner", password="x", rol="OWNER")
+        cls.paciente = Paciente.objects.create(
+            nombre="Michi",
+            especie="Gato",
+            sexo="H",
+            fecha_nacimiento=date(2021, 5, 1),
+            propietario=Propietario.objects.get(user=owner),
+        )
+        hoy = timezone.localdate()
+        ahora = timezone.localtime()
+        for dias_atras, estado, demora in [(0, "atendida", 2), (1, "cancelada", 0), (3, "pendiente", None)]:
+            Cita.objects.create(
+                paciente=cls.paciente,
+                sucursal=cls.sucursal,
+                estado=estado,
+                fecha_solicitada=hoy - timedelta(days=dias_atras + (demora or 0)),
+                fecha_hora=(
+                    ahora - timedelta(days=dias_atras) if demora is not None else None
+                ),
+            )
+
+    def test_serie_diaria_y_promedio_en_consultas_fijas(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("dashboard_veterinarios_indicadores"))
+        self.assertEqual(response.status_code, 200)
+
+        serie = response.context["serie_diaria"]
+        self.assertEqual(len(serie), 7)
+        self.assertEqual(serie[-1]["atendidas"], 1)
+        self.assertEqual(serie[-2]["canceladas"], 1)
+        self.assertEqual(sum(punto["solicitadas"] for punto in serie), 3)
+        self.assertEqual(response.context["resumen"]["promedio_confirmacion"], 1.0)
+
+        with CaptureQueriesContext(connection) as semana:
+            self.client.get(reverse("dashboard_veterinarios_indicadores"))
+        with CaptureQueriesContext(connection) as anio:
+            self.client.get(
+                reverse("dashboard_veterinarios_indicadores"), {"dias": 365}
+            )
+        self.assertEqual(len(semana.captured_queries), len(anio.captured_queries))
+
+    def test_endpoint_json_agrupado_por_mes(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse("serie_indicadores_veterinarios"),
+            {"dias": 90, "granularidad": "mes"},
+        )
+        self.assertEqual(response.status_code, 200)
+        datos = response.json()
+        self.assertEqual(datos["granularidad"], "mes")
+        self.assertTrue(all(punto["fecha"].endswith("-01") for punto in datos["serie"]))
+        self.assertEqual(sum(punto["solicitadas"] for punto in datos["serie"]), 3)
+
+
+class DatosInventarioMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Central", direccion="Av. 1")
+        cls.admin = User.objects.create_user(
+            username="admin", password="x", rol="ADMIN", sucursal=cls.sucursal
+        )
+        owner = User.objects.create_user(username="owner", password="x", rol="OWNER")
+        paciente = Paciente.objects.create(
+            nombre="Toby",
+            especie="Perro",
+            sexo="M",
+            fecha_nacimiento=date(2019, 3, 1),
+            propietario=Propietario.objects.get(user=owner),
+        )
+        farmaco = Farmaco.objects.create(
+            sucursal=cls.sucursal,
+            nombre="Amoxicilina <500mg>",
+            categoria=Farmaco.Categoria.ANTIBIOTICOS,
+            descripcion="Antibiótico",
+            stock=10,
+        )
+        for _ in range(3):
+            cita = Cita.objects.create(
+                paciente=paciente,
+                sucursal=cls.sucursal,
+                estado="atendida",
+                fecha_hora=timezone.now(),
+            )
+            CitaFarmaco.objects.create(cita=cita, farmaco=farmaco, cantidad=2)
+
+
+class ExportarInventarioExcelViewTests(DatosInventarioMixin, TestCase):
+    def test_reporte_se_transmite_por_partes(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("exportar_inventario_excel"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        contenido = b"".join(response.streaming_content).decode("utf-8")
+        self.assertEqual(contenido.count("Amoxicilina &lt;500mg&gt;"), 4)
+        self.assertTrue(contenido.endswith("</body></html>"))
+
+    def test_formatos_csv_y_xlsx(self):
+        self.client.force_login(self.admin)
+        url = reverse("exportar_inventario_excel")
+
+        response = self.client.get(url, {"formato": "csv"})
+        self.assertIn(".csv", response["Content-Disposition"])
+        contenido = b"".join(response.streaming_content).decode("utf-8-sig")
+        self.assertIn("Amoxicilina <500mg>,Antibióticos,2,10", contenido)
+
+        response = self.client.get(url, {"formato": "xlsx"})
+        self.assertIn(".xlsx", response["Content-Disposition"])
+        libro = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertIsNone(libro.testzip())
+        hoja = libro.read("xl/worksheets/sheet2.xml").decode("utf-8")
+        self.assertIn("Amoxicilina &lt;500mg&gt;", hoja)
+        self.assertIn('s="2"', hoja)
+
+
+class ExportacionesEnSegundoPlanoTests(DatosInventarioMixin, TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.exportaciones_root = tempfile.mkdtemp()
+        for directorio in (self.media_root, self.exportaciones_root):
+            self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        ajustes = override_settings(
+            MEDIA_ROOT=self.media_root, EXPORTACIONES_ROOT=self.exportaciones_root
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_encolar_procesar_y_descargar(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(
+            reverse("encolar_exportacion"),
+            {"tipo": "inventario", "periodo": "mensual", "formato": "csv"},
+        )
+        self.assertRedirects(response, reverse("dashboard_admin_analisis"))
+        trabajo = TrabajoExportacion.objects.get()
+        self.assertEqual(trabajo.estado, "pendiente")
+        self.assertEqual(trabajo.parametros["sucursal_filtro"], self.sucursal.id)
+
+        self.assertEqual(procesar_pendientes(), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, "completado", trabajo.error)
+        # Fuera de MEDIA_ROOT y sin URL pública: sólo la vista lo entrega.
+        self.assertTrue(trabajo.archivo.path.startswith(self.exportaciones_root))
+        self.assertEqual(os.listdir(self.media_root), [])
+        with self.assertRaises(ValueError):
+            trabajo.archivo.url
+
+        estado = self.client.get(reverse("estado_exportacion", args=[trabajo.id])).json()
+        self.assertEqual(estado["descarga"], reverse("descargar_exportacion", args=[trabajo.id]))
+
+        response = self.client.get(estado["descarga"])
+        contenido = b"".join(response.streaming_content).decode("utf-8-sig")
+        self.assertIn("Amoxicilina <500mg>", contenido)
+        self.assertTrue(response["Content-Disposition"].startswith("attachment"))
+
+    def test_reportes_vencidos_se_eliminan(self):
+        trabajo = encolar_exportacion(self.admin, "inventario", "csv", {"periodo": "mensual"})
+        procesar_pendientes()
+        trabajo.refresh_from_db()
+        ruta = trabajo.archivo.path
+        self.assertEqual(eliminar_exportaciones_vencidas(dias=7), 0)
+
+        TrabajoExportacion.objects.filter(pk=trabajo.pk).update(
+            finalizado=timezone.now() - timedelta(days=8)
+        )
+        self.assertEqual(eliminar_exportaciones_vencidas(dias=7), 1)
+        self.assertFalse(TrabajoExportacion.objects.exists())
+        self.assertFalse(os.path.exists(ruta))
+
+    def test_otro_administrador_no_accede_al_trabajo(self):
+        otro = User.objects.create_user(
+            username="otro", password="x", rol="ADMIN", sucursal=self.sucursal
+        )
+        trabajo = TrabajoExportacion.objects.create(
+            tipo="inventario",
+            parametros={"periodo": "semanal"},
+            solicitado_por=self.admin,
+        )
+        self.client.force_login(otro)
+        response = self.client.get(reverse("estado_exportacion", args=[trabajo.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class VariantesImagenesTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media_root)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        owner = User.objects.create_user(username="owner", password="x", rol="OWNER")
+        self.paciente = Paciente.objects.create(
+            nombre="Toby",
+            especie="Perro",
+            sexo="M",
+            fecha_nacimiento=date(2020, 1, 1),
+            propietario=Propietario.objects.get(user=owner),
+        )
+        self.client.force_login(owner)
+
+    def _foto_de_telefono(self):
+        from PIL import Image
+
+        # Apaisada en el archivo, pero la cámara marca que hay que rotarla.
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = "Camara de prueba"
+        contenido = io.BytesIO()
+        Image.new("RGB", (2000, 1000), "orange").save(contenido, "JPEG", exif=exif)
+        return SimpleUploadedFile("toby.jpg", contenido.getvalue(), content_type="image/jpeg")
+
+    def test_subida_genera_variantes_fuera_del_request(self):
+        from PIL import Image
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("actualizar_foto_mascota", args=[self.paciente.pk]),
+                {"foto": self._foto_de_telefono()},
+            )
+        self.paciente.refresh_from_db()
+        ruta = self.paciente.foto.name
+        trabajo = TrabajoImagen.objects.get()
+        self.assertEqual((trabajo.ruta, trabajo.estado), (ruta, "pendiente"))
+        self.assertFalse(default_storage.exists(ruta_variante(ruta, 320, "webp")))
+
+        plantilla = Template("{% load imagenes %}{{ foto|variante:200 }}")
+        self.assertEqual(plantilla.render(Context({"foto": self.paciente.foto})), self.paciente.foto.url)
+
+        self.assertEqual(procesar_imagenes_pendientes(), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, "completado", trabajo.error)
+        for ancho in ANCHOS_VARIANTES:
+            for extension in ("webp", "jpg"):
+                with default_storage.open(ruta_variante(ruta, ancho, extension)) as archivo:
+                    with Image.open(archivo) as variante:
+                        # Nunca se amplía: el original rotado mide 1000 x 2000.
+                        esperado = min(ancho, 1000)
+                        self.assertEqual(variante.size, (esperado, esperado * 2))
+                        self.assertEqual(dict(variante.getexif()), {})
+
+        self.assertEqual(
+            plantilla.render(Context({"foto": self.paciente.foto})),
+            default_storage.url(ruta_variante(ruta, 320, "jpg")),
+        )
+        html = Template("{% load imagenes %}{% imagen_responsiva foto alt='Toby' %}").render(
+            Context({"foto": self.paciente.foto})
+        )
+        self.assertIn(f'{default_storage.url(ruta_variante(ruta, 1280, "webp"))} 1280w', html)
+
+    def test_originales_con_el_mismo_nombre_no_comparten_variantes(self):
+        from PIL import Image
+
+        rutas = {}
+        for nombre, formato, color in (
+            ("toby.jpg", "JPEG", "orange"),
+            ("toby.png", "PNG", "blue"),
+            # Una subida con el nombre que tenían las variantes no se pisa.
+            ("toby_320w.jpg", "JPEG", "green"),
+            ("toby.jpg.320w.jpg", "JPEG", "red"),
+        ):
+            contenido = io.BytesIO()
+            Image.new("RGB", (400, 200), color).save(contenido, formato)
+            rutas[nombre] = default_storage.save(f"pacientes/{nombre}", ContentFile(contenido.getvalue()))
+            TrabajoImagen.objects.create(ruta=rutas[nombre])
+
+        def leer(ruta):
+            with default_storage.open(ruta) as archivo:
+                return archivo.read()
+
+        originales = {ruta: leer(ruta) for ruta in rutas.values()}
+
+        self.assertEqual(procesar_imagenes_pendientes(), 4)
+        self.assertFalse(TrabajoImagen.objects.exclude(estado="completado").exists())
+        for ruta, contenido in originales.items():
+            self.assertEqual(leer(ruta), contenido)
+
+        def color_de(ruta):
+            with default_storage.open(ruta_variante(ruta, 320, "jpg")) as archivo:
+                with Image.open(archivo) as variante:
+                    return variante.convert("RGB").getpixel((10, 10))
+
+        naranja, azul = color_de(rutas["toby.jpg"]), color_de(rutas["toby.png"])
+        self.assertGreater(naranja[0], 200)
+        self.assertGreater(azul[2], 200)
+        self.assertLess(azul[0], 50)
+
+    def test_imagen_invalida_queda_con_error(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paciente.foto = SimpleUploadedFile("rota.jpg", b"no es una imagen")
+            self.paciente.save()
+        self.assertEqual(procesar_imagenes_pendientes(), 1)
+        self.assertEqual(TrabajoImagen.objects.get().estado, "error")
+
+
+class ListarCitasAdminPaginacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Central", direccion="Av. 1")
+        cls.admin = User.objects.create_user(
+            username="admin", password="x", rol="ADMIN", sucursal=cls.sucursal
+        )
+        owner = User.objects.create_user(username="owner", rol="OWNER")
+        paciente = Paciente.objects.create(
+            nombre="Luna",
+            especie="Perro",
+            sexo="H",
+            fecha_nacimiento=date(2018, 1, 1),
+            propietario=Propietario.objects.get(user=owner),
+        )
+        aleatorio = random.Random(3)
+        base = timezone.now().replace(microsecond=0)
+        Cita.objects.bulk_create(
+            [
+                Cita(
+                    paciente=paciente,
+                    sucursal=cls.sucursal,
+                    estado="programada" if i % 3 else "pendiente",
+                    # Pocas fechas y horarios repetidos o vacíos fuerzan empates.
+                    fecha_solicitada=base.date() - timedelta(days=aleatorio.randint(0, 3)),
+                    fecha_hora=(
+                        None
+                        if i % 4 == 0
+                        else base + timedelta(hours=aleatorio.randint(0, 5))
+                    ),
+                )
+                for i in range(130)
+            ]
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _orden_esperado(self):
+        citas = list(Cita.objects.all())
+        minimo = timezone.now() - timedelta(days=3650)
+        citas.sort(key=lambda c: c.id, reverse=True)
+        citas.sort(key=lambda c: (c.fecha_hora is not None, c.fecha_hora or minimo), reverse=True)
+        citas.sort(key=lambda c: c.fecha_solicitada, reverse=True)
+        return [cita.id for cita in citas]
+
+    def test_recorrer_paginas_hacia_adelante_y_atras(self):
+        url = reverse("listar_citas_admin")
+        respuesta = self.client.get(url, {"estado": ""})
+        self.assertEqual(respuesta.context["total_citas"], 130)
+        self.assertEqual(respuesta.context["paginacion"]["anterior_url"], "")
+
+        vistos = []
+        paginas = []
+        while True:
+            paginas.append(respuesta.context["paginacion"])
+            vistos.extend(cita.id for cita in respuesta.context["citas"])
+            siguiente = respuesta.context["paginacion"]["siguiente_url"]
+            if not siguiente:
+                break
+            self.assertIn("estado=", siguiente)
+            respuesta = self.client.get(url + siguiente)
+
+        self.assertEqual(len(paginas), 3)
+        self.assertEqual(vistos, self._orden_esperado())
+
+        anteriores = []
+        while respuesta.context["paginacion"]["anterior_url"]:
+            respuesta = self.client.get(url + respuesta.context["paginacion"]["anterior_url"])
+            anteriores = [cita.id for cita in respuesta.context["citas"]] + anteriores
+        self.assertEqual(anteriores, vistos[:100])
+
+    def test_consultas_constantes_y_cursor_invalido(self):
+        url = reverse("listar_citas_admin")
+        with CaptureQueriesContext(connection) as primera:
+            respuesta = self.client.get(url)
+        with CaptureQueriesContext(connection) as segunda:
+            self.client.get(url + respuesta.context["paginacion"]["siguiente_url"])
+        self.assertEqual(len(primera), len(segunda))
+
+        respuesta = self.client.get(url, {"despues": "no-es-un-cursor"})
+        self.assertEqual(len(respuesta.context["citas"]), 50)
+        self.assertEqual(respuesta.context["paginacion"]["anterior_url"], "")
+
+
+class MisCitasPaginacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        sucursal = Sucursal.objects.create(nombre="Central", direccion="Av. 1")
+        cls.vet = User.objects.create_user(
+            username="vet", password="x", rol="VET", sucursal=sucursal
+        )
+        owner = User.objects.create_user(username="owner", rol="OWNER")
+        paciente = Paciente.objects.create(
+            nombre="Luna",
+            especie="Perro",
+            sexo="H",
+            fecha_nacimiento=date(2018, 1, 1),
+            propietario=Propietario.objects.get(user=owner),
+        )
+        ahora = timezone.now()
+        citas = [
+            Cita(
+                paciente=paciente,
+                sucursal=sucursal,
+                veterinario=cls.vet,
+                fecha_hora=ahora + timedelta(days=i + 1),
+            )
+            for i in range(25)
+        ]
+        citas += [
+            Cita(
+                paciente=paciente,
+                sucursal=sucursal,
+                veterinario=cls.vet,
+                estado="pendiente",
+            )
+            for _ in range(12)
+        ]
+        citas += [
+            Cita(
+                paciente=paciente,
+                sucursal=sucursal,
+                veterinario=cls.vet,
+                estado="atendida",
+                fecha_hora=ahora - timedelta(days=i + 1),
+            )
+            for i in range(8)
+        ]
+        Cita.objects.bulk_create(citas)
+
+    def setUp(self):
+        self.client.force_login(self.vet)
+
+    def test_secciones_con_cursores_independientes(self):
+        url = reverse("mis_citas")
+        respuesta = self.client.get(url)
+        contexto = respuesta.context
+        self.assertEqual(len(contexto["citas_proximas"]), 10)
+        self.assertEqual(len(contexto["citas_pendientes"]), 10)
+        self.assertEqual(len(contexto["citas_pasadas"]), 6)
+        self.assertEqual(contexto["estadisticas_citas"]["total"], 45)
+        self.assertEqual(contexto["estadisticas_citas"]["proximas"], 25)
+        self.assertEqual(contexto["estadisticas_citas"]["sin_horario"], 12)
+        primeras_pendientes = [c.id for c in contexto["citas_pendientes"]]
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url + contexto["paginacion_proximas"]["siguiente_url"])
+        contexto = respuesta.context
+        fechas = [c.fecha_hora for c in contexto["citas_proximas"]]
+        self.assertEqual(len(fechas), 10)
+        self.assertEqual(fechas, sorted(fechas))
+        self.assertEqual([c.id for c in contexto["citas_pendientes"]], primeras_pendientes)
+        # Dos prefetch (fármacos y administraciones) por sección, acotados a la página.
+        self.assertEqual(
+            sum(1 for q in consultas.captured_queries if "core_citafarmaco" in q["sql"].lower()),
+            6,
+        )
+
+        respuesta = self.client.get(url + contexto["paginacion_pasadas"]["siguiente_url"])
+        contexto = respuesta.context
+        self.assertEqual(len(contexto["citas_pasadas"]), 2)
+        self.assertIn("proximas_despues=", contexto["paginacion_pasadas"]["anterior_url"])
+        self.assertEqual(len(contexto["citas_proximas"]), 10)
+
+
+class BusquedaHistorialesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vet = User.objects.create_user(username="vet", password="x", rol="VET")
+        owner = User.objects.create_user(
+            username="owner", rol="OWNER", first_name="Marta", last_name="Quiroga"
+        )
+        paciente = Paciente.objects.create(
+            nombre="Luna",
+            especie="Perro",
+            sexo="H",
+            fecha_nacimiento=date(2018, 1, 1),
+            propietario=Propietario.objects.get(user=owner),
+        )
+        cls.otitis = HistorialMedico.objects.create(
+            paciente=paciente,
+            veterinario=cls.vet,
+            diagnostico="Otitis externa bilateral",
+            tratamiento="Limpieza y gotas óticas",
+        )
+        cls.control = HistorialMedico.objects.create(
+            paciente=paciente,
+            veterinario=cls.vet,
+            diagnostico="Control anual",
+            tratamiento="Sin tratamiento",
+            notas="Antecedente de otitis en 2022",
+        )
+        cls.gastro = HistorialMedico.objects.create(
+            paciente=paciente,
+            veterinario=cls.vet,
+            diagnostico="Gastroenteritis",
+            tratamiento="Dieta blanda",
+            examenes="Ecografía abdominal",
+        )
+
+    def setUp(self):
+        self.client.force_login(self.vet)
+
+    def _buscar(self, texto):
+        respuesta = self.client.get(reverse("historial_medico_vet"), {"q": texto})
+        return [historial.id for historial in respuesta.context["historiales"]]
+
+    def test_busqueda_ordenada_por_relevancia_y_sin_acentos(self):
+        self.assertEqual(self._buscar("otitis"), [self.otitis.id, self.control.id])
+        self.assertEqual(self._buscar("ecografia"), [self.gastro.id])
+        self.assertEqual(self._buscar("gotas OTICAS"), [self.otitis.id])
+        self.assertEqual(len(self._buscar("quiroga")), 3)
+        self.assertEqual(self._buscar('otitis" -('), [self.otitis.id, self.control.id])
+
+    def test_coincidencias_fuera_del_ranking_siguen_en_resultados_y_totales(self):
+        with mock.patch("Core.busqueda.RESULTADOS_RANQUEADOS", 1):
+            respuesta = self.client.get(reverse("historial_medico_vet"), {"q": "otitis"})
+        self.assertEqual(
+            [historial.id for historial in respuesta.context["historiales"]],
+            [self.otitis.id, self.control.id],
+        )
+        self.assertEqual(respuesta.context["resumen"]["total"], 2)
+
+    def test_indice_sigue_a_cambios_y_se_reconstruye(self):
+        self.gastro.diagnostico = "Pancreatitis aguda"
+        self.gastro.save()
+        self.assertEqual(self._buscar("pancreatitis"), [self.gastro.id])
+        self.assertEqual(self._buscar("gastroenteritis"), [])
+
+        self.otitis.delete()
+        self.assertEqual(self._buscar("otitis"), [self.control.id])
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLA_FTS}")
+        self.assertEqual(self._buscar("pancreatitis"), [])
+        self.assertEqual(reconstruir_indice_historiales(), 2)
+        self.assertEqual(self._buscar("pancreatitis"), [self.gastro.id])
+
+
+class BusquedaPropietariosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username="admin", password="x", rol="ADMIN")
+
+        def crear(username, nombre, apellido, **datos):
+            user = User.objects.create_user(
+                username=username, rol="OWNER", first_name=nombre, last_name=apellido
+            )
+            propietario = Propietario.objects.get(user=user)
+            for campo, valor in datos.items():
+                setattr(propietario, campo, valor)
+            propietario.save()
+            return propietario
+
+        cls.maria = crear(
+            "mgarcia", "María", "García", telefono="+54 351-555-1234", direccion="Av. Belgrano 123"
+        )
+        cls.gonzalo = crear("gonza", "Gonzalo", "Garcés", ciudad="Córdoba")
+        cls.ana = crear("ana", "Ana", "Pérez", telefono="0351 4440000")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _autocompletar(self, texto):
+        respuesta = self.client.get(reverse("autocompletar_propietarios"), {"q": texto})
+        self.assertEqual(respuesta.status_code, 200)
+        return [resultado["id"] for resultado in respuesta.json()["resultados"]]
+
+    def test_candidatos_descartados_no_desplazan_coincidencias(self):
+        # Tienen los trigramas de "5551" repartidos en dos palabras y, con ids
+        # menores y el mismo puntaje, llenan el primer lote de candidatos.
+        for indice in range(3):
+            user = User.objects.create_user(username=f"falso{indice}", rol="OWNER")
+            propietario = Propietario.objects.get(user=user)
+            propietario.direccion = "Pasaje 555 551"
+            propietario.save()
+        user = User.objects.create_user(username="real", rol="OWNER")
+        real = Propietario.objects.get(user=user)
+        real.telefono = "5551234"
+        real.save()
+
+        self.assertEqual(buscar_propietarios("5551", limite=1), [real])
+
+    def test_prefijos_fragmentos_y_telefono(self):
+        self.assertEqual(self._autocompletar("garcia"), [self.maria.id])
+        self.assertCountEqual(self._autocompletar("GARC"), [self.maria.id, self.gonzalo.id])
+        self.assertCountEqual(self._autocompletar("ga"), [self.maria.id, self.gonzalo.id])
+        self.assertEqual(self._autocompletar("555-12"), [self.maria.id])
+        self.assertEqual(self._autocompletar("cordoba gonz"), [self.gonzalo.id])
+        # "arc" y "ia" aparecen en "garcia", pero "ia" no es comienzo de palabra.
+        self.assertEqual(self._autocompletar("arc ia"), [])
+        self.assertEqual(self._autocompletar(""), [])
+
+    def test_indice_se_actualiza_al_guardar(self):
+        self.ana.user.last_name = "Zapata"
+        self.ana.user.save()
+        self.assertEqual(self._autocompletar("zapata"), [self.ana.id])
+        self.assertEqual(self._autocompletar("perez"), [])
+
+        self.ana.direccion = "Calle Falsa 742"
+        self.ana.save()
+        self.assertEqual(self._autocompletar("falsa"), [self.ana.id])
+
+        TrigramaPropietario.objects.all().delete()
+        self.assertEqual(reconstruir_indice_propietarios(), 3)
+        self.assertEqual(self._autocompletar("falsa"), [self.ana.id])
+
+    def test_guardar_last_login_no_reindexa(self):
+        # Es lo que hace update_last_login en cada inicio de sesión.
+        with CaptureQueriesContext(connection) as consultas:
+            self.ana.user.save(update_fields=["last_login"])
+        tabla = TrigramaPropietario._meta.db_table
+        self.assertFalse([c for c in consultas.captured_queries if tabla in c["sql"]])
+
+    def test_pagina_de_resultados(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse("buscar_propietarios"), {"q": "garc"})
+        self.assertEqual(respuesta.context["total_encontrados"], 2)
+        self.assertLessEqual(len(consultas), 6)
+        self.assertEqual(respuesta.context["resultados"][0].total_mascotas, 0)
+
+
+class TelefonoNormalizadoTests(TestCase):
+    def _registrar(self, username, telefono):
+        return self.client.post(
+            reverse("registro_propietario"),
+            {
+                "username": username,
+                "email": f"{username}@sabueso.test",
+                "first_name": "Test",
+                "last_name": "Owner",
+                "telefono": telefono,
+                "direccion": "Calle 1",
+                "password1": "clave-segura-123",
+                "password2": "clave-segura-123",
+            },
+        )
+
+    def test_registro_detecta_telefono_con_otro_formato(self):
+        self._registrar("primero", "+54 351-555-1234")
+        propietario = Propietario.objects.get(user__username="primero")
+        self.assertEqual(propietario.telefono_normalizado, "543515551234")
+        self.assertEqual(propietario.user.telefono_normalizado, "543515551234")
+
+        self.client.logout()
+        with CaptureQueriesContext(connection) as consultas:
+            self._registrar("segundo", "54 (351) 555 1234")
+        self.assertFalse(User.objects.filter(username="segundo").exists())
+        sql = [q["sql"] for q in consultas.captured_queries if "telefono" in q["sql"]]
+        self.assertTrue(sql)
+        self.assertTrue(all("telefono_normalizado" in consulta for consulta in sql))
+
+    def test_guardado_parcial_y_whatsapp(self):
+        user = User.objects.create_user(username="owner", rol="OWNER", telefono="351 000")
+        user.telefono = "+54 9 351 444-5566"
+        user.save(update_fields=["telefono"])
+        user.refresh_from_db()
+        self.assertEqual(user.telefono_normalizado, "5493514445566")
+
+        paciente = Paciente.objects.create(
+            nombre="Luna",
+            especie="Perro",
+            sexo="H",
+            fecha_nacimiento=date(2018, 1, 1),
+            propietario=Propietario.objects.get(user=user),
+        )
+        cita = Cita(paciente=paciente)
+        self.assertEqual(cita.telefono_contacto(), "351000")
+        Propietario.objects.filter(user=user).update(telefono="", telefono_normalizado="")
+        cita = Cita(paciente=Paciente.objects.get(pk=paciente.pk))
+        self.assertEqual(cita.telefono_contacto(), "5493514445566")
+
+
+class InventarioCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Central", direccion="Av. 1")
+        cls.otra = Sucursal.objects.create(nombre="Norte", direccion="Av. 2")
+        cls.vet = User.objects.create_user(
+            username="vet", password="x", rol="VET", sucursal=cls.sucursal
+        )
+        cls.amoxicilina = Farmaco.objects.create(
+            sucursal=cls.sucursal,
+            nombre="Amoxicilina",
+            categoria=Farmaco.Categoria.ANTIBIOTICOS,
+            descripcion="-",
+            stock=3,
+        )
+        Farmaco.objects.create(
+            sucursal=cls.sucursal,
+            nombre="Meloxicam",
+            categoria=Farmaco.Categoria.ANALGESICOS_ANTIINFLAMATORIOS,
+            descripcion="-",
+            stock=20,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.vet)
+
+    def _inventario(self):
+        return self.client.get(reverse("inventario_farmacos_veterinario")).context
+
+    def test_resumen_cacheado_e_invalidado_al_guardar(self):
+        with CaptureQueriesContext(connection) as primera:
+            contexto = self._inventario()
+        self.assertEqual(
+            [categoria["codigo"] for categoria in contexto["inventario"]],
+            ["analgesicos_antiinflamatorios", "antibioticos"],
+        )
+        self.assertEqual(contexto["totales"]["total_stock"], 23)
+        self.assertEqual([f.nombre for f in contexto["criticos"]], ["Amoxicilina"])
+
+        with CaptureQueriesContext(connection) as segunda:
+            self._inventario()
+        self.assertEqual(len(segunda), len(primera) - 1)
+
+        self.amoxicilina.stock = 30
+        with self.captureOnCommitCallbacks(execute=True):
+            self.amoxicilina.save()
+        contexto = self._inventario()
+        self.assertEqual(contexto["totales"]["total_stock"], 50)
+        self.assertEqual(contexto["criticos"], [])
+
+        self.amoxicilina.sucursal = self.otra
+        with self.captureOnCommitCallbacks(execute=True):
+            self.amoxicilina.save()
+        self.assertEqual(self._inventario()["totales"]["total_items"], 1)
+
+    def test_invalidacion_espera_al_commit(self):
+        inventario_por_sucursal(self.sucursal)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Farmaco.objects.filter(pk=self.amoxicilina.pk).update(stock=0)
+            invalidar_inventario(self.sucursal.pk)
+            self.assertEqual(inventario_por_sucursal(self.sucursal)["resumen"]["total_stock"], 23)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(inventario_por_sucursal(self.sucursal)["resumen"]["total_stock"], 20)
+
+
+class MovimientosStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Central", direccion="Av. 1")
+        cls.vet = User.objects.create_user(
+            username="vet", password="x", rol="VET", sucursal=cls.sucursal
+        )
+        owner = User.objects.create_user(username="owner", rol="OWNER")
+        cls.paciente = Paciente.objects.create(
+            nombre="Luna",
+            especie="Perro",
+            sexo="H",
+            fecha_nacimiento=date(2018, 1, 1),
+            propietario=Propietario.objects.get(user=owner),
+        )
+        cls.farmacos = [
+            Farmaco.objects.create(
+                sucursal=cls.sucursal,
+                nombre=f"Fármaco {i}",
+                categoria=Farmaco.Categoria.ANTIBIOTICOS,
+                descripcion="-",
+                stock=10,
+            )
+            for i in range(10)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.vet)
+
+    def _cita(self):
+        return Cita.objects.create(
+            paciente=self.paciente,
+            sucursal=self.sucursal,
+            veterinario=self.vet,
+            fecha_hora=timezone.now(),
+        )
+
+    def _atender(self, cita, seleccion):
+        datos = {"diagnostico": "Control", "tratamiento": "-", "notas": "", "examenes": ""}
+        if seleccion:
+            datos["utilizo_farmacos"] = "1"
+            datos["farmacos_utilizados"] = [
+                f"{farmaco.id}::{cantidad}" for farmaco, cantidad in seleccion
+            ]
+        return self.client.post(reverse("atender_cita", args=[cita.id]), datos)
+
+    def _stock(self, farmaco):
+        farmaco.refresh_from_db()
+        return farmaco.stock
+
+    def test_consumo_devolucion_y_libro_consistente(self):
+        cita = self._cita()
+        self._atender(cita, [(self.farmacos[0], 3), (self.farmacos[1], 2)])
+        self.assertEqual(self._stock(self.farmacos[0]), 7)
+        self.assertEqual(self._stock(self.farmacos[1]), 8)
+
+        self._atender(cita, [(self.farmacos[0], 1), (self.farmacos[2], 4)])
+        self.assertEqual(self._stock(self.farmacos[0]), 9)
+        self.assertEqual(self._stock(self.farmacos[1]), 10)
+        self.assertEqual(self._stock(self.farmacos[2]), 6)
+        self.assertEqual(
+            dict(cita.administraciones_farmacos.values_list("farmaco_id", "cantidad")),
+            {self.farmacos[0].id: 1, self.farmacos[2].id: 4},
+        )
+        self.assertEqual(
+            sorted(
+                cita.movimientos_stock.values_list("motivo", "cantidad")
+            ),
+            sorted(
+                [
+                    ("consumo", -3),
+                    ("consumo", -2),
+                    ("devolucion", 2),
+                    ("devolucion", 2),
+                    ("consumo", -4),
+                ]
+            ),
+        )
+
+        self._atender(cita, [])
+        self.assertEqual(self._stock(self.farmacos[2]), 10)
+        self.assertFalse(cita.administraciones_farmacos.exists())
+        self.assertEqual(diferencias_stock(), {})
+
+    def test_stock_insuficiente_revierte_todo(self):
+        cita = self._cita()
+        respuesta = self._atender(cita, [(self.farmacos[0], 2), (self.farmacos[1], 11)])
+        self.assertContains(respuesta, "Stock insuficiente para Fármaco 1")
+        self.assertEqual(self._stock(self.farmacos[0]), 10)
+        self.assertFalse(MovimientoStock.objects.filter(cita=cita).exists())
+        cita.refresh_from_db()
+        self.assertNotEqual(cita.estado, "atendida")
+
+    def test_sentencias_constantes_segun_cantidad_de_farmacos(self):
+        def sentencias(cantidad):
+            cita = self._cita()
+            with CaptureQueriesContext(connection) as consultas:
+                self._atender(cita, [(farmaco, 1) for farmaco in self.farmacos[:cantidad]])
+            return len(consultas)
+
+        self.assertEqual(sentencias(2), sentencias(10))
+
+    def test_ajuste_manual_queda_en_el_libro(self):
+        farmaco = self.farmacos[3]
+        farmaco.stock = 25
+        farmaco.save()
+        self.assertEqual(
+            list(farmaco.movimientos.order_by("id").values_list("motivo", "cantidad")),
+            [("ingreso", 10), ("ajuste", 15)],
+        )
+        Farmaco.objects.filter(pk=farmaco.pk).update(stock=0)
+        self.assertEqual(diferencias_stock(), {farmaco.id: (0, 25)})
+
+
+class AlertasStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Central", direccion="Av. 1")
+        owner = User.objects.create_user(username="owner", rol="OWNER")
+        paciente = Paciente.objects.create(
+            nombre="Luna",
+            especie="Perro",
+            sexo="H",
+            fecha_nacimiento=date(2018, 1, 1),
+            propietario=Propietario.objects.get(user=owner),
+        )
+        cls.cita = Cita.objects.create(
+            paciente=paciente, sucursal=cls.sucursal, fecha_hora=timezone.now()
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def _farmaco(self, nombre, stock, stock_minimo=5, consumo=0):
+        farmaco = Farmaco.objects.create(
+            sucursal=self.sucursal,
+            nombre=nombre,
+            categoria=Farmaco.Categoria.ANTIBIOTICOS,
+            descripcion="-",
+            stock=stock,
+            stock_minimo=stock_minimo,
+        )
+        if consumo:
+            CitaFarmaco.objects.create(cita=self.cita, farmaco=farmaco, cantidad=consumo)
+        return farmaco
+
+    def test_proyeccion_de_agotamiento(self):
+        rapido = self._farmaco("Rápido", stock=20, consumo=60)
+        lento = self._farmaco("Lento", stock=100, consumo=30)
+        bajo = self._farmaco("Bajo", stock=3, stock_minimo=4)
+        self._farmaco("Quieto", stock=50)
+
+        alertas = {alerta.farmaco_id: alerta for alerta in calcular_alertas_stock(30, 14)}
+
+        self.assertEqual(set(alertas), {rapido.id, bajo.id})
+        self.assertEqual(alertas[rapido.id].consumo_diario, 2)
+        self.assertEqual(alertas[rapido.id].dias_restantes, 10)
+        self.assertFalse(alertas[rapido.id].bajo_minimo)
+        self.assertTrue(alertas[bajo.id].bajo_minimo)
+        self.assertIsNone(alertas[bajo.id].dias_restantes)
+        self.assertFalse(AlertaStock.objects.filter(farmaco=lento).exists())
+
+    def test_consumo_fuera_de_la_ventana_no_cuenta(self):
+        farmaco = self._farmaco("Viejo", stock=10, consumo=100)
+        CitaFarmaco.objects.filter(farmaco=farmaco).update(
+            registrado=timezone.now() - timedelta(days=45)
+        )
+        self.assertEqual(calcular_alertas_stock(30, 14), [])
+
+    def test_criticos_usan_el_minimo_de_cada_farmaco(self):
+        con_margen = self._farmaco("Con margen", stock=8, stock_minimo=10)
+        self._farmaco("Holgado", stock=3, stock_minimo=0)
+        rapido = self._farmaco("Rápido", stock=20, consumo=60)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            calcular_alertas_stock(30, 14)
+
+        resumen = inventario_por_sucursal(self.sucursal)["resumen"]
+        self.assertEqual([farmaco.id for farmaco in resumen["criticos"]], [con_margen.id])
+        self.assertEqual([alerta.farmaco_id for alerta in resumen["en_riesgo"]], [rapido.id])
+
+    def test_en_riesgo_se_muestra_en_el_inventario(self):
+        self._farmaco("Rápido", stock=20, consumo=60)
+        self._farmaco("Quieto", stock=50)
+        with self.captureOnCommitCallbacks(execute=True):
+            calcular_alertas_stock(30, 14)
+        vet = User.objects.create_user(username="vet", rol="VET", sucursal=self.sucursal)
+        admin = User.objects.create_user(username="admin", rol="ADMIN", sucursal=self.sucursal)
+
+        for usuario, url in (
+            (vet, reverse("inventario_farmacos_veterinario")),
+            (admin, f"{reverse('inventario_farmacos_admin')}?sucursal={self.sucursal.id}"),
+        ):
+            self.client.force_login(usuario)
+            response = self.client.get(url)
+            self.assertContains(response, "Riesgo de agotamiento")
+            self.assertContains(response, "se agota en ~10 días")
+
+        self.client.force_login(vet)
+        response = self.client.get(
+            reverse("inventario_farmacos_veterinario"), {"q": "quieto"}
+        )
+        self.assertEqual(response.context["en_riesgo"], [])
+
+
+class ResumenesAnaliticosTests(DatosInventarioMixin, TestCase):
+    def test_dashboard_lee_los_resumenes(self):
+        recalcular_resumenes()
+        self.assertEqual(ResumenDispensacionDiaria.objects.get().cantidad, 6)
+        self.client.force_login(self.admin)
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(
+                reverse("dashboard_admin_analisis"), {"inventario_periodo": "dia"}
+            )
+
+        self.assertEqual(response.context["resumen_inventario_periodo"]["dispensaciones"], 6)
+        self.assertEqual(response.context["resumen_inventario_periodo"]["propietarios"], 1)
+        top = response.context["top_farmacos"]
+        self.assertEqual((top[0]["total"], top[0]["pacientes"]), (6, 1))
+        # Sólo los distintos se cuentan sobre CitaFarmaco, y acotados al periodo.
+        consultas_citafarmaco = [
+            c["sql"] for c in consultas.captured_queries if '"Core_citafarmaco"' in c["sql"]
+        ]
+        self.assertEqual(len(consultas_citafarmaco), 2)
+        for sql in consultas_citafarmaco:
+            self.assertIn('"Core_citafarmaco"."registrado" >=', sql)
+
+    def test_distintos_no_se_suman_entre_dias(self):
+        veterinario = User.objects.create_user(username="vet", rol="VET", sucursal=self.sucursal)
+        ahora = timezone.now()
+        for dias_atras, cita in enumerate(Cita.objects.order_by("id")):
+            momento = ahora - timedelta(days=dias_atras)
+            Cita.objects.filter(pk=cita.pk).update(veterinario=veterinario, fecha_hora=momento)
+            CitaFarmaco.objects.filter(cita=cita).update(registrado=momento)
+        # Otro paciente del mismo propietario, atendido hace 20 días y con la
+        # dispensación registrada recién hace 3.
+        primera = Cita.objects.order_by("id").first()
+        paciente = Paciente.objects.create(
+            nombre="Luna",
+            especie="Gato",
+            sexo="H",
+            fecha_nacimiento=date(2021, 5, 1),
+            propietario=primera.paciente.propietario,
+        )
+        cita = Cita.objects.create(
+            paciente=paciente,
+            sucursal=self.sucursal,
+            veterinario=veterinario,
+            estado="atendida",
+            fecha_hora=ahora - timedelta(days=20),
+        )
+        dispensacion = CitaFarmaco.objects.create(
+            cita=cita, farmaco=primera.administraciones_farmacos.get().farmaco, cantidad=1
+        )
+        CitaFarmaco.objects.filter(pk=dispensacion.pk).update(registrado=ahora - timedelta(days=3))
+        recalcular_resumenes()
+        self.client.force_login(self.admin)
+
+        response = self.client.get(
+            reverse("dashboard_admin_analisis"), {"inventario_periodo": "semana"}
+        )
+
+        # Los mismos números que daba la vista calculando sobre las tablas base;
+        # sumar los resúmenes diarios daría 4 pacientes y 3 propietarios.
+        self.assertEqual(
+            response.context["resumen_inventario_periodo"],
+            {"dispensaciones": 7, "propietarios": 1, "veterinarios": 1},
+        )
+        top = response.context["top_farmacos"]
+        self.assertEqual((top[0]["total"], top[0]["pacientes"]), (7, 2))
+        rendimiento = response.context["rendimiento_veterinarios"]
+        self.assertEqual(
+            [(fila["total"], fila["pacientes"], fila["farmacos"]) for fila in rendimiento],
+            [(4, 2, 7)],
+        )
+
+    def test_senales_recalculan_el_dia_al_confirmar(self):
+        cita = Cita.objects.filter(estado="atendida").first()
+        veterinario = User.objects.create_user(username="vet", rol="VET", sucursal=self.sucursal)
+        recalcular_resumenes()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cita.veterinario = veterinario
+            cita.save()
+            CitaFarmaco.objects.filter(cita=cita).get().delete()
+
+        self.assertEqual(
+            ResumenCitasDiario.objects.get(veterinario=veterinario).total, 1
+        )
+        self.assertEqual(ResumenCitasDiario.objects.get(veterinario=None).farmacos, 4)
+        self.assertEqual(
+            sum(ResumenDispensacionDiaria.objects.values_list("cantidad", flat=True)), 4
+        )
+
+
+class PanelPropietarioTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Central", direccion="Av. 1")
+        cls.vet = User.objects.create_user(username="vet", rol="VET", sucursal=cls.sucursal)
+        cls.owner = User.objects.create_user(username="owner", rol="OWNER")
+        cls.propietario = Propietario.objects.get(user=cls.owner)
+        cls.paciente = Paciente.objects.create(
+            nombre="Toby",
+            especie="Perro",
+            sexo="M",
+            fecha_nacimiento=date(2019, 3, 1),
+            propietario=cls.propietario,
+        )
+        ahora = timezone.now()
+        Cita.objects.bulk_create(
+            [
+                Cita(
+                    paciente=cls.paciente,
+                    sucursal=cls.sucursal,
+                    veterinario=cls.vet,
+                    estado="programada",
+                    fecha_hora=ahora + timedelta(days=dias),
+                )
+                for dias in (-3, -2, -1, 1, 2, 3, 4, 5, 6, 7)
+            ]
+            + [Cita(paciente=cls.paciente, sucursal=cls.sucursal)]
+        )
+        HistorialMedico.objects.create(
+            paciente=cls.paciente, veterinario=cls.vet, diagnostico="Otitis", tratamiento="Gotas"
+        )
+
+    def test_dashboard_lee_el_panel_y_listas_acotadas(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse("dashboard"))
+
+        self.assertEqual(
+            response.context["estadisticas_propietario"],
+            {"mascotas": 1, "citas_activas": 8, "informes": 1, "profesionales": 1},
+        )
+        proximas = response.context["citas_proximas"]
+        self.assertEqual(len(proximas), 5)
+        self.assertEqual(response.context["proxima_cita"], proximas[0])
+        self.assertEqual(len(response.context["citas_recientes"]), 3)
+        self.assertEqual(self.propietario.panel.vigente_hasta, proximas[0].fecha_hora)
+
+        # Pasada la próxima cita, el panel se recalcula al leerlo.
+        PanelPropietario.objects.update(vigente_hasta=timezone.now() - timedelta(minutes=1))
+        panel = panel_propietario(self.propietario)
+        self.assertEqual(panel.citas_proximas, 7)
+        self.assertGreater(panel.vigente_hasta, timezone.now())
+
+    def test_senales_actualizan_los_paneles_al_confirmar(self):
+        otro = Propietario.objects.get(user=User.objects.create_user(username="o2", rol="OWNER"))
+        recalcular_paneles()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Cita.objects.create(paciente=self.paciente, sucursal=self.sucursal)
+            HistorialMedico.objects.filter(paciente=self.paciente).delete()
+        panel = PanelPropietario.objects.get(propietario=self.propietario)
+        self.assertEqual((panel.citas_sin_horario, panel.informes), (2, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paciente.propietario = otro
+            self.paciente.save()
+        self.assertEqual(PanelPropietario.objects.get(propietario=self.propietario).mascotas, 0)
+        panel = PanelPropietario.objects.get(propietario=otro)
+        self.assertEqual((panel.mascotas, panel.citas_activas), (1, 9))
+
+
+@override_settings(INSTRUMENTACION_ACTIVA=True, INSTRUMENTACION_SERVER_TIMING=True)
+class InstrumentacionTests(DatosInventarioMixin, TestCase):
+    def setUp(self):
+        registro_metricas.reiniciar()
+        self.addCleanup(registro_metricas.reiniciar)
+
+    def test_metricas_por_ruta_y_server_timing(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("dashboard_admin_analisis"))
+        self.assertIn("db;dur=", response["Server-Timing"])
+
+        resumen = self.client.get(reverse("metricas_instrumentacion")).json()
+        self.assertTrue(resumen["activa"])
+        ruta = next(r for r in resumen["rutas"] if r["ruta"] == "dashboard_admin_analisis")
+        self.assertEqual(ruta["muestras"], 1)
+        self.assertGreater(ruta["consultas"]["p50"], 0)
+
+    def test_detecta_consultas_repetidas(self):
+        def vista(request):
+            for _ in range(3):
+                Farmaco.objects.filter(pk=1).exists()
+            Farmaco.objects.filter(pk=2).exists()
+            return HttpResponse()
+
+        InstrumentacionMiddleware(vista)(RequestFactory().get("/"))
+
+        ruta = next(r for r in registro_metricas.resumen() if r["ruta"] == RUTA_SIN_NOMBRE)
+        self.assertEqual(ruta["consultas"]["max"], 4)
+        self.assertEqual(ruta["duplicadas"]["max"], 2)
+        self.assertEqual(ruta["sentencias_duplicadas"][0]["repeticiones"], 2)
+
+    def test_resumen_solo_para_administradores(self):
+        owner = User.objects.get(username="owner")
+        self.client.force_login(owner)
+        response = self.client.get(reverse("metricas_instrumentacion"))
+        self.assertEqual(response.status_code, 403)
+
+
+class PortadaCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _producto(self, nombre):
+        return Producto.objects.create(
+            nombre=nombre, descripcion="-", categoria="accesorios", precio=Decimal("10")
+        )
+
+    def test_contadores_en_cache_y_get_condicional(self):
+        self._producto("Collar")
+        primera = self.client.get(reverse("landing"))
+        self.assertEqual(primera.context["total_productos"], 1)
+        self.assertIn("public", primera["Cache-Control"])
+        self.assertTrue(primera.has_header("Last-Modified"))
+        etag = primera["ETag"]
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse("landing")).status_code, 200)
+            respuesta = self.client.get(reverse("landing"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._producto("Correa")
+        respuesta = self.client.get(reverse("landing"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context["total_productos"], 2)
+        self.assertNotEqual(respuesta["ETag"], etag)
+
+    def test_sin_etag_para_usuarios_logueados(self):
+        self.client.force_login(User.objects.create_user(username="owner", rol="OWNER"))
+        respuesta = self.client.get(reverse("landing"))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse(respuesta.has_header("ETag"))
+
+
+class CatalogoTiendaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.collar = Producto.objects.create(
+            nombre="Collar antipulgas",
+            descripcion="Protección por ocho meses",
+            categoria="accesorios",
+            precio=Decimal("10"),
+        )
+        self.alimento = Producto.objects.create(
+            nombre="Alimento balanceado",
+            descripcion="Nutrición completa para perros adultos",
+            categoria="alimentos",
+            precio=Decimal("20"),
+        )
+
+    def _nombres(self, respuesta):
+        return [producto.nombre for producto in respuesta.context["productos"]]
+
+    def test_busqueda_por_indice_sin_distinguir_acentos(self):
+        self.assertEqual(
+            self._nombres(self.client.get(reverse("tienda"), {"q": "nutricion"})),
+            ["Alimento balanceado"],
+        )
+        self.assertEqual(
+            self._nombres(self.client.get(reverse("tienda"), {"q": "colla"})),
+            ["Collar antipulgas"],
+        )
+        respuesta = self.client.get(reverse("tienda"), {"q": "perros", "categoria": "accesorios"})
+        self.assertEqual(self._nombres(respuesta), [])
+
+    def test_listado_en_cache_hasta_que_cambia_un_producto(self):
+        primera = self.client.get(reverse("tienda"))
+        self.assertIn("public", primera["Cache-Control"])
+        etag = primera["ETag"]
+
+        with self.assertNumQueries(0):
+            respuesta = self.client.get(reverse("tienda"))
+        self.assertEqual(self._nombres(respuesta), ["Alimento balanceado", "Collar antipulgas"])
+        self.assertEqual(
+            self.client.get(reverse("tienda"), HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.collar.nombre = "Collar reflectivo"
+            self.collar.save()
+        respuesta = self.client.get(reverse("tienda"), {"q": "reflectivo"})
+        self.assertEqual(self._nombres(respuesta), ["Collar reflectivo"])
+        respuesta = self.client.get(reverse("tienda"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_detalle_en_cache_y_productos_no_disponibles(self):
+        url = reverse("detalle_producto", args=[self.collar.pk])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.collar.disponible = False
+            self.collar.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.client.force_login(
+            User.objects.create_user(username="admin", rol="ADMIN", password="x")
+        )
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse(respuesta.has_header("ETag"))
+
+
+@override_settings(INSTRUMENTACION_ACTIVA=True)
+class CacheDashboardTests(DatosInventarioMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        registro_metricas.reiniciar()
+        self.addCleanup(registro_metricas.reiniciar)
+        self.client.force_login(self.admin)
+
+    def _cache_dashboard(self):
+        return next(r for r in registro_metricas.resumen() if r["ruta"] == "dashboard")["cache"]
+
+    def _recorrer(self):
+        primera = self.client.get(reverse("dashboard"))
+        self.assertEqual(primera.context["total_citas"], 3)
+
+        with CaptureQueriesContext(connection) as consultas:
+            segunda = self.client.get(reverse("dashboard"))
+        self.assertEqual(segunda.content, primera.content)
+        self.assertFalse([c for c in consultas.captured_queries if '"Core_cita"' in c["sql"]])
+        self.assertEqual(self._cache_dashboard()["aciertos"], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Cita.objects.create(paciente=Paciente.objects.get(), sucursal=self.sucursal)
+        self.assertEqual(self.client.get(reverse("dashboard")).context["total_citas"], 4)
+        self.assertEqual(self._cache_dashboard()["fallos"], 4)
+
+    def test_secciones_en_cache_e_invalidadas_por_sucursal(self):
+        self._recorrer()
+
+        # Otra sucursal no invalida las secciones de esta.
+        otra = Sucursal.objects.create(nombre="Norte", direccion="-")
+        with self.captureOnCommitCallbacks(execute=True):
+            Cita.objects.create(paciente=Paciente.objects.get(), sucursal=otra)
+        self.client.get(reverse("dashboard"))
+        self.assertEqual(self._cache_dashboard()["aciertos"], 4)
+
+    def test_funciona_con_cache_en_archivos(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        backend = {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": directorio,
+        }
+        with override_settings(CACHES={"default": backend}):
+            self._recorrer()
+
+
+class DatosSinteticosTests(TestCase):
+    escala = {"sucursales": 2, "veterinarios": 4, "propietarios": 30, "pacientes": 45, "citas": 300}
+
+    def test_generacion_determinista_y_derivados(self):
+        creados = generar_datos_sinteticos(prefijo="a", seed=7, **self.escala)
+        self.assertEqual(creados["citas"], 300)
+        self.assertEqual(Propietario.objects.filter(user__username__startswith="a_").count(), 30)
+        self.assertFalse(Propietario.objects.filter(telefono_normalizado="").exists())
+        self.assertTrue(TrigramaPropietario.objects.exists())
+        self.assertTrue(ResumenCitasDiario.objects.exists())
+        self.assertEqual(diferencias_stock(), {})
+
+        historial = HistorialMedico.objects.select_related("cita").first()
+        self.assertEqual(historial.fecha, historial.cita.fecha_hora)
+        self.assertGreater(
+            CitaFarmaco.objects.dates("registrado", "day").count(), 1
+        )
+
+        primeras = list(Cita.objects.order_by("id").values_list("estado", "tipo"))
+        generar_datos_sinteticos(prefijo="b", seed=7, derivados=False, **self.escala)
+        segundas = list(Cita.objects.order_by("id").values_list("estado", "tipo"))[300:]
+        self.assertEqual(primeras, segundas)
+
+        with self.assertRaises(ValueError):
+            generar_datos_sinteticos(prefijo="a", seed=7, **self.escala)
+
+    def test_usuarios_sinteticos_reusan_hash_precalculado(self):
+        generar_datos_sinteticos(
+            prefijo="h", sucursales=1, veterinarios=1, propietarios=2, pacientes=0, citas=0
+        )
+        usuario = User.objects.get(username="h_prop_1")
+        self.assertEqual(usuario.password, HASH_SINTETICO)
+        self.assertTrue(usuario.check_password(CONTRASENA_SINTETICA))
+
+        hash_contrasena.cache_clear()
+        self.addCleanup(hash_contrasena.cache_clear)
+        with override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]):
+            self.assertTrue(hash_contrasena().startswith("md5$"))
+
+    def test_benchmark_guarda_json(self):
+        generar_datos_sinteticos(prefijo="bench", seed=1, **self.escala)
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        salida = f"{directorio}/vistas.json"
+
+        call_command(
+            "benchmark_vistas",
+            repeticiones=1,
+            escenarios=["landing", "analisis", "mis_citas"],
+            salida=salida,
+            stdout=io.StringIO(),
+        )
+
+        with open(salida, encoding="utf-8") as archivo:
+            informe = json.load(archivo)
+        self.assertEqual(informe["datos"]["citas"], 300)
+        self.assertEqual(
+            {r["escenario"]: r["estado"] for r in informe["resultados"]},
+            {"landing": 200, "analisis": 200, "mis_citas": 200},
+        )
+
+
+class CargaDatosEjemploTests(TestCase):
+    fixture = settings.BASE_DIR / "Core" / "fixtures" / "datos_ejemplo.jsonl"
+
+    def _fixture_temporal(self, *filas):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        ruta = f"{directorio}/datos.jsonl"
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            archivo.writelines(json.dumps(fila) + "\n" for fila in filas)
+        return ruta
+
+    def test_carga_reemplaza_datos_y_completa_derivados(self):
+        generar_datos_sinteticos(
+            prefijo="viejo", sucursales=1, veterinarios=1, propietarios=3, pacientes=3, citas=10
+        )
+
+        creados = cargar_datos(self.fixture)
+        cargar_datos(self.fixture)
+
+        self.assertEqual(creados["User"], 4)
+        self.assertEqual(User.objects.count(), 4)
+        self.assertEqual(list(Sucursal.objects.order_by("pk").values_list("pk", flat=True)), [1, 2])
+        self.assertIsNotNone(authenticate(username="propietario", password="owner123"))
+        self.assertEqual(
+            Propietario.objects.get(user__username="propietario2").telefono_normalizado,
+            "543515555678",
+        )
+        self.assertEqual(diferencias_stock(), {})
+        self.assertTrue(TrigramaPropietario.objects.exists())
+        self.assertEqual(ResumenDispensacionDiaria.objects.aggregate(t=Sum("cantidad"))["t"], 2)
+        cita = Cita.objects.get(estado="programada")
+        self.assertEqual(cita.fecha_solicitada, timezone.localdate() + timedelta(days=2))
+
+    def test_completa_perfil_de_propietario_y_reporta_linea(self):
+        ruta = self._fixture_temporal(
+            {"modelo": "User", "username": "solo", "password": "x", "rol": "OWNER", "telefono": "351-1"},
+        )
+        self.assertEqual(cargar_datos(ruta)["Propietario"], 1)
+        self.assertEqual(Propietario.objects.get().telefono_normalizado, "3511")
+
+        ruta = self._fixture_temporal(
+            {"modelo": "Sucursal", "nombre": "A", "direccion": "-"},
+            {"modelo": "Farmaco", "nombre": "X", "sucursal": "@inexistente", "stock": 1},
+        )
+        with self.assertRaisesMessage(ValueError, "línea 2"):
+            cargar_datos(ruta)
+        self.assertEqual(User.objects.get().username, "solo")
+
+
+class CitaIndicesPlanTests(TestCase):
+    """Regresión de planes de consulta sobre un volumen representativo."""
+
+    CANTIDAD_CITAS = 20_000
+
+    @classmethod
+    def setUpTestData(cls):
+        aleatorio = random.Random(7)
+        cls.sucursales = [
+            Sucursal.objects.create(nombre=f"Sucursal {i}", direccion="-")
+            for i in range(5)
+        ]
+        cls.veterinarios = [
+            User.objects.create_user(
+                username=f"vet{i}", rol="VET", sucursal=cls.sucursales[i % 5]
+            )
+            for i in range(20)
+        ]
+        owner = User.objects.create_user(username="owner", rol="OWNER")
+        paciente = Paciente.objects.create(
+            nombre="Luna",
+            especie="Perro",
+            sexo="H",
+            fecha_nacimiento=date(2018, 1, 1),
+            propietario=Propietario.objects.get(user=owner),
+        )
+        ahora = timezone.now()
+        estados = [estado for estado, _ in Cita.ESTADOS]
+        Cita.objects.bulk_create(
+            [
+                Cita(
+                    paciente=paciente,
+                    veterinario=aleatorio.choice(cls.veterinarios),
+                    sucursal=aleatorio.choice(cls.sucursales),
+                    estado=aleatorio.choice(estados),
+                    fecha_solicitada=(ahora - timedelta(days=aleatorio.randint(0, 730))).date(),
+                    fecha_hora=ahora + timedelta(hours=aleatorio.randint(-17520, 720)),
+                )
+                for _ in range(cls.CANTIDAD_CITAS)
+            ],
+            batch_size=2000,
+        )
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+    def assertUsaIndice(self, queryset, indice):
+        plan = queryset.explain()
+        self.assertIn(indice, plan, plan)
+
+    def test_agenda_por_sucursal_y_estado(self):
+        self.assertUsaIndice(
+            Cita.objects.filter(
+                sucursal=self.sucursales[0],
+                estado="programada",
+                fecha_hora__gte=timezone.now(),
+            ).order_by("fecha_hora"),
+            "core_cita_suc_est_fh_idx",
+        )
+
+    def test_agenda_por_veterinario_y_estado(self):
+        self.assertUsaIndice(
+            Cita.objects.filter(
+                veterinario=self.veterinarios[0], estado="programada"
+            ).order_by("fecha_hora"),
+            "core_cita_vet_est_fh_idx",
+        )
+
+    def test_listado_por_sucursal_y_fecha_solicitada(self):
+        self.assertUsaIndice(
+            Cita.objects.filter(
+                sucursal=self.sucursales[0],
+                fecha_solicitada__gte=timezone.localdate() - timedelta(days=7),
+            ),
+            "core_cita_suc_fsol_idx",
+        )
+
+    def test_proxima_cita_programada(self):
+        self.assertUsaIndice(
+            Cita.objects.filter(
+                estado="programada", fecha_hora__gte=timezone.now()
+            ).order_by("fecha_hora")[:1],
+            "core_cita_est_fh_idx",
+        )
@@ -0,0 +1,143 @@
+"""Cola de exportaciones en segundo plano.
+
+Los reportes grandes se encolan como ``TrabajoExportacion`` y los procesa el
+comando ``procesar_exportaciones`` usando la propia base de datos como cola.
+El archivo generado se guarda en ``EXPORTACIONES_ROOT``, fuera de
+``MEDIA_ROOT``: sólo se descarga desde la vista, y el comando borra los
+reportes con más de ``EXPORTACIONES_RETENCION_DIAS`` días.
+"""
+
+import tempfile
+from datetime import timedelta
+
+from django.core.files import File
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .exports import FORMATOS_EXPORTACION, generar_exportacion, normalizar_formato
+from .models import Propietario, TrabajoExportacion
+
+
+def encolar_exportacion(usuario, tipo, formato, parametros):
+    return TrabajoExportacion.objects.create(
+        tipo=tipo,
+        formato=normalizar_formato(formato),
+        parametros=parametros,
+        solicitado_por=usuario,
+    )
+
+
+def tomar_siguiente_trabajo(cola=None):
+    """Claim the oldest pending job, or return None if the queue is empty.
+
+    El ``UPDATE`` condicionado al estado evita que dos workers tomen el mismo
+    trabajo sin necesitar ``select_for_update`` (no disponible en SQLite).
+    ``cola`` permite reutilizarlo con otros modelos que tengan los mismos
+    campos ``estado``, ``creado`` e ``iniciado``.
+    """
+
+    if cola is None:
+        cola = TrabajoExportacion.objects.select_related("solicitado_por")
+    pendientes = cola.filter(estado="pendiente").order_by("creado", "id")
+    for trabajo_id in pendientes.values_list("id", flat=True)[:10]:
+        tomado = cola.model.objects.filter(
+            id=trabajo_id, estado="pendiente"
+        ).update(estado="procesando", iniciado=timezone.now())
+        if tomado:
+            return cola.get(id=trabajo_id)
+    return None
+
+
+def _secciones_trabajo(trabajo):
+    # Import diferido: los armadores de reportes viven junto a las vistas.
+    from .views import _reporte_inventario, _reporte_propietario
+
+    parametros = trabajo.parametros
+    if trabajo.tipo == "inventario":
+        return _reporte_inventario(
+            trabajo.solicitado_por,
+            parametros["periodo"],
+            parametros.get("sucursal_filtro"),
+            parametros.get("sucursal_nombre", ""),
+        )
+    if trabajo.tipo == "propietario":
+        propietario = Propietario.objects.select_related("user").get(
+            id=parametros["propietario_id"]
+        )
+        return _reporte_propietario(
+            propietario,
+            parametros.get("sucursal_filtro"),
+            parametros.get("sucursal_nombre", ""),
+        )
+    raise ValueError(f"Tipo de exportación desconocido: {trabajo.tipo}")
+
+
+def procesar_trabajo(trabajo):
+    """Generate the file for a claimed job and store the outcome."""
+
+    try:
+        nombre_base, secciones = _secciones_trabajo(trabajo)
+        extension = FORMATOS_EXPORTACION[trabajo.formato]["extension"]
+        nombre_archivo = f"{nombre_base}.{extension}"
+        with tempfile.TemporaryFile() as temporal:
+            for bloque in generar_exportacion(secciones, trabajo.formato):
+                temporal.write(bloque)
+            temporal.seek(0)
+            trabajo.archivo.save(nombre_archivo, File(temporal), save=False)
+    except Exception as exc:  # noqa: BLE001 - se informa en el trabajo
+        trabajo.estado = "error"
+        trabajo.error = str(exc) or exc.__class__.__name__
+        trabajo.finalizado = timezone.now()
+        trabajo.save(update_fields=["estado", "error", "finalizado"])
+        return trabajo
+
+    trabajo.nombre_archivo = nombre_archivo
+    trabajo.estado = "completado"
+    trabajo.error = ""
+    trabajo.finalizado = timezone.now()
+    trabajo.save(
+        update_fields=["archivo", "nombre_archivo", "estado", "error", "finalizado"]
+    )
+    return trabajo
+
+
+def procesar_pendientes(limite=None):
+    """Process pending jobs until the queue is empty; returns how many ran."""
+
+    procesados = 0
+    while limite is None or procesados < limite:
+        close_old_connections()
+        trabajo = tomar_siguiente_trabajo()
+        if trabajo is None:
+            break
+        procesar_trabajo(trabajo)
+        procesados += 1
+    return procesados
+
+
+def reencolar_trabajos_colgados(minutos=30, modelo=TrabajoExportacion):
+    """Return jobs left ``procesando`` by a crashed worker to the queue."""
+
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return modelo.objects.filter(
+        estado="procesando", iniciado__lt=limite
+    ).update(estado="pendiente", iniciado=None)
+
+
+def eliminar_exportaciones_vencidas(dias):
+    """Delete finished jobs older than ``dias`` days and their files.
+
+    Devuelve cuántos trabajos se borraron.
+    """
+
+    limite = timezone.now() - timedelta(days=dias)
+    vencidos = TrabajoExportacion.objects.filter(
+        estado__in=["completado", "error"], finalizado__lt=limite
+    )
+    eliminados = 0
+    for trabajo in vencidos.iterator():
+        if trabajo.archivo:
+            trabajo.archivo.delete(save=False)
+        trabajo.delete()
+        eliminados += 1
+    return eliminados
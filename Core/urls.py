@@ -98,6 +98,21 @@ urlpatterns = [
         views.ExportarInventarioExcelView.as_view(),
         name="exportar_inventario_excel",
     ),
+    path(
+        "administrador/analisis/exportaciones/",
+        views.EncolarExportacionView.as_view(),
+        name="encolar_exportacion",
+    ),
+    path(
+        "administrador/analisis/exportaciones/<int:trabajo_id>/estado/",
+        views.EstadoExportacionView.as_view(),
+        name="estado_exportacion",
+    ),
+    path(
+        "administrador/analisis/exportaciones/<int:trabajo_id>/descargar/",
+        views.DescargarExportacionView.as_view(),
+        name="descargar_exportacion",
+    ),
     path(
         "administrador/analisis/propietario/<int:propietario_id>/exportar/",
         views.ExportarPropietarioExcelView.as_view(),
@@ -152,6 +167,11 @@ urlpatterns = [
         name="crear_mascota_admin",
     ),
     path("buscar_propietarios/", views.BuscarPropietariosView.as_view(), name="buscar_propietarios"),
+    path(
+        "buscar_propietarios/autocompletar/",
+        views.AutocompletarPropietariosView.as_view(),
+        name="autocompletar_propietarios",
+    ),
     path(
         "propietario/<int:propietario_id>/",
         views.DetallePropietarioView.as_view(),
@@ -177,10 +197,20 @@ urlpatterns = [
         views.DashboardVeterinariosIndicadoresView.as_view(),
         name="dashboard_veterinarios_indicadores",
     ),
+    path(
+        "dashboard/veterinarios/indicadores/serie/",
+        views.SerieIndicadoresVeterinariosView.as_view(),
+        name="serie_indicadores_veterinarios",
+    ),
     path("vet/historial-medico/", views.HistorialMedicoVetView.as_view(), name="historial_medico_vet"),
     path(
         "vet/historial-medico/<int:historial_id>/",
         views.DetalleHistorialView.as_view(),
         name="detalle_historial",
     ),
+    path(
+        "metricas/instrumentacion/",
+        views.MetricasInstrumentacionView.as_view(),
+        name="metricas_instrumentacion",
+    ),
 ]
@@ -1,22 +1,51 @@
 import json
 from collections import defaultdict
 from datetime import date, datetime, time, timedelta
-from itertools import chain
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db import IntegrityError
-from django.db import connection, transaction
-from django.db.models import Count, F, Q, Sum, Max
-from django.db.utils import OperationalError, ProgrammingError
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import (
+    Avg,
+    Count,
+    DateField,
+    DurationField,
+    ExpressionWrapper,
+    F,
+    Max,
+    Q,
+    Sum,
+    Window,
+)
+from django.db.models.functions import RowNumber, Trunc, TruncDate
+from django.http import FileResponse, Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils import timezone
-from django.utils.html import escape
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
 from django.views import View
-
+from django.views.decorators.http import condition
+
+from .busqueda import buscar_historiales, buscar_propietarios
+from .cache_dashboard import contexto_en_cache
+from .catalogo import (
+    CATALOGO_PUBLICO_SEGUNDOS,
+    actualizado_catalogo,
+    detalle_catalogo,
+    productos_catalogo,
+    relacionados_de,
+    version_catalogo,
+)
+from .exports import (
+    EXPORT_CHUNK_SIZE,
+    FORMATO_PREDETERMINADO,
+    FORMATOS_EXPORTACION,
+    respuesta_exportacion,
+)
 from .forms import (
     FarmacoForm,
     PerfilPropietarioForm,
@@ -24,6 +53,12 @@ from .forms import (
     TransferirMascotaForm,
     VacunaRegistroForm,
 )
+from .instrumentacion import registro as registro_metricas
+from .inventario import (
+    agrupar_por_categoria,
+    inventario_por_sucursal,
+    invalidar_inventario,
+)
 from .models import (
     Cita,
     CitaFarmaco,
@@ -32,33 +67,32 @@ from .models import (
     Paciente,
     Producto,
     Propietario,
+    ResumenCitasDiario,
+    ResumenDispensacionDiaria,
     Sucursal,
+    TrabajoExportacion,
     User,
     VacunaRecomendada,
     VacunaRegistro,
+    solo_digitos_telefono,
 )
+from .paginacion import paginar_por_cursor, urls_paginacion
+from .panel_propietario import panel_propietario
+from .portada import PORTADA_PUBLICA_SEGUNDOS, datos_portada
+from .resumenes import dia_local, programar_recalculo
+from .schema import modelos_disponibles
+from .stock import aplicar_movimientos, motivo_consulta
+from .trabajos import encolar_exportacion
 
 
 def _producto_table_available() -> bool:
     """Return True if the Producto table exists in the configured database."""
 
-    table_name = Producto._meta.db_table
-    try:
-        return table_name in connection.introspection.table_names()
-    except (OperationalError, ProgrammingError):
-        return False
+    return modelos_disponibles(Producto)
 
 
 def _vacunas_tables_available() -> bool:
-    required_tables = {
-        VacunaRecomendada._meta.db_table,
-        VacunaRegistro._meta.db_table,
-    }
-    try:
-        tables = set(connection.introspection.table_names())
-    except (OperationalError, ProgrammingError):
-        return False
-    return required_tables.issubset(tables)
+    return modelos_disponibles(VacunaRecomendada, VacunaRegistro)
 
 
 def _normalizar_especie_mascota(especie: str) -> str:
@@ -70,10 +104,6 @@ def _normalizar_especie_mascota(especie: str) -> str:
     return ""
 
 
-def _solo_digitos_telefono(telefono: str) -> str:
-    return "".join(ch for ch in (telefono or "") if ch.isdigit())
-
-
 def _roles_con_sucursal():
     return {"ADMIN", "ADMIN_OP", "VET"}
 
@@ -123,119 +153,231 @@ def _inventario_por_sucursal(sucursal):
                 "ultima_actualizacion": None,
                 "categorias": [],
                 "criticos": [],
+                "en_riesgo": [],
             },
         }
 
-    inventario_qs = (
-        Farmaco.objects.filter(sucursal=sucursal)
-        .order_by("categoria", "nombre")
-        .select_related("sucursal")
-    )
-    farmacos = list(inventario_qs)
+    return inventario_por_sucursal(sucursal)
+
+
+def _estadisticas_veterinarios(veterinarios, citas_base, ahora, fin_semana, limite_proximas=5):
+    """Arma las tarjetas por veterinario con una cantidad fija de consultas.
+
+    Los contadores se calculan con un único aggregate condicional agrupado por
+    veterinario y las próximas citas se obtienen en una sola consulta con
+    ventana (ROW_NUMBER particionado por veterinario).
+    """
 
-    ultima_actualizacion = None
-    if farmacos:
-        ultima_actualizacion = max(
-            (farmaco.actualizado for farmaco in farmacos), default=None
+    if not veterinarios:
+        return []
+
+    vet_ids = [vet.id for vet in veterinarios]
+    citas_vets = citas_base.filter(veterinario_id__in=vet_ids)
+
+    contadores = {
+        registro["veterinario_id"]: registro
+        for registro in citas_vets.values("veterinario_id").annotate(
+            totales=Count("id"),
+            programadas=Count("id", filter=Q(estado="programada")),
+            pendientes=Count("id", filter=Q(estado="pendiente")),
+            atendidas=Count("id", filter=Q(estado="atendida")),
+            canceladas=Count("id", filter=Q(estado="cancelada")),
+            semana=Count(
+                "id",
+                filter=Q(
+                    estado="programada",
+                    fecha_hora__isnull=False,
+                    fecha_hora__gte=ahora,
+                    fecha_hora__lte=fin_semana,
+                ),
+            ),
         )
+    }
 
-    categorias = []
-    for valor, etiqueta in Farmaco.Categoria.choices:
-        elementos = [farmaco for farmaco in farmacos if farmaco.categoria == valor]
-        if elementos:
-            categorias.append(
-                {
-                    "codigo": valor,
-                    "nombre": etiqueta,
-                    "total_items": len(elementos),
-                    "total_stock": sum(farmaco.stock for farmaco in elementos),
-                    "items": elementos,
-                }
+    # Primero las confirmadas por horario y luego las que aún no tienen hora,
+    # igual que el armado anterior con dos consultas por veterinario.
+    proximas_por_vet = defaultdict(list)
+    proximas_qs = (
+        citas_vets.filter(estado="programada")
+        .annotate(
+            posicion=Window(
+                expression=RowNumber(),
+                partition_by=[F("veterinario_id")],
+                order_by=[
+                    F("fecha_hora").asc(nulls_last=True),
+                    F("fecha_solicitada").asc(),
+                    F("id").asc(),
+                ],
             )
+        )
+        .filter(posicion__lte=limite_proximas)
+        .select_related("paciente")
+        .order_by("veterinario_id", "posicion")
+    )
+    for cita in proximas_qs:
+        proximas_por_vet[cita.veterinario_id].append(cita)
+
+    vet_stats = []
+    for vet in veterinarios:
+        registro = contadores.get(vet.id, {})
+        citas_totales = registro.get("totales", 0)
+        citas_programadas = registro.get("programadas", 0)
+        citas_pendientes = registro.get("pendientes", 0)
+        citas_atendidas = registro.get("atendidas", 0)
+        citas_canceladas = registro.get("canceladas", 0)
+
+        nombre_completo = vet.get_full_name() or vet.username
+        iniciales = "".join(parte[0] for parte in nombre_completo.split() if parte)[:2]
+        if not iniciales:
+            iniciales = (vet.username[:2] or "VF").upper()
+        else:
+            iniciales = iniciales.upper()
 
-    criticos = [farmaco for farmaco in farmacos if farmaco.stock <= 5]
+        tasa_atencion = 0
+        if citas_programadas + citas_atendidas:
+            tasa_atencion = round(
+                (citas_atendidas / (citas_programadas + citas_atendidas)) * 100
+            )
 
-    return {
-        "farmacos": farmacos,
-        "resumen": {
-            "total_items": len(farmacos),
-            "total_stock": sum(farmaco.stock for farmaco in farmacos),
-            "ultima_actualizacion": ultima_actualizacion,
-            "categorias": categorias,
-            "criticos": criticos,
-        },
-    }
+        vet_stats.append(
+            {
+                "veterinario": vet,
+                "citas_totales": citas_totales,
+                "citas_programadas": citas_programadas,
+                "citas_pendientes": citas_pendientes,
+                "citas_atendidas": citas_atendidas,
+                "citas_canceladas": citas_canceladas,
+                "citas_en_proceso": citas_programadas + citas_pendientes,
+                "citas_semana": registro.get("semana", 0),
+                "proximas_citas": proximas_por_vet.get(vet.id, []),
+                "tasa_atencion": tasa_atencion,
+                "iniciales": iniciales,
+                "nombre_completo": nombre_completo,
+                "sucursal": vet.sucursal,
+                "sucursal_nombre": vet.sucursal.nombre if vet.sucursal else "",
+            }
+        )
 
+    return vet_stats
 
-def _format_excel_value(value):
-    if value is None:
-        return ""
-    if isinstance(value, datetime):
-        if timezone.is_aware(value):
-            value = timezone.localtime(value)
-        return value.strftime("%d/%m/%Y %H:%M")
-    if isinstance(value, date):
-        return value.strftime("%d/%m/%Y")
-    if isinstance(value, bool):
-        return "Sí" if value else "No"
-    return str(value)
-
-
-def _excel_sections_response(filename, sections):
-    parts = [
-        "<html><head><meta charset='utf-8'></head>",
-        "<body style='font-family:Arial,Helvetica,sans-serif;font-size:13px;'>",
-    ]
 
-    for section in sections:
-        title = section.get("title")
-        description = section.get("description")
-        headers = section.get("headers", [])
-        rows = section.get("rows", [])
+SERIE_VENTANAS_DIAS = (7, 30, 90, 365)
+SERIE_GRANULARIDADES = {
+    "dia": {"kind": "day", "label": "%d/%m"},
+    "semana": {"kind": "week", "label": "Sem. %d/%m"},
+    "mes": {"kind": "month", "label": "%m/%Y"},
+}
 
-        if title:
-            parts.append(
-                f"<h2 style='color:#0f172a;margin-bottom:0.35rem;'>{escape(title)}</h2>"
-            )
-        if description:
-            parts.append(
-                f"<p style='margin-top:0;margin-bottom:0.8rem;color:#334155;'>{escape(description)}</p>"
-            )
 
-        parts.append(
-            "<table border='1' cellspacing='0' cellpadding='6' style='border-collapse:collapse;margin-bottom:1.5rem;width:100%;'>"
+def _inicio_bucket(dia, granularidad):
+    if granularidad == "semana":
+        return dia - timedelta(days=dia.weekday())
+    if granularidad == "mes":
+        return dia.replace(day=1)
+    return dia
+
+
+def _siguiente_bucket(dia, granularidad):
+    if granularidad == "semana":
+        return dia + timedelta(days=7)
+    if granularidad == "mes":
+        return (dia.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return dia + timedelta(days=1)
+
+
+def _serie_temporal_citas(citas_qs, inicio, fin, granularidad="dia"):
+    """Agrupa las citas por periodo con una cantidad fija de consultas.
+
+    ``inicio`` y ``fin`` son fechas locales inclusivas. Las solicitudes se
+    agrupan por ``fecha_solicitada`` y los estados por la fecha confirmada
+    (``fecha_hora``), igual que la serie diaria original.
+    """
+
+    if granularidad not in SERIE_GRANULARIDADES:
+        granularidad = "dia"
+    kind = SERIE_GRANULARIDADES[granularidad]["kind"]
+    formato = SERIE_GRANULARIDADES[granularidad]["label"]
+
+    solicitadas = {
+        registro["bucket"]: registro["total"]
+        for registro in citas_qs.filter(
+            fecha_solicitada__gte=inicio, fecha_solicitada__lte=fin
         )
+        .annotate(bucket=Trunc("fecha_solicitada", kind, output_field=DateField()))
+        .values("bucket")
+        .annotate(total=Count("id"))
+        .order_by()
+    }
 
-        if headers:
-            parts.append("<thead><tr>")
-            for header in headers:
-                parts.append(
-                    f"<th style='background-color:#0f172a;color:#ffffff;text-align:left;'>{escape(header)}</th>"
-                )
-            parts.append("</tr></thead>")
-
-        parts.append("<tbody>")
-        if rows:
-            for row in rows:
-                parts.append("<tr>")
-                for value in row:
-                    text = _format_excel_value(value)
-                    escaped = escape(text).replace("\n", "<br>")
-                    parts.append(f"<td>{escaped}</td>")
-                parts.append("</tr>")
-        else:
-            colspan = max(len(headers), 1)
-            parts.append(
-                f"<tr><td colspan='{colspan}' style='text-align:center;color:#64748b;'>Sin registros disponibles</td></tr>"
+    por_estado = defaultdict(dict)
+    for registro in (
+        citas_qs.filter(
+            estado__in=["programada", "atendida", "cancelada"],
+            fecha_hora__date__gte=inicio,
+            fecha_hora__date__lte=fin,
+        )
+        .annotate(bucket=Trunc("fecha_hora", kind, output_field=DateField()))
+        .values("bucket", "estado")
+        .annotate(total=Count("id"))
+        .order_by()
+    ):
+        por_estado[registro["bucket"]][registro["estado"]] = registro["total"]
+
+    serie = []
+    bucket = _inicio_bucket(inicio, granularidad)
+    while bucket <= fin:
+        estados = por_estado.get(bucket, {})
+        serie.append(
+            {
+                "fecha": bucket,
+                "label": bucket.strftime(formato),
+                "solicitadas": solicitadas.get(bucket, 0),
+                "programadas": estados.get("programada", 0),
+                "atendidas": estados.get("atendida", 0),
+                "canceladas": estados.get("cancelada", 0),
+            }
+        )
+        bucket = _siguiente_bucket(bucket, granularidad)
+    return serie
+
+
+def _promedio_confirmacion_dias(citas_qs):
+    """Average days between the request and the confirmed date, in SQL."""
+
+    resultado = (
+        citas_qs.filter(fecha_hora__isnull=False)
+        .annotate(
+            demora=ExpressionWrapper(
+                TruncDate("fecha_hora") - F("fecha_solicitada"),
+                output_field=DurationField(),
             )
-        parts.append("</tbody></table>")
+        )
+        .filter(demora__gte=timedelta(0))
+        .aggregate(promedio=Avg("demora"))
+    )
+    promedio = resultado["promedio"]
+    if not promedio:
+        return 0
+    return round(promedio.total_seconds() / 86400, 1)
+
+
+def _parametros_serie(params):
+    try:
+        dias = int(params.get("dias", 7))
+    except (TypeError, ValueError):
+        dias = 7
+    if dias not in SERIE_VENTANAS_DIAS:
+        dias = 7
+    granularidad = params.get("granularidad", "dia")
+    if granularidad not in SERIE_GRANULARIDADES:
+        granularidad = "dia"
+    return dias, granularidad
 
-    parts.append("</body></html>")
 
-    response = HttpResponse(content_type="application/vnd.ms-excel")
-    response["Content-Disposition"] = f"attachment; filename={filename}"
-    response.write("".join(parts))
-    return response
+def _excel_sections_response(filename, sections, formato=FORMATO_PREDETERMINADO):
+    """Stream ``sections`` as a download named ``filename`` (sin extensión)."""
+
+    return respuesta_exportacion(filename, sections, formato)
 
 
 class PublicView(View):
@@ -250,54 +392,41 @@ class AuthenticatedView(LoginRequiredMixin, View):
 
 
 
-class LandingView(PublicView):
-    def get(self, request, *args, **kwargs):
-        productos_destacados = Producto.objects.none()
-        total_productos = 0
-        productos_disponibles = _producto_table_available()
+def _datos_portada(request):
+    # Se guarda en el request: los chequeos condicionales y la vista lo piden.
+    if not hasattr(request, "_datos_portada"):
+        request._datos_portada = datos_portada()
+    return request._datos_portada
 
-        if productos_disponibles:
-            productos_destacados = Producto.objects.filter(disponible=True)[:6]
-            total_productos = Producto.objects.filter(disponible=True).count()
 
-        citas_programadas = Cita.objects.filter(estado="programada").exclude(
-            fecha_hora__isnull=True
-        )
-        cita_proxima = (
-            citas_programadas.filter(fecha_hora__gte=timezone.now())
-            .order_by("fecha_hora")
-            .select_related("paciente", "veterinario", "paciente__propietario__user")
-            .first()
-        )
+def _respuesta_compartible(request):
+    # Para usuarios logueados o con mensajes pendientes la página cambia
+    # con la sesión, así que sólo se responde 304 a visitantes anónimos.
+    return not request.user.is_authenticated and not len(messages.get_messages(request))
 
-        nombre_veterinario = ""
-        nombre_propietario = ""
-        if cita_proxima:
-            if cita_proxima.veterinario:
-                nombre_veterinario = (
-                    cita_proxima.veterinario.get_full_name()
-                    or cita_proxima.veterinario.username
-                )
-            propietario_user = cita_proxima.paciente.propietario.user
-            nombre_propietario = propietario_user.get_full_name() or propietario_user.username
 
-        context = {
-            "productos_destacados": productos_destacados,
-            "total_productos": total_productos,
-            "total_propietarios": Propietario.objects.count(),
-            "total_pacientes": Paciente.objects.count(),
-            "total_veterinarios": User.objects.filter(rol="VET").count(),
-            "total_citas_programadas": citas_programadas.count(),
-            "cita_proxima": cita_proxima,
-            "cita_proxima_veterinario": nombre_veterinario,
-            "cita_proxima_propietario": nombre_propietario,
-        }
+def _etag_portada(request, *args, **kwargs):
+    return _datos_portada(request)[1] if _respuesta_compartible(request) else None
 
-        return render(
+
+def _ultima_modificacion_portada(request, *args, **kwargs):
+    return _datos_portada(request)[2] if _respuesta_compartible(request) else None
+
+
+class LandingView(PublicView):
+    @method_decorator(
+        condition(etag_func=_etag_portada, last_modified_func=_ultima_modificacion_portada)
+    )
+    def get(self, request, *args, **kwargs):
+        context, _version, _actualizado = _datos_portada(request)
+        response = render(
             request,
             "core/landing.html",
             context,
         )
+        if _respuesta_compartible(request):
+            patch_cache_control(response, public=True, max_age=PORTADA_PUBLICA_SEGUNDOS)
+        return response
 
 
 class ContactoView(PublicView):
@@ -317,12 +446,12 @@ class ContactoView(PublicView):
             if sucursal_principal.telefono:
                 telefono_principal = sucursal_principal.telefono
 
-        telefono_normalizado = _solo_digitos_telefono(telefono_principal) or "543515301903"
+        telefono_normalizado = solo_digitos_telefono(telefono_principal) or "543515301903"
 
         sucursales_info = []
         for sucursal in sucursales:
             telefono_sucursal = sucursal.telefono or ""
-            telefono_sucursal_normalizado = _solo_digitos_telefono(telefono_sucursal)
+            telefono_sucursal_normalizado = solo_digitos_telefono(telefono_sucursal)
             sucursales_info.append(
                 {
                     "sucursal": sucursal,
@@ -356,27 +485,35 @@ class ContactoView(PublicView):
         return render(request, "core/contacto.html", context)
 
 
+def _version_catalogo(request):
+    if not hasattr(request, "_version_catalogo"):
+        request._version_catalogo = version_catalogo()
+    return request._version_catalogo
+
+
+def _etag_catalogo(request, *args, **kwargs):
+    return str(_version_catalogo(request)) if _respuesta_compartible(request) else None
+
+
+def _ultima_modificacion_catalogo(request, *args, **kwargs):
+    if not _respuesta_compartible(request):
+        return None
+    return actualizado_catalogo(_version_catalogo(request))
+
+
 class TiendaView(PublicView):
+    @method_decorator(
+        condition(etag_func=_etag_catalogo, last_modified_func=_ultima_modificacion_catalogo)
+    )
     def get(self, request, *args, **kwargs):
         categoria = request.GET.get("categoria")
         busqueda = request.GET.get("q", "").strip()
 
-        productos = Producto.objects.none()
-
-        productos_disponibles = _producto_table_available()
-
-        if productos_disponibles:
-            productos = Producto.objects.filter(disponible=True)
-            if categoria in dict(Producto.CATEGORIAS):
-                productos = productos.filter(categoria=categoria)
-            if busqueda:
-                productos = productos.filter(
-                    Q(nombre__icontains=busqueda) | Q(descripcion__icontains=busqueda)
-                )
+        productos = []
+        if _producto_table_available():
+            productos = productos_catalogo(categoria, busqueda)
 
-            productos = productos.order_by("nombre")
-
-        return render(
+        response = render(
             request,
             "core/tienda.html",
             {
@@ -386,9 +523,15 @@ class TiendaView(PublicView):
                 "categorias": Producto.CATEGORIAS,
             },
         )
+        if _respuesta_compartible(request):
+            patch_cache_control(response, public=True, max_age=CATALOGO_PUBLICO_SEGUNDOS)
+        return response
 
 
 class DetalleProductoView(PublicView):
+    @method_decorator(
+        condition(etag_func=_etag_catalogo, last_modified_func=_ultima_modificacion_catalogo)
+    )
     def get(self, request, producto_id, *args, **kwargs):
         if not _producto_table_available():
             messages.error(
@@ -397,20 +540,63 @@ class DetalleProductoView(PublicView):
             )
             return redirect("landing")
 
-        queryset = Producto.objects.filter(disponible=True)
-        if request.user.is_authenticated and request.user.rol == "ADMIN":
-            queryset = Producto.objects.all()
-        producto = get_object_or_404(queryset, id=producto_id)
-        relacionados = (
-            Producto.objects.filter(disponible=True, categoria=producto.categoria)
-            .exclude(id=producto.id)
-            .order_by("-actualizado")[:4]
-        )
-        return render(
+        detalle = detalle_catalogo(producto_id)
+        if detalle is not None:
+            producto, relacionados = detalle
+        elif request.user.is_authenticated and request.user.rol == "ADMIN":
+            # Los administradores también ven los productos no disponibles.
+            producto = get_object_or_404(Producto, id=producto_id)
+            relacionados = relacionados_de(producto)
+        else:
+            raise Http404("Producto no disponible.")
+
+        response = render(
             request,
             "core/detalle_producto.html",
             {"producto": producto, "relacionados": relacionados},
         )
+        if _respuesta_compartible(request):
+            patch_cache_control(response, public=True, max_age=CATALOGO_PUBLICO_SEGUNDOS)
+        return response
+
+
+def _indicadores_admin(user, productos_disponibles):
+    usuarios_qs = _filtrar_por_sucursal(User.objects.all(), user)
+    pacientes_qs = Paciente.objects.all()
+    if not user.is_superuser:
+        pacientes_qs = pacientes_qs.filter(
+            cita__sucursal_id=user.sucursal_id
+        ).distinct()
+    citas_qs = _filtrar_por_sucursal(Cita.objects.all(), user)
+    historiales_qs = HistorialMedico.objects.all()
+    if not user.is_superuser:
+        historiales_qs = historiales_qs.filter(
+            paciente__cita__sucursal_id=user.sucursal_id
+        ).distinct()
+
+    resumen = {estado: 0 for estado, _ in Cita.ESTADOS}
+    for item in citas_qs.values("estado").annotate(total=Count("id")):
+        resumen[item["estado"]] = item["total"]
+    # Listas ya evaluadas: el resultado se guarda en la caché del dashboard.
+    return {
+        "total_usuarios": usuarios_qs.count(),
+        "total_pacientes": pacientes_qs.count(),
+        "total_citas": citas_qs.count(),
+        "total_historiales": historiales_qs.count(),
+        "total_productos": Producto.objects.count() if productos_disponibles else 0,
+        "resumen_citas": resumen,
+        "todas_citas": list(
+            citas_qs.select_related(
+                "paciente",
+                "paciente__propietario__user",
+                "veterinario",
+                "historial_medico",
+            ).order_by("-fecha_solicitada", "-fecha_hora")[:20]
+        ),
+        "todos_pacientes": list(
+            pacientes_qs.select_related("propietario__user").order_by("nombre")[:20]
+        ),
+    }
 
 
 class DashboardView(AuthenticatedView):
@@ -425,41 +611,15 @@ class DashboardView(AuthenticatedView):
                     "Asigna una sucursal a tu perfil para comenzar a gestionar la operación.",
                 )
 
-            usuarios_qs = _filtrar_por_sucursal(User.objects.all(), user)
-            pacientes_qs = Paciente.objects.all()
-            if not user.is_superuser:
-                pacientes_qs = pacientes_qs.filter(
-                    cita__sucursal_id=user.sucursal_id
-                ).distinct()
-            citas_qs = _filtrar_por_sucursal(Cita.objects.all(), user)
-            historiales_qs = HistorialMedico.objects.all()
-            if not user.is_superuser:
-                historiales_qs = historiales_qs.filter(
-                    paciente__cita__sucursal_id=user.sucursal_id
-                ).distinct()
-
-            context["total_usuarios"] = usuarios_qs.count()
-            context["total_pacientes"] = pacientes_qs.count()
-            context["total_citas"] = citas_qs.count()
-            context["total_historiales"] = historiales_qs.count()
             productos_disponibles = _producto_table_available()
-            context["total_productos"] = Producto.objects.count() if productos_disponibles else 0
-            resumen = {estado: 0 for estado, _ in Cita.ESTADOS}
-            for item in citas_qs.values("estado").annotate(total=Count("id")):
-                resumen[item["estado"]] = item["total"]
-            context["resumen_citas"] = resumen
-            context["todas_citas"] = (
-                citas_qs.select_related(
-                    "paciente",
-                    "paciente__propietario__user",
-                    "veterinario",
-                    "historial_medico",
+            context.update(
+                contexto_en_cache(
+                    user,
+                    "indicadores_admin",
+                    lambda: _indicadores_admin(user, productos_disponibles),
                 )
-                .order_by("-fecha_solicitada", "-fecha_hora")[:20]
-            )
-            context["todos_pacientes"] = (
-                pacientes_qs.select_related("propietario__user").order_by("nombre")[:20]
             )
+            # Se evalúa sólo si la sección de productos no sale de la caché.
             context["productos_recientes"] = (
                 Producto.objects.order_by("-actualizado")[:6]
                 if productos_disponibles
@@ -479,9 +639,11 @@ class DashboardView(AuthenticatedView):
                 )
                 .order_by("-fecha_hora", "-fecha_solicitada")
             )
-            context["mis_historiales"] = HistorialMedico.objects.filter(
-                veterinario=user
-            ).order_by("-fecha")
+            context["mis_historiales"] = (
+                HistorialMedico.objects.filter(veterinario=user)
+                .select_related("paciente")
+                .order_by("-fecha")
+            )
             context["mi_sucursal"] = mi_sucursal
             if mi_sucursal is not None:
                 inventario = _inventario_por_sucursal(mi_sucursal)
@@ -491,7 +653,7 @@ class DashboardView(AuthenticatedView):
         elif user.rol == "OWNER":
             productos_disponibles = _producto_table_available()
             propietario = (
-                Propietario.objects.select_related("user")
+                Propietario.objects.select_related("user", "panel")
                 .filter(user=user)
                 .first()
             )
@@ -505,12 +667,9 @@ class DashboardView(AuthenticatedView):
                     {
                         "propietario_incompleto": True,
                         "mis_mascotas": [],
-                        "mis_citas": [],
-                        "mis_historiales": [],
                         "proxima_cita": None,
                         "citas_proximas": [],
                         "citas_recientes": [],
-                        "citas_pendientes": [],
                         "historiales_recientes": [],
                         "estadisticas_propietario": {
                             "mascotas": 0,
@@ -521,48 +680,40 @@ class DashboardView(AuthenticatedView):
                     }
                 )
             else:
-                mascotas = list(
-                    Paciente.objects.filter(propietario=propietario).order_by("nombre")
-                )
-                citas_queryset = (
-                    Cita.objects.filter(paciente__propietario=propietario)
-                    .select_related("paciente", "veterinario")
-                    .order_by("-fecha_solicitada", "-fecha_hora")
+                # Los contadores salen del panel precalculado; las listas son
+                # consultas acotadas sobre (paciente, fecha).
+                panel = panel_propietario(propietario)
+                ahora = timezone.now()
+                citas_propietario = Cita.objects.filter(
+                    paciente__propietario=propietario
+                ).select_related("paciente", "veterinario")
+                citas_proximas = list(
+                    citas_propietario.filter(fecha_hora__gte=ahora).order_by("fecha_hora")[:5]
                 )
-                citas = list(citas_queryset)
-                historiales_queryset = (
-                    HistorialMedico.objects.filter(paciente__propietario=propietario)
-                    .select_related("paciente", "veterinario")
-                    .order_by("-fecha")
+                mascotas = (
+                    list(Paciente.objects.filter(propietario=propietario).order_by("nombre"))
+                    if panel.mascotas
+                    else []
                 )
-                historiales = list(historiales_queryset)
-
-                ahora = timezone.now()
-                citas_confirmadas = [c for c in citas if c.fecha_hora]
-                citas_confirmadas.sort(key=lambda cita: cita.fecha_hora)
-                citas_proximas = [c for c in citas_confirmadas if c.fecha_hora >= ahora]
-                citas_pasadas = [c for c in citas_confirmadas if c.fecha_hora < ahora]
-                citas_pasadas.sort(key=lambda cita: cita.fecha_hora, reverse=True)
-                citas_pendientes = [c for c in citas if not c.fecha_hora]
 
                 context.update(
                     {
                         "mis_mascotas": mascotas,
-                        "mis_citas": citas,
-                        "mis_historiales": historiales,
                         "proxima_cita": citas_proximas[0] if citas_proximas else None,
-                        "citas_proximas": citas_proximas[:5],
-                        "citas_recientes": citas_pasadas[:5],
-                        "citas_pendientes": citas_pendientes,
-                        "historiales_recientes": historiales[:5],
+                        "citas_proximas": citas_proximas,
+                        "citas_recientes": citas_propietario.filter(
+                            fecha_hora__lt=ahora
+                        ).order_by("-fecha_hora")[:5],
+                        "historiales_recientes": HistorialMedico.objects.filter(
+                            paciente__propietario=propietario
+                        )
+                        .select_related("paciente", "veterinario")
+                        .order_by("-fecha")[:5],
                         "estadisticas_propietario": {
-                            "mascotas": len(mascotas),
-                            "citas_activas": len(citas_proximas)
-                            + len(citas_pendientes),
-                            "informes": len(historiales),
-                            "profesionales": len(
-                                {c.veterinario_id for c in citas if c.veterinario_id}
-                            ),
+                            "mascotas": panel.mascotas,
+                            "citas_activas": panel.citas_activas,
+                            "informes": panel.informes,
+                            "profesionales": panel.profesionales,
                         },
                     }
                 )
@@ -633,18 +784,6 @@ class DashboardAdminAnalisisView(AuthenticatedView):
             if sucursal_seleccionada is not None:
                 sucursal_param = str(sucursal_seleccionada.id)
 
-        citas_base = _filtrar_por_sucursal(
-            Cita.objects.select_related(
-                "paciente",
-                "paciente__propietario__user",
-                "veterinario",
-                "sucursal",
-            ).order_by("-fecha_hora", "-fecha_solicitada"),
-            usuario,
-        )
-        if sucursal_seleccionada is not None:
-            citas_base = citas_base.filter(sucursal=sucursal_seleccionada)
-
         farmacos_qs = _filtrar_por_sucursal(
             Farmaco.objects.select_related("sucursal"),
             usuario,
@@ -652,23 +791,20 @@ class DashboardAdminAnalisisView(AuthenticatedView):
         if sucursal_seleccionada is not None:
             farmacos_qs = farmacos_qs.filter(sucursal=sucursal_seleccionada)
 
-        farmacos_utilizados_qs = _filtrar_por_sucursal(
-            CitaFarmaco.objects.select_related(
-                "cita__paciente__propietario__user",
-                "cita__veterinario",
-                "cita__sucursal",
-                "farmaco",
-            ),
-            usuario,
-            field_name="cita__sucursal",
+        # Los totales salen de los resúmenes diarios (ver Core/resumenes.py):
+        # cada periodo suma unas pocas filas en lugar de recorrer las citas.
+        dispensaciones_qs = _filtrar_por_sucursal(
+            ResumenDispensacionDiaria.objects.order_by(), usuario
+        )
+        resumen_citas_qs = _filtrar_por_sucursal(
+            ResumenCitasDiario.objects.order_by(), usuario
         )
         if sucursal_seleccionada is not None:
-            farmacos_utilizados_qs = farmacos_utilizados_qs.filter(
-                cita__sucursal=sucursal_seleccionada
-            )
+            dispensaciones_qs = dispensaciones_qs.filter(sucursal=sucursal_seleccionada)
+            resumen_citas_qs = resumen_citas_qs.filter(sucursal=sucursal_seleccionada)
 
         periodos_inventario = {
-            "dia": {"label": "Últimas 24 horas", "dias": 1},
+            "dia": {"label": "Hoy", "dias": 1},
             "semana": {"label": "Últimos 7 días", "dias": 7},
             "mes": {"label": "Últimos 30 días", "dias": 30},
         }
@@ -676,14 +812,22 @@ class DashboardAdminAnalisisView(AuthenticatedView):
         if inventario_periodo not in periodos_inventario:
             inventario_periodo = "mes"
         inventario_periodo_info = periodos_inventario[inventario_periodo]
-        inicio_periodo_inventario = timezone.now() - timedelta(
-            days=inventario_periodo_info["dias"]
+        inicio_periodo_inventario = timezone.localdate() - timedelta(
+            days=inventario_periodo_info["dias"] - 1
         )
 
-        farmacos_periodo_qs = farmacos_utilizados_qs.filter(
-            registrado__gte=inicio_periodo_inventario
+        farmacos_periodo_qs = dispensaciones_qs.filter(dia__gte=inicio_periodo_inventario)
+        # Pacientes, propietarios y veterinarios distintos no se pueden sumar
+        # entre días: se cuentan sobre las dispensaciones del periodo.
+        consumo_periodo_qs = _filtrar_por_sucursal(
+            CitaFarmaco.objects.order_by(), usuario, field_name="cita__sucursal"
+        ).filter(
+            registrado__gte=timezone.make_aware(
+                datetime.combine(inicio_periodo_inventario, time.min)
+            )
         )
-
+        if sucursal_seleccionada is not None:
+            consumo_periodo_qs = consumo_periodo_qs.filter(cita__sucursal=sucursal_seleccionada)
         total_farmacos_utilizados = (
             farmacos_periodo_qs.aggregate(total=Sum("cantidad")).get("total") or 0
         )
@@ -701,20 +845,26 @@ class DashboardAdminAnalisisView(AuthenticatedView):
             categoria_labels.append(etiqueta)
             categoria_data.append(registro["total"])
 
-        top_farmacos = []
-        for registro in (
+        registros_top_farmacos = list(
             farmacos_periodo_qs.values(
                 "farmaco__id",
                 "farmaco__nombre",
                 "farmaco__categoria",
                 "farmaco__sucursal__nombre",
             )
-            .annotate(
-                total=Sum("cantidad"),
-                pacientes=Count("cita__paciente", distinct=True),
-            )
+            .annotate(total=Sum("cantidad"))
             .order_by("-total")[:8]
-        ):
+        )
+        pacientes_por_farmaco = dict(
+            consumo_periodo_qs.filter(
+                farmaco_id__in=[registro["farmaco__id"] for registro in registros_top_farmacos]
+            )
+            .values("farmaco_id")
+            .annotate(pacientes=Count("cita__paciente", distinct=True))
+            .values_list("farmaco_id", "pacientes")
+        )
+        top_farmacos = []
+        for registro in registros_top_farmacos:
             categoria = registro["farmaco__categoria"]
             top_farmacos.append(
                 {
@@ -723,7 +873,7 @@ class DashboardAdminAnalisisView(AuthenticatedView):
                         categoria, categoria or "Sin categoría"
                     ),
                     "total": registro["total"],
-                    "pacientes": registro["pacientes"],
+                    "pacientes": pacientes_por_farmaco.get(registro["farmaco__id"], 0),
                     "sucursal": registro["farmaco__sucursal__nombre"],
                 }
             )
@@ -759,14 +909,17 @@ class DashboardAdminAnalisisView(AuthenticatedView):
         propietario_farmaco = request.GET.get("propietario_farmaco", "").strip()
 
         if propietario_q:
-            propietarios_qs = propietarios_qs.filter(
+            filtro_propietario = (
                 Q(user__first_name__icontains=propietario_q)
                 | Q(user__last_name__icontains=propietario_q)
                 | Q(user__username__icontains=propietario_q)
                 | Q(user__email__icontains=propietario_q)
-                | Q(telefono__icontains=propietario_q)
                 | Q(paciente__nombre__icontains=propietario_q)
-            ).distinct()
+            )
+            digitos_q = solo_digitos_telefono(propietario_q)
+            if digitos_q:
+                filtro_propietario |= Q(telefono_normalizado__contains=digitos_q)
+            propietarios_qs = propietarios_qs.filter(filtro_propietario).distinct()
 
         dias_periodo_expediente = expediente_periodos[expediente_periodo]["dias"]
         if dias_periodo_expediente:
@@ -784,9 +937,8 @@ class DashboardAdminAnalisisView(AuthenticatedView):
         total_propietarios = propietarios_qs.count()
         propietarios_para_descarga = list(propietarios_qs[:25])
 
-        rendimiento_veterinarios = []
-        for registro in (
-            citas_base.filter(estado="atendida", veterinario__isnull=False)
+        registros_veterinarios = list(
+            resumen_citas_qs.filter(estado="atendida", veterinario__isnull=False)
             .values(
                 "veterinario__id",
                 "veterinario__first_name",
@@ -795,12 +947,28 @@ class DashboardAdminAnalisisView(AuthenticatedView):
                 "veterinario__sucursal__nombre",
             )
             .annotate(
-                total=Count("id"),
-                pacientes=Count("paciente", distinct=True),
-                farmacos=Sum("administraciones_farmacos__cantidad"),
+                total=Sum("total"),
+                farmacos=Sum("farmacos"),
             )
             .order_by("-total")[:6]
-        ):
+        )
+        citas_atendidas_qs = _filtrar_por_sucursal(
+            Cita.objects.order_by(), usuario
+        ).filter(
+            estado="atendida",
+            veterinario_id__in=[
+                registro["veterinario__id"] for registro in registros_veterinarios
+            ],
+        )
+        if sucursal_seleccionada is not None:
+            citas_atendidas_qs = citas_atendidas_qs.filter(sucursal=sucursal_seleccionada)
+        pacientes_por_veterinario = dict(
+            citas_atendidas_qs.values("veterinario_id")
+            .annotate(pacientes=Count("paciente", distinct=True))
+            .values_list("veterinario_id", "pacientes")
+        )
+        rendimiento_veterinarios = []
+        for registro in registros_veterinarios:
             nombre = registro["veterinario__first_name"] or ""
             apellido = registro["veterinario__last_name"] or ""
             username = registro["veterinario__username"] or ""
@@ -812,28 +980,22 @@ class DashboardAdminAnalisisView(AuthenticatedView):
                     "nombre": nombre_visible,
                     "sucursal": registro["veterinario__sucursal__nombre"],
                     "total": registro["total"],
-                    "pacientes": registro["pacientes"],
+                    "pacientes": pacientes_por_veterinario.get(
+                        registro["veterinario__id"], 0
+                    ),
                     "farmacos": registro["farmacos"] or 0,
                 }
             )
 
-        propietarios_inventario_periodo = (
-            farmacos_periodo_qs.values("cita__paciente__propietario_id")
-            .exclude(cita__paciente__propietario_id__isnull=True)
-            .distinct()
-            .count()
-        )
-        veterinarios_inventario_periodo = (
-            farmacos_periodo_qs.values("cita__veterinario_id")
-            .exclude(cita__veterinario_id__isnull=True)
-            .distinct()
-            .count()
+        consumo_periodo = consumo_periodo_qs.aggregate(
+            propietarios=Count("cita__paciente__propietario", distinct=True),
+            veterinarios=Count("cita__veterinario", distinct=True),
         )
 
         resumen_inventario_periodo = {
             "dispensaciones": total_farmacos_utilizados,
-            "propietarios": propietarios_inventario_periodo,
-            "veterinarios": veterinarios_inventario_periodo,
+            "propietarios": consumo_periodo["propietarios"],
+            "veterinarios": consumo_periodo["veterinarios"],
         }
 
         categorias_destacadas = [
@@ -873,11 +1035,231 @@ class DashboardAdminAnalisisView(AuthenticatedView):
             "propietario_q": propietario_q,
             "propietario_farmaco": propietario_farmaco,
             "propietarios_farmacos": propietarios_farmacos,
+            "exportaciones_recientes": TrabajoExportacion.objects.filter(
+                solicitado_por=usuario
+            )[:5],
         }
 
         return render(request, "core/dashboard_admin_analisis.html", context)
 
 
+PERIODOS_REPORTE_INVENTARIO = {
+    "semanal": {"dias": 7, "label": "Últimos 7 días"},
+    "mensual": {"dias": 30, "label": "Últimos 30 días"},
+}
+
+
+def _reporte_inventario(usuario, periodo, sucursal_filtro, sucursal_nombre):
+    """Return ``(nombre_archivo, secciones)`` for the inventory report."""
+
+    dias_intervalo = PERIODOS_REPORTE_INVENTARIO[periodo]["dias"]
+    inicio = timezone.now() - timedelta(days=dias_intervalo)
+    periodo_label = PERIODOS_REPORTE_INVENTARIO[periodo]["label"]
+
+    farmacos_qs = _filtrar_por_sucursal(
+        CitaFarmaco.objects.select_related(
+            "cita__paciente__propietario__user",
+            "cita__veterinario",
+            "cita__sucursal",
+            "farmaco",
+        ),
+        usuario,
+        field_name="cita__sucursal",
+    )
+    if sucursal_filtro is not None:
+        farmacos_qs = farmacos_qs.filter(cita__sucursal_id=sucursal_filtro)
+
+    farmacos_qs = farmacos_qs.filter(registrado__gte=inicio)
+
+    total_registros = farmacos_qs.count()
+    unidades_utilizadas = (
+        farmacos_qs.aggregate(total=Sum("cantidad")).get("total") or 0
+    )
+    citas_incluidas = farmacos_qs.values("cita_id").distinct().count()
+    pacientes_incluidos = farmacos_qs.values("cita__paciente_id").distinct().count()
+    veterinarios_involucrados = farmacos_qs.filter(
+        cita__veterinario__isnull=False
+    ).values("cita__veterinario_id").distinct().count()
+
+    categoria_lookup = dict(Farmaco.Categoria.choices)
+    momento_actual = timezone.localtime(timezone.now())
+
+    def filas_detalle():
+        detalle_qs = farmacos_qs.order_by("-cita__fecha_hora", "-registrado")
+        for registro in detalle_qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            cita = registro.cita
+            paciente = cita.paciente
+            propietario = paciente.propietario
+            propietario_user = propietario.user
+            veterinario = cita.veterinario
+
+            yield [
+                cita.sucursal.nombre if cita.sucursal_id else "",
+                cita.fecha_hora or cita.fecha_solicitada,
+                registro.registrado,
+                cita.get_estado_display(),
+                cita.get_tipo_display(),
+                (veterinario.get_full_name() or veterinario.username)
+                if veterinario
+                else "Sin asignar",
+                paciente.nombre,
+                propietario_user.get_full_name() or propietario_user.username,
+                propietario.telefono or propietario_user.telefono,
+                propietario_user.email,
+                registro.farmaco.nombre,
+                categoria_lookup.get(
+                    registro.farmaco.categoria, registro.farmaco.categoria
+                ),
+                registro.cantidad,
+                registro.farmaco.stock,
+                cita.notas,
+            ]
+
+    resumen_contexto = {
+        "title": "Contexto del informe",
+        "headers": ["Indicador", "Valor"],
+        "rows": [
+            ["Generado", momento_actual],
+            ["Periodo", periodo_label],
+            ["Sucursal", sucursal_nombre],
+            ["Registros analizados", total_registros],
+            ["Unidades dispensadas", unidades_utilizadas],
+            ["Citas impactadas", citas_incluidas],
+            ["Pacientes únicos", pacientes_incluidos],
+            ["Veterinarios involucrados", veterinarios_involucrados],
+        ],
+    }
+
+    seccion_detalle = {
+        "title": "Dispensación detallada por cita",
+        "headers": [
+            "Sucursal",
+            "Fecha de la cita",
+            "Registro",
+            "Estado",
+            "Tipo",
+            "Veterinario",
+            "Paciente",
+            "Propietario",
+            "Teléfono",
+            "Email",
+            "Fármaco",
+            "Categoría",
+            "Cantidad",
+            "Stock actual",
+            "Notas de la cita",
+        ],
+        "rows": filas_detalle(),
+    }
+
+    filas_categorias = []
+    for registro in (
+        farmacos_qs.values("farmaco__categoria")
+        .annotate(unidades=Sum("cantidad"), items=Count("farmaco", distinct=True))
+        .order_by("-unidades")
+    ):
+        etiqueta = categoria_lookup.get(
+            registro["farmaco__categoria"], registro["farmaco__categoria"]
+        )
+        filas_categorias.append(
+            [
+                etiqueta,
+                registro["items"],
+                registro["unidades"],
+            ]
+        )
+
+    seccion_categorias = {
+        "title": "Resumen por categoría terapéutica",
+        "headers": ["Categoría", "Referencias", "Unidades dispensadas"],
+        "rows": filas_categorias,
+    }
+
+    filas_farmacos = []
+    for registro in (
+        farmacos_qs.values("farmaco__nombre", "farmaco__categoria")
+        .annotate(
+            unidades=Sum("cantidad"),
+            citas=Count("cita", distinct=True),
+            pacientes=Count("cita__paciente", distinct=True),
+            stock=Max("farmaco__stock"),
+        )
+        .order_by("-unidades")
+    ):
+        filas_farmacos.append(
+            [
+                registro["farmaco__nombre"],
+                categoria_lookup.get(
+                    registro["farmaco__categoria"], registro["farmaco__categoria"]
+                ),
+                registro["unidades"],
+                registro["citas"],
+                registro["pacientes"],
+                registro["stock"],
+            ]
+        )
+
+    seccion_farmacos = {
+        "title": "Principales fármacos dispensados",
+        "headers": [
+            "Fármaco",
+            "Categoría",
+            "Unidades",
+            "Citas",
+            "Pacientes",
+            "Stock actual",
+        ],
+        "rows": filas_farmacos,
+    }
+
+    filename = f"reporte_inventario_{periodo}_{momento_actual:%Y%m%d%H%M}"
+    return filename, [
+        resumen_contexto,
+        seccion_detalle,
+        seccion_categorias,
+        seccion_farmacos,
+    ]
+
+
+def _parametros_reporte_inventario(request, params):
+    """Validate the report filters; returns None after flashing an error."""
+
+    usuario = request.user
+    periodo = (params.get("periodo") or "semanal").lower()
+    if periodo not in PERIODOS_REPORTE_INVENTARIO:
+        periodo = "semanal"
+
+    sucursal_param = params.get("sucursal", "")
+    sucursales_qs = _sucursales_para_usuario(usuario)
+    sucursal_filtro = None
+    sucursal_nombre = "Todas las sucursales"
+
+    if sucursal_param and sucursal_param != "todas":
+        if not sucursal_param.isdigit():
+            messages.error(request, "La sucursal indicada no es válida.")
+            return None
+        sucursal_id = int(sucursal_param)
+        if not sucursales_qs.filter(id=sucursal_id).exists():
+            messages.error(request, "No tienes permisos sobre la sucursal seleccionada.")
+            return None
+        sucursal_filtro = sucursal_id
+        sucursal_nombre = (
+            Sucursal.objects.filter(id=sucursal_id).values_list("nombre", flat=True).first()
+            or "Sucursal"
+        )
+    elif not usuario.is_superuser:
+        sucursal_filtro = getattr(usuario, "sucursal_id", None)
+        sucursal_nombre = (
+            getattr(usuario.sucursal, "nombre", "Sucursal no asignada")
+        )
+
+    return {
+        "periodo": periodo,
+        "sucursal_filtro": sucursal_filtro,
+        "sucursal_nombre": sucursal_nombre,
+    }
+
+
 class ExportarInventarioExcelView(AuthenticatedView):
     def get(self, request, *args, **kwargs):
         usuario = request.user
@@ -888,204 +1270,252 @@ class ExportarInventarioExcelView(AuthenticatedView):
             )
             return redirect("dashboard")
 
-        periodo = (request.GET.get("periodo") or "semanal").lower()
-        periodos_validos = {"semanal": 7, "mensual": 30}
-        if periodo not in periodos_validos:
-            periodo = "semanal"
+        parametros = _parametros_reporte_inventario(request, request.GET)
+        if parametros is None:
+            return redirect("dashboard_admin_analisis")
 
-        dias_intervalo = periodos_validos[periodo]
-        inicio = timezone.now() - timedelta(days=dias_intervalo)
-        periodo_label = {
-            "semanal": "Últimos 7 días",
-            "mensual": "Últimos 30 días",
-        }[periodo]
+        filename, secciones = _reporte_inventario(usuario, **parametros)
+        return _excel_sections_response(filename, secciones, request.GET.get("formato"))
 
-        sucursal_param = request.GET.get("sucursal", "")
-        sucursales_qs = _sucursales_para_usuario(usuario)
-        sucursal_filtro = None
-        sucursal_nombre = "Todas las sucursales"
 
-        if sucursal_param and sucursal_param != "todas":
-            if not sucursal_param.isdigit():
-                messages.error(request, "La sucursal indicada no es válida.")
-                return redirect("dashboard_admin_analisis")
-            sucursal_id = int(sucursal_param)
-            if not sucursales_qs.filter(id=sucursal_id).exists():
-                messages.error(request, "No tienes permisos sobre la sucursal seleccionada.")
-                return redirect("dashboard_admin_analisis")
-            sucursal_filtro = sucursal_id
-            sucursal_nombre = (
-                Sucursal.objects.filter(id=sucursal_id).values_list("nombre", flat=True).first()
-                or "Sucursal"
-            )
-        elif not usuario.is_superuser:
-            sucursal_filtro = getattr(usuario, "sucursal_id", None)
-            sucursal_nombre = (
-                getattr(usuario.sucursal, "nombre", "Sucursal no asignada")
+def _citas_propietario(propietario, sucursal_filtro):
+    citas_qs = Cita.objects.filter(paciente__propietario=propietario).select_related(
+        "paciente",
+        "paciente__propietario",
+        "paciente__propietario__user",
+        "veterinario",
+        "sucursal",
+        "historial_medico",
+    )
+    if sucursal_filtro is not None:
+        citas_qs = citas_qs.filter(sucursal_id=sucursal_filtro)
+    return citas_qs
+
+
+def _reporte_propietario(propietario, sucursal_filtro, sucursal_nombre):
+    """Return ``(nombre_archivo, secciones)`` for an owner's full record."""
+
+    citas_qs = _citas_propietario(propietario, sucursal_filtro)
+
+    pacientes_qs = Paciente.objects.filter(propietario=propietario)
+    if sucursal_filtro is not None:
+        pacientes_qs = pacientes_qs.filter(cita__sucursal_id=sucursal_filtro).distinct()
+
+    historiales_qs = HistorialMedico.objects.filter(
+        paciente__propietario=propietario
+    ).select_related("paciente", "veterinario")
+    if sucursal_filtro is not None:
+        historiales_qs = historiales_qs.filter(
+            Q(cita__sucursal_id=sucursal_filtro)
+            | Q(
+                cita__isnull=True,
+                paciente__cita__sucursal_id=sucursal_filtro,
             )
+        ).distinct()
+
+    farmacos_qs = CitaFarmaco.objects.filter(
+        cita__paciente__propietario=propietario
+    ).select_related("farmaco", "cita", "cita__sucursal")
+    if sucursal_filtro is not None:
+        farmacos_qs = farmacos_qs.filter(cita__sucursal_id=sucursal_filtro)
+
+    categoria_lookup = dict(Farmaco.Categoria.choices)
+    momento_actual = timezone.localtime(timezone.now())
+
+    resumen_propietario = {
+        "title": "Ficha del propietario",
+        "headers": ["Campo", "Detalle"],
+        "rows": [
+            [
+                "Propietario",
+                propietario.user.get_full_name() or propietario.user.username,
+            ],
+            ["Correo electrónico", propietario.user.email],
+            [
+                "Teléfono",
+                propietario.telefono or propietario.user.telefono or "Sin informar",
+            ],
+            ["Dirección", propietario.direccion or "Sin registrar"],
+            ["Ciudad", propietario.ciudad or "Sin registrar"],
+            ["Sucursal", sucursal_nombre],
+            ["Expediente generado", momento_actual],
+        ],
+    }
 
-        farmacos_qs = _filtrar_por_sucursal(
-            CitaFarmaco.objects.select_related(
-                "cita__paciente__propietario__user",
-                "cita__veterinario",
-                "cita__sucursal",
-                "farmaco",
-            ),
-            usuario,
-            field_name="cita__sucursal",
+    filas_mascotas = []
+    for mascota in pacientes_qs.order_by("nombre"):
+        filas_mascotas.append(
+            [
+                mascota.nombre,
+                mascota.especie,
+                mascota.raza or "-",
+                mascota.sexo,
+                mascota.fecha_nacimiento,
+                mascota.vacunas or "Sin registros",
+                mascota.alergias or "Sin registros",
+            ]
         )
-        if sucursal_filtro is not None:
-            farmacos_qs = farmacos_qs.filter(cita__sucursal_id=sucursal_filtro)
 
-        farmacos_qs = farmacos_qs.filter(registrado__gte=inicio)
+    seccion_mascotas = {
+        "title": "Mascotas registradas",
+        "headers": [
+            "Nombre",
+            "Especie",
+            "Raza",
+            "Sexo",
+            "Fecha de nacimiento",
+            "Vacunas",
+            "Alergias",
+        ],
+        "rows": filas_mascotas,
+    }
 
-        total_registros = farmacos_qs.count()
-        unidades_utilizadas = (
-            farmacos_qs.aggregate(total=Sum("cantidad")).get("total") or 0
+    farmacos_por_cita = defaultdict(list)
+    for administracion in farmacos_qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        farmacos_por_cita[administracion.cita_id].append(
+            f"{administracion.farmaco.nombre} (x{administracion.cantidad})"
         )
-        citas_incluidas = farmacos_qs.values("cita_id").distinct().count()
-        pacientes_incluidos = farmacos_qs.values("cita__paciente_id").distinct().count()
-        veterinarios_involucrados = farmacos_qs.filter(
-            cita__veterinario__isnull=False
-        ).values("cita__veterinario_id").distinct().count()
 
-        categoria_lookup = dict(Farmaco.Categoria.choices)
-        momento_actual = timezone.localtime(timezone.now())
-
-        filas_detalle = []
-        for registro in farmacos_qs.order_by("-cita__fecha_hora", "-registrado"):
-            cita = registro.cita
-            paciente = cita.paciente
-            propietario = paciente.propietario
-            propietario_user = propietario.user
+    def filas_citas():
+        citas_ordenadas = citas_qs.order_by("-fecha_hora", "-fecha_solicitada")
+        for cita in citas_ordenadas.iterator(chunk_size=EXPORT_CHUNK_SIZE):
             veterinario = cita.veterinario
+            historial = getattr(cita, "historial_medico", None)
+            farmacos_list = farmacos_por_cita.get(cita.id, [])
+            yield [
+                cita.fecha_hora or cita.fecha_solicitada,
+                cita.get_estado_display(),
+                cita.get_tipo_display(),
+                cita.sucursal.nombre if cita.sucursal_id else "",
+                (veterinario.get_full_name() or veterinario.username)
+                if veterinario
+                else "Sin asignar",
+                cita.paciente.nombre,
+                ", ".join(farmacos_list) if farmacos_list else "Sin registros",
+                historial.diagnostico if historial else "-",
+                historial.tratamiento if historial else "-",
+            ]
 
-            filas_detalle.append(
-                [
-                    cita.sucursal.nombre if cita.sucursal_id else "",
-                    cita.fecha_hora or cita.fecha_solicitada,
-                    registro.registrado,
-                    cita.get_estado_display(),
-                    cita.get_tipo_display(),
-                    (veterinario.get_full_name() or veterinario.username)
-                    if veterinario
-                    else "Sin asignar",
-                    paciente.nombre,
-                    propietario_user.get_full_name() or propietario_user.username,
-                    propietario.telefono or propietario_user.telefono,
-                    propietario_user.email,
-                    registro.farmaco.nombre,
-                    categoria_lookup.get(
-                        registro.farmaco.categoria, registro.farmaco.categoria
-                    ),
-                    registro.cantidad,
-                    registro.farmaco.stock,
-                    cita.notas,
-                ]
-            )
+    seccion_citas = {
+        "title": "Citas y atenciones",
+        "headers": [
+            "Fecha",
+            "Estado",
+            "Tipo",
+            "Sucursal",
+            "Veterinario",
+            "Paciente",
+            "Fármacos utilizados",
+            "Diagnóstico",
+            "Tratamiento",
+        ],
+        "rows": filas_citas(),
+    }
 
-        resumen_contexto = {
-            "title": "Contexto del informe",
-            "headers": ["Indicador", "Valor"],
-            "rows": [
-                ["Generado", momento_actual],
-                ["Periodo", periodo_label],
-                ["Sucursal", sucursal_nombre],
-                ["Registros analizados", total_registros],
-                ["Unidades dispensadas", unidades_utilizadas],
-                ["Citas impactadas", citas_incluidas],
-                ["Pacientes únicos", pacientes_incluidos],
-                ["Veterinarios involucrados", veterinarios_involucrados],
-            ],
-        }
+    def filas_historial():
+        historiales_ordenados = historiales_qs.order_by("-fecha")
+        for historial in historiales_ordenados.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            veterinario = historial.veterinario
+            yield [
+                historial.fecha,
+                historial.paciente.nombre,
+                (veterinario.get_full_name() or veterinario.username)
+                if veterinario
+                else "Sin asignar",
+                historial.diagnostico,
+                historial.tratamiento,
+                historial.notas or "-",
+            ]
 
-        seccion_detalle = {
-            "title": "Dispensación detallada por cita",
-            "headers": [
-                "Sucursal",
-                "Fecha de la cita",
-                "Registro",
-                "Estado",
-                "Tipo",
-                "Veterinario",
-                "Paciente",
-                "Propietario",
-                "Teléfono",
-                "Email",
-                "Fármaco",
-                "Categoría",
-                "Cantidad",
-                "Stock actual",
-                "Notas de la cita",
-            ],
-            "rows": filas_detalle,
-        }
+    seccion_historial = {
+        "title": "Historial clínico",
+        "headers": [
+            "Fecha",
+            "Paciente",
+            "Profesional",
+            "Diagnóstico",
+            "Tratamiento",
+            "Notas",
+        ],
+        "rows": filas_historial(),
+    }
 
-        filas_categorias = []
-        for registro in (
-            farmacos_qs.values("farmaco__categoria")
-            .annotate(unidades=Sum("cantidad"), items=Count("farmaco", distinct=True))
-            .order_by("-unidades")
-        ):
-            etiqueta = categoria_lookup.get(
-                registro["farmaco__categoria"], registro["farmaco__categoria"]
-            )
-            filas_categorias.append(
-                [
-                    etiqueta,
-                    registro["items"],
-                    registro["unidades"],
-                ]
-            )
+    filas_farmacos = []
+    for registro in (
+        farmacos_qs.values("farmaco__nombre", "farmaco__categoria")
+        .annotate(
+            unidades=Sum("cantidad"),
+            citas=Count("cita", distinct=True),
+        )
+        .order_by("-unidades")
+    ):
+        filas_farmacos.append(
+            [
+                registro["farmaco__nombre"],
+                categoria_lookup.get(
+                    registro["farmaco__categoria"], registro["farmaco__categoria"]
+                ),
+                registro["unidades"],
+                registro["citas"],
+            ]
+        )
 
-        seccion_categorias = {
-            "title": "Resumen por categoría terapéutica",
-            "headers": ["Categoría", "Referencias", "Unidades dispensadas"],
-            "rows": filas_categorias,
-        }
+    seccion_farmacos = {
+        "title": "Fármacos administrados al propietario",
+        "headers": ["Fármaco", "Categoría", "Unidades", "Citas"],
+        "rows": filas_farmacos,
+    }
 
-        filas_farmacos = []
-        for registro in (
-            farmacos_qs.values("farmaco__nombre", "farmaco__categoria")
-            .annotate(
-                unidades=Sum("cantidad"),
-                citas=Count("cita", distinct=True),
-                pacientes=Count("cita__paciente", distinct=True),
-                stock=Max("farmaco__stock"),
-            )
-            .order_by("-unidades")
-        ):
-            filas_farmacos.append(
-                [
-                    registro["farmaco__nombre"],
-                    categoria_lookup.get(
-                        registro["farmaco__categoria"], registro["farmaco__categoria"]
-                    ),
-                    registro["unidades"],
-                    registro["citas"],
-                    registro["pacientes"],
-                    registro["stock"],
-                ]
-            )
+    owner_slug = (propietario.user.username or "propietario").replace(" ", "_")
+    filename = f"expediente_{owner_slug}_{momento_actual:%Y%m%d%H%M}"
 
-        seccion_farmacos = {
-            "title": "Principales fármacos dispensados",
-            "headers": [
-                "Fármaco",
-                "Categoría",
-                "Unidades",
-                "Citas",
-                "Pacientes",
-                "Stock actual",
-            ],
-            "rows": filas_farmacos,
-        }
+    return filename, [
+        resumen_propietario,
+        seccion_mascotas,
+        seccion_citas,
+        seccion_historial,
+        seccion_farmacos,
+    ]
+
+
+def _parametros_reporte_propietario(request, params, propietario):
+    """Validate the branch filter for an owner export; None on error."""
 
-        filename = f"reporte_inventario_{periodo}_{momento_actual:%Y%m%d%H%M}.xls"
-        return _excel_sections_response(
-            filename,
-            [resumen_contexto, seccion_detalle, seccion_categorias, seccion_farmacos],
+    usuario = request.user
+    sucursal_param = params.get("sucursal", "")
+    sucursal_filtro = None
+    sucursal_nombre = "Todas las sucursales"
+
+    if usuario.is_superuser:
+        if sucursal_param and sucursal_param not in {"", "todas"}:
+            if not sucursal_param.isdigit():
+                messages.error(request, "La sucursal indicada no es válida.")
+                return None
+            sucursal_id = int(sucursal_param)
+            sucursal = Sucursal.objects.filter(id=sucursal_id).first()
+            if sucursal is None:
+                messages.error(request, "La sucursal seleccionada no existe.")
+                return None
+            sucursal_filtro = sucursal.id
+            sucursal_nombre = sucursal.nombre
+    else:
+        sucursal_filtro = getattr(usuario, "sucursal_id", None)
+        sucursal_nombre = (
+            getattr(usuario.sucursal, "nombre", "Sucursal no asignada")
         )
+        if sucursal_param and sucursal_param not in {str(sucursal_filtro), ""}:
+            messages.error(request, "No puedes consultar expedientes de otras sucursales.")
+            return None
+
+    if not usuario.is_superuser and getattr(usuario, "sucursal_id", None):
+        if not _citas_propietario(propietario, sucursal_filtro).exists():
+            messages.error(
+                request,
+                "No se encontraron citas del propietario dentro de tu sucursal.",
+            )
+            return None
+
+    return {"sucursal_filtro": sucursal_filtro, "sucursal_nombre": sucursal_nombre}
 
 
 class ExportarPropietarioExcelView(AuthenticatedView):
@@ -1102,234 +1532,95 @@ class ExportarPropietarioExcelView(AuthenticatedView):
             Propietario.objects.select_related("user"), id=propietario_id
         )
 
-        sucursal_param = request.GET.get("sucursal", "")
-        sucursal_filtro = None
-        sucursal_nombre = "Todas las sucursales"
-
-        if usuario.is_superuser:
-            if sucursal_param and sucursal_param not in {"", "todas"}:
-                if not sucursal_param.isdigit():
-                    messages.error(request, "La sucursal indicada no es válida.")
-                    return redirect("dashboard_admin_analisis")
-                sucursal_id = int(sucursal_param)
-                sucursal = Sucursal.objects.filter(id=sucursal_id).first()
-                if sucursal is None:
-                    messages.error(request, "La sucursal seleccionada no existe.")
-                    return redirect("dashboard_admin_analisis")
-                sucursal_filtro = sucursal.id
-                sucursal_nombre = sucursal.nombre
-        else:
-            sucursal_filtro = getattr(usuario, "sucursal_id", None)
-            sucursal_nombre = (
-                getattr(usuario.sucursal, "nombre", "Sucursal no asignada")
-            )
-            if sucursal_param and sucursal_param not in {str(sucursal_filtro), ""}:
-                messages.error(request, "No puedes consultar expedientes de otras sucursales.")
-                return redirect("dashboard_admin_analisis")
-
-        citas_qs = Cita.objects.filter(paciente__propietario=propietario).select_related(
-            "paciente",
-            "paciente__propietario",
-            "paciente__propietario__user",
-            "veterinario",
-            "sucursal",
-            "historial_medico",
-        )
-        if sucursal_filtro is not None:
-            citas_qs = citas_qs.filter(sucursal_id=sucursal_filtro)
+        parametros = _parametros_reporte_propietario(request, request.GET, propietario)
+        if parametros is None:
+            return redirect("dashboard_admin_analisis")
 
-        if not usuario.is_superuser and getattr(usuario, "sucursal_id", None):
-            if not citas_qs.exists():
-                messages.error(
-                    request,
-                    "No se encontraron citas del propietario dentro de tu sucursal.",
-                )
-                return redirect("dashboard_admin_analisis")
-
-        pacientes_qs = Paciente.objects.filter(propietario=propietario)
-        if sucursal_filtro is not None:
-            pacientes_qs = pacientes_qs.filter(cita__sucursal_id=sucursal_filtro).distinct()
-
-        historiales_qs = HistorialMedico.objects.filter(
-            paciente__propietario=propietario
-        ).select_related("paciente", "veterinario")
-        if sucursal_filtro is not None:
-            historiales_qs = historiales_qs.filter(
-                Q(cita__sucursal_id=sucursal_filtro)
-                | Q(
-                    cita__isnull=True,
-                    paciente__cita__sucursal_id=sucursal_filtro,
-                )
-            ).distinct()
+        filename, secciones = _reporte_propietario(propietario, **parametros)
+        return _excel_sections_response(filename, secciones, request.GET.get("formato"))
 
-        farmacos_qs = CitaFarmaco.objects.filter(
-            cita__paciente__propietario=propietario
-        ).select_related("farmaco", "cita", "cita__sucursal")
-        if sucursal_filtro is not None:
-            farmacos_qs = farmacos_qs.filter(cita__sucursal_id=sucursal_filtro)
 
-        categoria_lookup = dict(Farmaco.Categoria.choices)
-        momento_actual = timezone.localtime(timezone.now())
+class EncolarExportacionView(AuthenticatedView):
+    """Encola un reporte para generarlo fuera del request."""
 
-        resumen_propietario = {
-            "title": "Ficha del propietario",
-            "headers": ["Campo", "Detalle"],
-            "rows": [
-                [
-                    "Propietario",
-                    propietario.user.get_full_name() or propietario.user.username,
-                ],
-                ["Correo electrónico", propietario.user.email],
-                [
-                    "Teléfono",
-                    propietario.telefono or propietario.user.telefono or "Sin informar",
-                ],
-                ["Dirección", propietario.direccion or "Sin registrar"],
-                ["Ciudad", propietario.ciudad or "Sin registrar"],
-                ["Sucursal", sucursal_nombre],
-                ["Expediente generado", momento_actual],
-            ],
-        }
-
-        filas_mascotas = []
-        for mascota in pacientes_qs.order_by("nombre"):
-            filas_mascotas.append(
-                [
-                    mascota.nombre,
-                    mascota.especie,
-                    mascota.raza or "-",
-                    mascota.sexo,
-                    mascota.fecha_nacimiento,
-                    mascota.vacunas or "Sin registros",
-                    mascota.alergias or "Sin registros",
-                ]
-            )
-
-        seccion_mascotas = {
-            "title": "Mascotas registradas",
-            "headers": [
-                "Nombre",
-                "Especie",
-                "Raza",
-                "Sexo",
-                "Fecha de nacimiento",
-                "Vacunas",
-                "Alergias",
-            ],
-            "rows": filas_mascotas,
-        }
-
-        farmacos_por_cita = defaultdict(list)
-        for administracion in farmacos_qs:
-            farmacos_por_cita[administracion.cita_id].append(
-                f"{administracion.farmaco.nombre} (x{administracion.cantidad})"
+    def post(self, request, *args, **kwargs):
+        usuario = request.user
+        if not (usuario.is_superuser or usuario.rol == "ADMIN"):
+            messages.error(
+                request,
+                "Solo los administradores pueden generar reportes en segundo plano.",
             )
+            return redirect("dashboard")
 
-        citas_list = list(citas_qs.order_by("-fecha_hora", "-fecha_solicitada"))
-        filas_citas = []
-        for cita in citas_list:
-            veterinario = cita.veterinario
-            historial = getattr(cita, "historial_medico", None)
-            farmacos_list = farmacos_por_cita.get(cita.id, [])
-            filas_citas.append(
-                [
-                    cita.fecha_hora or cita.fecha_solicitada,
-                    cita.get_estado_display(),
-                    cita.get_tipo_display(),
-                    cita.sucursal.nombre if cita.sucursal_id else "",
-                    (veterinario.get_full_name() or veterinario.username)
-                    if veterinario
-                    else "Sin asignar",
-                    cita.paciente.nombre,
-                    ", ".join(farmacos_list) if farmacos_list else "Sin registros",
-                    historial.diagnostico if historial else "-",
-                    historial.tratamiento if historial else "-",
-                ]
+        tipo = request.POST.get("tipo")
+        if tipo == "inventario":
+            parametros = _parametros_reporte_inventario(request, request.POST)
+        elif tipo == "propietario":
+            propietario_id = request.POST.get("propietario_id", "")
+            propietario = get_object_or_404(
+                Propietario.objects.select_related("user"),
+                id=int(propietario_id) if propietario_id.isdigit() else 0,
             )
-
-        seccion_citas = {
-            "title": "Citas y atenciones",
-            "headers": [
-                "Fecha",
-                "Estado",
-                "Tipo",
-                "Sucursal",
-                "Veterinario",
-                "Paciente",
-                "Fármacos utilizados",
-                "Diagnóstico",
-                "Tratamiento",
-            ],
-            "rows": filas_citas,
-        }
-
-        filas_historial = []
-        for historial in historiales_qs.order_by("-fecha"):
-            veterinario = historial.veterinario
-            filas_historial.append(
-                [
-                    historial.fecha,
-                    historial.paciente.nombre,
-                    (veterinario.get_full_name() or veterinario.username)
-                    if veterinario
-                    else "Sin asignar",
-                    historial.diagnostico,
-                    historial.tratamiento,
-                    historial.notas or "-",
-                ]
+            parametros = _parametros_reporte_propietario(
+                request, request.POST, propietario
             )
+            if parametros is not None:
+                parametros["propietario_id"] = propietario.id
+        else:
+            messages.error(request, "El tipo de reporte solicitado no es válido.")
+            return redirect("dashboard_admin_analisis")
 
-        seccion_historial = {
-            "title": "Historial clínico",
-            "headers": [
-                "Fecha",
-                "Paciente",
-                "Profesional",
-                "Diagnóstico",
-                "Tratamiento",
-                "Notas",
-            ],
-            "rows": filas_historial,
-        }
-
-        filas_farmacos = []
-        for registro in (
-            farmacos_qs.values("farmaco__nombre", "farmaco__categoria")
-            .annotate(
-                unidades=Sum("cantidad"),
-                citas=Count("cita", distinct=True),
-            )
-            .order_by("-unidades")
-        ):
-            filas_farmacos.append(
-                [
-                    registro["farmaco__nombre"],
-                    categoria_lookup.get(
-                        registro["farmaco__categoria"], registro["farmaco__categoria"]
-                    ),
-                    registro["unidades"],
-                    registro["citas"],
-                ]
-            )
+        if parametros is None:
+            return redirect("dashboard_admin_analisis")
 
-        seccion_farmacos = {
-            "title": "Fármacos administrados al propietario",
-            "headers": ["Fármaco", "Categoría", "Unidades", "Citas"],
-            "rows": filas_farmacos,
+        trabajo = encolar_exportacion(
+            usuario, tipo, request.POST.get("formato"), parametros
+        )
+        messages.success(
+            request,
+            f"El reporte #{trabajo.pk} se está generando. Podrás descargarlo desde esta página cuando esté listo.",
+        )
+        return redirect("dashboard_admin_analisis")
+
+
+def _trabajo_del_usuario(request, trabajo_id):
+    trabajos = TrabajoExportacion.objects.all()
+    if not request.user.is_superuser:
+        trabajos = trabajos.filter(solicitado_por=request.user)
+    return get_object_or_404(trabajos, id=trabajo_id)
+
+
+class EstadoExportacionView(AuthenticatedView):
+    def get(self, request, trabajo_id, *args, **kwargs):
+        trabajo = _trabajo_del_usuario(request, trabajo_id)
+        datos = {
+            "id": trabajo.id,
+            "tipo": trabajo.tipo,
+            "formato": trabajo.formato,
+            "estado": trabajo.estado,
+            "error": trabajo.error,
+            "creado": trabajo.creado.isoformat(),
+            "finalizado": trabajo.finalizado.isoformat() if trabajo.finalizado else None,
+            "descarga": None,
         }
-
-        owner_slug = (propietario.user.username or "propietario").replace(" ", "_")
-        filename = f"expediente_{owner_slug}_{momento_actual:%Y%m%d%H%M}.xls"
-
-        secciones = [
-            resumen_propietario,
-            seccion_mascotas,
-            seccion_citas,
-            seccion_historial,
-            seccion_farmacos,
-        ]
-
-        return _excel_sections_response(filename, secciones)
+        if trabajo.estado == "completado":
+            datos["descarga"] = reverse("descargar_exportacion", args=[trabajo.id])
+        return JsonResponse(datos)
+
+
+class DescargarExportacionView(AuthenticatedView):
+    def get(self, request, trabajo_id, *args, **kwargs):
+        trabajo = _trabajo_del_usuario(request, trabajo_id)
+        if trabajo.estado != "completado" or not trabajo.archivo:
+            messages.warning(request, "El reporte todavía no está disponible para descargar.")
+            return redirect("dashboard_admin_analisis")
+
+        return FileResponse(
+            trabajo.archivo.open("rb"),
+            as_attachment=True,
+            filename=trabajo.nombre_archivo,
+            content_type=FORMATOS_EXPORTACION[trabajo.formato]["content_type"],
+        )
 
 
 class CalendarioVacunasView(AuthenticatedView):
@@ -1963,6 +2254,10 @@ class RegistrarMascotaView(AuthenticatedView):
             "core/registrar_mascota.html",
             {"form_data": form_data, "foto_subida": foto_subida},
         )
+MIS_CITAS_POR_PAGINA = 10
+MIS_CITAS_PASADAS_POR_PAGINA = 6
+
+
 class MisCitasView(AuthenticatedView):
     def get(self, request, *args, **kwargs):
         user = request.user
@@ -2036,53 +2331,56 @@ class MisCitasView(AuthenticatedView):
             else:
                 queryset = queryset.filter(fecha_solicitada__lte=fecha_hasta)
 
-        queryset = queryset.order_by("-fecha_solicitada", "-fecha_hora")
-
-        citas = list(queryset)
-
         ahora = timezone.now()
-        citas_proximas = []
-        citas_pasadas = []
-        citas_pendientes = []
-        estado_resumen = {estado: 0 for estado, _ in Cita.ESTADOS}
-        sin_veterinario = 0
-
-        for cita in citas:
-            estado_resumen[cita.estado] = estado_resumen.get(cita.estado, 0) + 1
-            if not cita.veterinario_id:
-                sin_veterinario += 1
+        filtro_proximas = Q(fecha_hora__gte=ahora)
+        filtro_pasadas = Q(fecha_hora__lt=ahora)
+        filtro_pendientes = Q(fecha_hora__isnull=True)
+
+        estadisticas = queryset.aggregate(
+            total=Count("id"),
+            programadas=Count("id", filter=Q(estado="programada")),
+            pendientes=Count("id", filter=Q(estado="pendiente")),
+            atendidas=Count("id", filter=Q(estado="atendida")),
+            canceladas=Count("id", filter=Q(estado="cancelada")),
+            sin_veterinario=Count("id", filter=Q(veterinario__isnull=True)),
+            proximas=Count("id", filter=filtro_proximas),
+            sin_horario=Count("id", filter=filtro_pendientes),
+            pasadas=Count("id", filter=filtro_pasadas),
+        )
 
-            if cita.fecha_hora:
-                if cita.fecha_hora >= ahora:
-                    citas_proximas.append(cita)
-                else:
-                    citas_pasadas.append(cita)
-            else:
-                citas_pendientes.append(cita)
+        # Cada sección se pagina con su propio cursor; el prefetch de fármacos
+        # sólo alcanza a las filas de la página pedida.
+        secciones = {}
+        for seccion, filtro, orden, por_pagina in (
+            ("proximas", filtro_proximas, ("fecha_hora", "id"), MIS_CITAS_POR_PAGINA),
+            ("pendientes", filtro_pendientes, ("fecha_solicitada", "id"), MIS_CITAS_POR_PAGINA),
+            ("pasadas", filtro_pasadas, ("-fecha_hora", "-id"), MIS_CITAS_PASADAS_POR_PAGINA),
+        ):
+            pagina = paginar_por_cursor(
+                queryset.filter(filtro),
+                orden,
+                despues=request.GET.get(f"{seccion}_despues"),
+                antes=request.GET.get(f"{seccion}_antes"),
+                por_pagina=por_pagina,
+            )
+            secciones[seccion] = {
+                "citas": pagina["items"],
+                "paginacion": urls_paginacion(
+                    request,
+                    pagina,
+                    despues_param=f"{seccion}_despues",
+                    antes_param=f"{seccion}_antes",
+                ),
+            }
 
         context = {
-            "citas": citas,
-            "citas_proximas": sorted(citas_proximas, key=lambda c: c.fecha_hora),
-            "citas_pendientes": sorted(
-                citas_pendientes,
-                key=lambda c: (
-                    c.fecha_solicitada or timezone.localdate(),
-                    c.paciente.nombre,
-                ),
-            ),
-            "citas_pasadas": sorted(
-                citas_pasadas,
-                key=lambda c: c.fecha_hora,
-                reverse=True,
-            ),
-            "estadisticas_citas": {
-                "total": len(citas),
-                "programadas": estado_resumen.get("programada", 0),
-                "pendientes": estado_resumen.get("pendiente", 0),
-                "atendidas": estado_resumen.get("atendida", 0),
-                "canceladas": estado_resumen.get("cancelada", 0),
-                "sin_veterinario": sin_veterinario,
-            },
+            "citas_proximas": secciones["proximas"]["citas"],
+            "citas_pendientes": secciones["pendientes"]["citas"],
+            "citas_pasadas": secciones["pasadas"]["citas"],
+            "paginacion_proximas": secciones["proximas"]["paginacion"],
+            "paginacion_pendientes": secciones["pendientes"]["paginacion"],
+            "paginacion_pasadas": secciones["pasadas"]["paginacion"],
+            "estadisticas_citas": estadisticas,
             "filtros": {
                 "estado": filtros_estado,
                 "q": filtro_busqueda,
@@ -2327,6 +2625,7 @@ class ListarCitasAdminView(AuthenticatedView):
             "paciente__propietario__user",
             "veterinario",
             "historial_medico",
+            "sucursal",
         )
         queryset = _filtrar_por_sucursal(queryset, request.user)
 
@@ -2371,24 +2670,31 @@ class ListarCitasAdminView(AuthenticatedView):
             else:
                 queryset = queryset.filter(fecha_solicitada__lte=fecha_hasta)
 
-        queryset = queryset.order_by("-fecha_solicitada", "-fecha_hora")
-
-        citas = list(queryset)
-
-        resumen_filtrado = {estado: 0 for estado, _ in Cita.ESTADOS}
-        for cita in citas:
-            resumen_filtrado[cita.estado] = resumen_filtrado.get(cita.estado, 0) + 1
-
-        resumen_global = {estado: 0 for estado, _ in Cita.ESTADOS}
-        for item in queryset.values("estado").annotate(total=Count("id")):
-            resumen_global[item["estado"]] = item["total"]
+        conteos = queryset.aggregate(
+            total=Count("id"),
+            **{
+                estado: Count("id", filter=Q(estado=estado))
+                for estado, _ in Cita.ESTADOS
+            },
+        )
+        total_filtrado = conteos.pop("total")
+        resumen_filtrado = conteos
+        resumen_global = dict(conteos)
+
+        pagina = paginar_por_cursor(
+            queryset,
+            ("-fecha_solicitada", "-fecha_hora", "-id"),
+            despues=request.GET.get("despues"),
+            antes=request.GET.get("antes"),
+        )
+        citas = pagina["items"]
 
-        proximas_citas = [
-            cita
-            for cita in citas
-            if cita.fecha_hora and cita.estado in {"programada", "pendiente"}
-        ]
-        proximas_citas.sort(key=lambda c: c.fecha_hora or timezone.now())
+        proximas_citas = list(
+            queryset.filter(
+                fecha_hora__isnull=False,
+                estado__in=["programada", "pendiente"],
+            ).order_by("fecha_hora")[:5]
+        )
 
         veterinarios = _filtrar_por_sucursal(
             _veterinarios_activos(),
@@ -2413,10 +2719,11 @@ class ListarCitasAdminView(AuthenticatedView):
 
         context = {
             "citas": citas,
-            "total_citas": len(citas),
+            "total_citas": total_filtrado,
+            "paginacion": urls_paginacion(request, pagina),
             "resumen_filtrado": resumen_filtrado,
             "resumen_global": resumen_global,
-            "proximas_citas": proximas_citas[:5],
+            "proximas_citas": proximas_citas,
             "filtros": {
                 "estado": filtro_estado,
                 "veterinario": filtro_veterinario_raw,
@@ -2946,80 +3253,60 @@ class AtenderCitaView(AuthenticatedView):
                     cita.estado = "atendida"
                     cita.save(update_fields=["estado"])
 
-                    if utilizo_farmacos:
-                        existentes = {
-                            admin.farmaco_id: admin
-                            for admin in CitaFarmaco.objects.select_for_update().filter(
-                                cita=cita
-                            )
-                        }
-                        nuevos_map = {fid: cantidad for fid, cantidad in seleccion_post}
-                        ids_para_bloquear = set(existentes.keys()) | set(nuevos_map.keys())
-
-                        if ids_para_bloquear:
-                            farmacos_map = {
-                                farmaco.id: farmaco
-                                for farmaco in Farmaco.objects.select_for_update()
-                                .filter(sucursal=cita.sucursal, id__in=ids_para_bloquear)
-                            }
-
-                            faltantes = ids_para_bloquear - set(farmacos_map.keys())
-                            if faltantes:
-                                raise ValueError(
-                                    "Uno de los fA?rmacos seleccionados ya no pertenece al inventario de la sucursal."
-                                )
-
-                            for fid in ids_para_bloquear:
-                                anterior = existentes.get(fid)
-                                anterior_cantidad = anterior.cantidad if anterior else 0
-                                nueva_cantidad = nuevos_map.get(fid, 0)
-                                delta = nueva_cantidad - anterior_cantidad
-                                if delta > 0 and farmacos_map[fid].stock < delta:
-                                    raise ValueError(
-                                        (
-                                            "Stock insuficiente para {nombre}. Disponible: {disponible}."
-                                        ).format(
-                                            nombre=farmacos_map[fid].nombre,
-                                            disponible=farmacos_map[fid].stock,
-                                        )
-                                    )
-
-                            for fid in ids_para_bloquear:
-                                anterior = existentes.get(fid)
-                                anterior_cantidad = anterior.cantidad if anterior else 0
-                                nueva_cantidad = nuevos_map.get(fid, 0)
-                                delta = nueva_cantidad - anterior_cantidad
-                                if delta:
-                                    Farmaco.objects.filter(
-                                        id=fid, sucursal=cita.sucursal
-                                    ).update(stock=F("stock") - delta)
-
-                            for fid, cantidad in nuevos_map.items():
-                                registro = existentes.get(fid)
-                                if registro:
-                                    if registro.cantidad != cantidad:
-                                        registro.cantidad = cantidad
-                                        registro.save(update_fields=["cantidad"])
-                                else:
-                                    CitaFarmaco.objects.create(
-                                        cita=cita,
-                                        farmaco_id=fid,
-                                        cantidad=cantidad,
-                                    )
-
-                            for fid, registro in existentes.items():
-                                if fid not in nuevos_map:
-                                    registro.delete()
-                    else:
-                        registros_previos = list(
-                            CitaFarmaco.objects.select_for_update().filter(cita=cita)
+                    # Se bloquean sólo las administraciones de esta cita; el
+                    # stock se descuenta con un UPDATE condicional en bloque.
+                    existentes = {
+                        admin.farmaco_id: admin
+                        for admin in CitaFarmaco.objects.select_for_update().filter(cita=cita)
+                    }
+                    nuevos_map = (
+                        {fid: cantidad for fid, cantidad in seleccion_post}
+                        if utilizo_farmacos
+                        else {}
+                    )
+                    deltas = {
+                        fid: (existentes[fid].cantidad if fid in existentes else 0)
+                        - nuevos_map.get(fid, 0)
+                        for fid in set(existentes) | set(nuevos_map)
+                    }
+                    if any(deltas.values()):
+                        aplicar_movimientos(
+                            cita.sucursal_id,
+                            deltas,
+                            motivo_consulta,
+                            cita=cita,
+                            usuario=request.user,
+                        )
+                        invalidar_inventario(cita.sucursal_id)
+
+                    eliminados = [fid for fid in existentes if fid not in nuevos_map]
+                    if eliminados:
+                        CitaFarmaco.objects.filter(cita=cita, farmaco_id__in=eliminados).delete()
+
+                    modificados = []
+                    for fid, cantidad in nuevos_map.items():
+                        registro = existentes.get(fid)
+                        if registro and registro.cantidad != cantidad:
+                            registro.cantidad = cantidad
+                            modificados.append(registro)
+                    if modificados:
+                        CitaFarmaco.objects.bulk_update(modificados, ["cantidad"])
+
+                    nuevos = [
+                        CitaFarmaco(cita=cita, farmaco_id=fid, cantidad=cantidad)
+                        for fid, cantidad in nuevos_map.items()
+                        if fid not in existentes
+                    ]
+                    if nuevos:
+                        CitaFarmaco.objects.bulk_create(nuevos)
+
+                    # Las operaciones en bloque no disparan señales; el día de
+                    # la cita ya lo marcó el guardado de la cita.
+                    if any(deltas.values()):
+                        programar_recalculo(
+                            timezone.localdate(),
+                            *(dia_local(admin.registrado) for admin in existentes.values()),
                         )
-                        if registros_previos:
-                            for registro in registros_previos:
-                                Farmaco.objects.filter(
-                                    id=registro.farmaco_id, sucursal=cita.sucursal
-                                ).update(stock=F("stock") + registro.cantidad)
-                                registro.delete()
 
             except ValueError as error:
                 messages.error(request, str(error))
@@ -3393,20 +3680,13 @@ class BuscarPropietariosView(AuthenticatedView):
         total_encontrados = 0
 
         if q:
-            resultados = (
-                Propietario.objects.select_related("user")
-                .annotate(total_mascotas=Count("paciente", distinct=True))
-                .filter(
-                    Q(user__first_name__icontains=q)
-                    | Q(user__last_name__icontains=q)
-                    | Q(user__username__icontains=q)
-                    | Q(telefono__icontains=q)
-                    | Q(direccion__icontains=q)
-                    | Q(ciudad__icontains=q)
-                )
-                .order_by("user__first_name", "user__last_name")
+            resultados = buscar_propietarios(
+                q,
+                queryset=Propietario.objects.annotate(
+                    total_mascotas=Count("paciente", distinct=True)
+                ),
             )
-            total_encontrados = resultados.count()
+            total_encontrados = len(resultados)
 
         return render(
             request,
@@ -3419,6 +3699,37 @@ class BuscarPropietariosView(AuthenticatedView):
         )
 
 
+AUTOCOMPLETAR_PROPIETARIOS_LIMITE = 8
+
+
+class AutocompletarPropietariosView(AuthenticatedView):
+    def get(self, request, *args, **kwargs):
+        if request.user.rol not in {"ADMIN", "ADMIN_OP"}:
+            return JsonResponse({"error": "No tienes permiso para esta acción."}, status=403)
+
+        try:
+            limite = int(request.GET.get("limite", AUTOCOMPLETAR_PROPIETARIOS_LIMITE))
+        except ValueError:
+            limite = AUTOCOMPLETAR_PROPIETARIOS_LIMITE
+        limite = min(max(limite, 1), 20)
+
+        propietarios = buscar_propietarios(request.GET.get("q", ""), limite=limite)
+        return JsonResponse(
+            {
+                "resultados": [
+                    {
+                        "id": propietario.id,
+                        "nombre": propietario.user.get_full_name() or propietario.user.username,
+                        "telefono": propietario.telefono or propietario.user.telefono,
+                        "ciudad": propietario.ciudad,
+                        "url": reverse("detalle_propietario", args=[propietario.id]),
+                    }
+                    for propietario in propietarios
+                ]
+            }
+        )
+
+
 class DetallePropietarioView(AuthenticatedView):
     def get(self, request, propietario_id, *args, **kwargs):
         if request.user.rol not in {"ADMIN", "ADMIN_OP"}:
@@ -3812,11 +4123,13 @@ class DashboardVeterinariosView(AuthenticatedView):
         if request.user.rol != "ADMIN":
             return redirect("dashboard")
 
-        veterinarios = _filtrar_por_sucursal(
-            User.objects.filter(rol="VET")
-            .select_related("sucursal")
-            .order_by("first_name", "last_name"),
-            request.user,
+        veterinarios = list(
+            _filtrar_por_sucursal(
+                User.objects.filter(rol="VET")
+                .select_related("sucursal")
+                .order_by("first_name", "last_name"),
+                request.user,
+            )
         )
 
         citas_base = _filtrar_por_sucursal(Cita.objects.all(), request.user)
@@ -3872,7 +4185,7 @@ class DashboardVeterinariosView(AuthenticatedView):
             porcentaje_semana = min(100, round((total_semana / total_programadas) * 100))
 
         resumen_global = {
-            "total_veterinarios": veterinarios.count(),
+            "total_veterinarios": len(veterinarios),
             "citas_pendientes": total_pendientes,
             "citas_programadas": total_programadas,
             "citas_atendidas": total_atendidas,
@@ -3885,76 +4198,9 @@ class DashboardVeterinariosView(AuthenticatedView):
             "porcentaje_semana": porcentaje_semana,
         }
 
-        vet_stats = []
-        for vet in veterinarios:
-            citas_totales = citas_base.filter(veterinario=vet).count()
-            citas_programadas = citas_base.filter(
-                veterinario=vet, estado="programada"
-            ).count()
-            citas_pendientes = citas_base.filter(
-                veterinario=vet, estado="pendiente"
-            ).count()
-            citas_atendidas = citas_base.filter(
-                veterinario=vet, estado="atendida"
-            ).count()
-            citas_canceladas = citas_base.filter(
-                veterinario=vet, estado="cancelada"
-            ).count()
-
-            proximas_confirmadas = (
-                citas_base.filter(
-                    veterinario=vet, estado="programada", fecha_hora__isnull=False
-                )
-                .order_by("fecha_hora")[:5]
-            )
-            proximas_sin_horario = (
-                citas_base.filter(
-                    veterinario=vet, estado="programada", fecha_hora__isnull=True
-                )
-                .order_by("fecha_solicitada")[:5]
-            )
-            proximas_citas = list(chain(proximas_confirmadas, proximas_sin_horario))[:5]
-
-            nombre_completo = vet.get_full_name() or vet.username
-            iniciales = "".join(parte[0] for parte in nombre_completo.split() if parte)[:2]
-            if not iniciales:
-                iniciales = (vet.username[:2] or "VF").upper()
-            else:
-                iniciales = iniciales.upper()
-
-            citas_en_proceso = citas_programadas + citas_pendientes
-            tasa_atencion = 0
-            if citas_programadas + citas_atendidas:
-                tasa_atencion = round(
-                    (citas_atendidas / (citas_programadas + citas_atendidas)) * 100
-                )
-
-            citas_semana_vet = citas_base.filter(
-                veterinario=vet,
-                estado="programada",
-                fecha_hora__isnull=False,
-                fecha_hora__gte=ahora,
-                fecha_hora__lte=fin_semana,
-            ).count()
-
-            vet_stats.append(
-                {
-                    "veterinario": vet,
-                    "citas_totales": citas_totales,
-                    "citas_programadas": citas_programadas,
-                    "citas_pendientes": citas_pendientes,
-                    "citas_atendidas": citas_atendidas,
-                    "citas_canceladas": citas_canceladas,
-                    "citas_en_proceso": citas_en_proceso,
-                    "citas_semana": citas_semana_vet,
-                    "proximas_citas": proximas_citas,
-                    "tasa_atencion": tasa_atencion,
-                    "iniciales": iniciales,
-                    "nombre_completo": nombre_completo,
-                    "sucursal": vet.sucursal,
-                    "sucursal_nombre": vet.sucursal.nombre if vet.sucursal else "",
-                }
-            )
+        vet_stats = _estadisticas_veterinarios(
+            veterinarios, citas_base, ahora, fin_semana
+        )
 
         max_carga = max((stat["citas_en_proceso"] for stat in vet_stats), default=0)
         for stat in vet_stats:
@@ -3994,6 +4240,7 @@ class InventarioFarmacosVeterinarioView(AuthenticatedView):
                     "ultima_actualizacion": None,
                 },
                 "criticos": [],
+                "en_riesgo": [],
             }
             return render(request, "core/inventario_farmacos_vet.html", contexto)
 
@@ -4019,29 +4266,36 @@ class InventarioFarmacosVeterinarioView(AuthenticatedView):
                 farmaco for farmaco in farmacos_filtrados if farmaco.categoria == categoria
             ]
 
-        categorias_filtradas = []
-        for codigo, etiqueta in Farmaco.Categoria.choices:
-            items = [farmaco for farmaco in farmacos_filtrados if farmaco.categoria == codigo]
-            if items:
-                categorias_filtradas.append(
-                    {
-                        "codigo": codigo,
-                        "nombre": etiqueta,
-                        "total_items": len(items),
-                        "total_stock": sum(item.stock for item in items),
-                        "items": items,
-                    }
-                )
+        if farmacos_filtrados is farmacos:
+            categorias_filtradas = resumen["categorias"]
+            totales = {
+                "total_items": resumen["total_items"],
+                "total_stock": resumen["total_stock"],
+                "ultima_actualizacion": resumen["ultima_actualizacion"],
+            }
+            criticos = resumen["criticos"]
+            en_riesgo = resumen["en_riesgo"]
+        else:
+            categorias_filtradas = agrupar_por_categoria(farmacos_filtrados)
+            totales = {
+                "total_items": len(farmacos_filtrados),
+                "total_stock": sum(item.stock for item in farmacos_filtrados),
+                "ultima_actualizacion": resumen["ultima_actualizacion"],
+            }
+            criticos = [
+                farmaco for farmaco in farmacos_filtrados if farmaco.bajo_minimo
+            ]
+            ids_filtrados = {farmaco.id for farmaco in farmacos_filtrados}
+            en_riesgo = [
+                alerta for alerta in resumen["en_riesgo"] if alerta.farmaco_id in ids_filtrados
+            ]
 
         contexto = {
             "sucursal": sucursal,
             "inventario": categorias_filtradas,
-            "totales": {
-                "total_items": len(farmacos_filtrados),
-                "total_stock": sum(item.stock for item in farmacos_filtrados),
-                "ultima_actualizacion": resumen["ultima_actualizacion"],
-            },
-            "criticos": [farmaco for farmaco in farmacos_filtrados if farmaco.stock <= 5],
+            "totales": totales,
+            "criticos": criticos,
+            "en_riesgo": en_riesgo,
             "categorias_disponibles": Farmaco.Categoria.choices,
             "filtros": {"q": query, "categoria": categoria},
             "hay_filtros": bool(query or categoria),
@@ -4070,11 +4324,19 @@ class DashboardVeterinariosIndicadoresView(AuthenticatedView):
             .order_by("-fecha_solicitada")
         )
 
-        total_periodo = citas_periodo.count()
-        total_pendientes = citas_periodo.filter(estado="pendiente").count()
-        total_programadas = citas_periodo.filter(estado="programada").count()
-        total_atendidas = citas_periodo.filter(estado="atendida").count()
-        total_canceladas = citas_periodo.filter(estado="cancelada").count()
+        totales_periodo = citas_periodo.order_by().aggregate(
+            total=Count("id"),
+            pendientes=Count("id", filter=Q(estado="pendiente")),
+            programadas=Count("id", filter=Q(estado="programada")),
+            atendidas=Count("id", filter=Q(estado="atendida")),
+            canceladas=Count("id", filter=Q(estado="cancelada")),
+            sin_veterinario=Count("id", filter=Q(veterinario__isnull=True)),
+        )
+        total_periodo = totales_periodo["total"]
+        total_pendientes = totales_periodo["pendientes"]
+        total_programadas = totales_periodo["programadas"]
+        total_atendidas = totales_periodo["atendidas"]
+        total_canceladas = totales_periodo["canceladas"]
 
         tasa_resolucion = 0
         if total_periodo:
@@ -4090,36 +4352,16 @@ class DashboardVeterinariosIndicadoresView(AuthenticatedView):
         if total_periodo:
             tasa_cancelacion = round((total_canceladas / total_periodo) * 100, 1)
 
-        tiempos_confirmacion = []
-        for cita in citas_periodo.filter(fecha_hora__isnull=False):
-            fecha_confirmada = timezone.localtime(cita.fecha_hora).date()
-            delta = (fecha_confirmada - cita.fecha_solicitada).days
-            if delta >= 0:
-                tiempos_confirmacion.append(delta)
-
-        promedio_confirmacion = 0
-        if tiempos_confirmacion:
-            promedio_confirmacion = round(sum(tiempos_confirmacion) / len(tiempos_confirmacion), 1)
-
-        serie_diaria = []
-        for offset in range(6, -1, -1):
-            dia = ahora.date() - timedelta(days=offset)
-            serie_diaria.append(
-                {
-                    "fecha": dia,
-                    "label": dia.strftime("%d/%m"),
-                    "solicitadas": citas_totales.filter(fecha_solicitada=dia).count(),
-                    "programadas": citas_totales.filter(
-                        estado="programada", fecha_hora__date=dia
-                    ).count(),
-                    "atendidas": citas_totales.filter(
-                        estado="atendida", fecha_hora__date=dia
-                    ).count(),
-                    "canceladas": citas_totales.filter(
-                        estado="cancelada", fecha_hora__date=dia
-                    ).count(),
-                }
-            )
+        promedio_confirmacion = _promedio_confirmacion_dias(citas_periodo)
+
+        serie_dias, serie_granularidad = _parametros_serie(request.GET)
+        hoy = timezone.localdate()
+        serie_diaria = _serie_temporal_citas(
+            citas_totales,
+            hoy - timedelta(days=serie_dias - 1),
+            hoy,
+            serie_granularidad,
+        )
 
         tipos_mas_demandados_qs = (
             citas_periodo.values("tipo")
@@ -4169,7 +4411,7 @@ class DashboardVeterinariosIndicadoresView(AuthenticatedView):
             .order_by("fecha_hora")[:6]
         )
 
-        citas_sin_veterinario = citas_periodo.filter(veterinario__isnull=True).count()
+        citas_sin_veterinario = totales_periodo["sin_veterinario"]
 
         contexto = {
             "resumen": {
@@ -4187,6 +4429,14 @@ class DashboardVeterinariosIndicadoresView(AuthenticatedView):
                 "fin_periodo": fin_periodo,
             },
             "serie_diaria": serie_diaria,
+            "serie_dias": serie_dias,
+            "serie_granularidad": serie_granularidad,
+            "serie_ventanas": SERIE_VENTANAS_DIAS,
+            "serie_granularidades": [
+                ("dia", "Diaria"),
+                ("semana", "Semanal"),
+                ("mes", "Mensual"),
+            ],
             "tipos_mas_demandados": tipos_mas_demandados,
             "veterinarios_performance": veterinarios_performance,
             "propietarios_top": propietarios_top,
@@ -4199,6 +4449,32 @@ class DashboardVeterinariosIndicadoresView(AuthenticatedView):
             "core/dashboard_veterinarios_indicadores.html",
             contexto,
         )
+
+
+class SerieIndicadoresVeterinariosView(AuthenticatedView):
+    """Serie temporal de citas en JSON para los gráficos de indicadores."""
+
+    def get(self, request, *args, **kwargs):
+        if request.user.rol not in {"ADMIN", "ADMIN_OP", "VET"}:
+            return JsonResponse({"error": "Acceso restringido."}, status=403)
+
+        dias, granularidad = _parametros_serie(request.GET)
+        hoy = timezone.localdate()
+        citas_totales = _filtrar_por_sucursal(Cita.objects.all(), request.user)
+        serie = _serie_temporal_citas(
+            citas_totales,
+            hoy - timedelta(days=dias - 1),
+            hoy,
+            granularidad,
+        )
+        for punto in serie:
+            punto["fecha"] = punto["fecha"].isoformat()
+
+        return JsonResponse(
+            {"dias": dias, "granularidad": granularidad, "serie": serie}
+        )
+
+
 class HistorialMedicoVetView(AuthenticatedView):
     def get(self, request, *args, **kwargs):
         if request.user.rol not in {"ADMIN", "VET"}:
@@ -4216,41 +4492,28 @@ class HistorialMedicoVetView(AuthenticatedView):
             "cita",
         )
 
-        if query:
-            historiales = historiales.filter(
-                Q(paciente__nombre__icontains=query)
-                | Q(paciente__propietario__user__first_name__icontains=query)
-                | Q(paciente__propietario__user__last_name__icontains=query)
-                | Q(diagnostico__icontains=query)
-            )
-
         if fecha_desde:
             historiales = historiales.filter(fecha__date__gte=fecha_desde)
         if fecha_hasta:
             historiales = historiales.filter(fecha__date__lte=fecha_hasta)
 
-        historiales = historiales.order_by("-fecha")
+        if query:
+            # Ordena por relevancia (índice de texto completo) en lugar de fecha.
+            historiales = buscar_historiales(historiales, query)
+        else:
+            historiales = historiales.order_by("-fecha")
 
-        total_historiales = historiales.count()
         ahora = timezone.now()
-        hace_7_dias = ahora - timedelta(days=7)
-        hace_30_dias = ahora - timedelta(days=30)
-
-        historiales_semana = historiales.filter(fecha__gte=hace_7_dias).count()
-        historiales_mes = historiales.filter(fecha__gte=hace_30_dias).count()
-        historiales_sin_cita = historiales.filter(cita__isnull=True).count()
-        pacientes_activos = (
-            historiales.values("paciente_id").distinct().count()
-        )
-        veterinarios_activos = (
-            historiales.exclude(veterinario__isnull=True)
-            .values("veterinario_id")
-            .distinct()
-            .count()
+        resumen = historiales.aggregate(
+            total=Count("id"),
+            semana=Count("id", filter=Q(fecha__gte=ahora - timedelta(days=7))),
+            mes=Count("id", filter=Q(fecha__gte=ahora - timedelta(days=30))),
+            sin_cita=Count("id", filter=Q(cita__isnull=True)),
+            pacientes=Count("paciente_id", distinct=True),
+            veterinarios=Count("veterinario_id", distinct=True),
+            ultima_actualizacion=Max("fecha"),
         )
 
-        ultima_actualizacion = historiales.first().fecha if total_historiales else None
-
         especies_destacadas = (
             historiales.values("paciente__especie")
             .annotate(total=Count("id"))
@@ -4268,22 +4531,14 @@ class HistorialMedicoVetView(AuthenticatedView):
             .order_by("-total")[:6]
         )
 
-        ultimos_historiales = historiales[:5]
+        ultimos_historiales = historiales.order_by("-fecha")[:5]
 
         contexto = {
             "historiales": historiales,
             "query": query,
             "fecha_desde": fecha_desde,
             "fecha_hasta": fecha_hasta,
-            "resumen": {
-                "total": total_historiales,
-                "semana": historiales_semana,
-                "mes": historiales_mes,
-                "sin_cita": historiales_sin_cita,
-                "pacientes": pacientes_activos,
-                "veterinarios": veterinarios_activos,
-                "ultima_actualizacion": ultima_actualizacion,
-            },
+            "resumen": resumen,
             "especies_destacadas": especies_destacadas,
             "profesionales_destacados": profesionales_destacados,
             "ultimos_historiales": ultimos_historiales,
@@ -4440,15 +4695,12 @@ class RegistroPropietarioView(PublicView):
         password2 = request.POST.get("password2")
 
         errores = []
-        telefono_normalizado = _solo_digitos_telefono(telefono)
+        telefono_normalizado = solo_digitos_telefono(telefono)
 
         def telefono_duplicado(queryset):
-            if not telefono:
+            if not telefono_normalizado:
                 return False
-            filtros = Q(telefono__iexact=telefono)
-            if telefono_normalizado and telefono_normalizado != telefono:
-                filtros |= Q(telefono=telefono_normalizado)
-            return queryset.filter(filtros).exists()
+            return queryset.filter(telefono_normalizado=telefono_normalizado).exists()
 
         if password1 != password2:
             errores.append("Las contrasenas no coinciden.")
@@ -4456,7 +4708,7 @@ class RegistroPropietarioView(PublicView):
             errores.append("El usuario ya existe.")
         if email and User.objects.filter(email__iexact=email).exists():
             errores.append("El email ya esta registrado.")
-        if telefono and (
+        if telefono_normalizado and (
             telefono_duplicado(User.objects.all())
             or telefono_duplicado(Propietario.objects.all())
         ):
@@ -4562,12 +4814,10 @@ class ConfiguracionPerfilView(AuthenticatedView):
                 conflictos = True
 
             telefono = (datos.get("telefono") or "").strip()
-            telefono_normalizado = _solo_digitos_telefono(telefono)
+            telefono_normalizado = solo_digitos_telefono(telefono)
 
-            if telefono:
-                filtros = Q(telefono__iexact=telefono)
-                if telefono_normalizado and telefono_normalizado != telefono:
-                    filtros |= Q(telefono=telefono_normalizado)
+            if telefono_normalizado:
+                filtros = Q(telefono_normalizado=telefono_normalizado)
 
                 conflicto_usuarios = (
                     User.objects.exclude(pk=user.pk).filter(filtros).exists()
@@ -4631,3 +4881,26 @@ class ConfiguracionPerfilView(AuthenticatedView):
                 "propietario": propietario,
             },
         )
+
+
+class MetricasInstrumentacionView(AuthenticatedView):
+    """Resumen en JSON de las métricas por vista (ver Core/instrumentacion.py)."""
+
+    def _permitido(self, usuario):
+        return usuario.is_superuser or usuario.rol == "ADMIN"
+
+    def get(self, request, *args, **kwargs):
+        if not self._permitido(request.user):
+            return JsonResponse({"error": "Acceso restringido."}, status=403)
+        return JsonResponse(
+            {
+                "activa": getattr(settings, "INSTRUMENTACION_ACTIVA", False),
+                "rutas": registro_metricas.resumen(),
+            }
+        )
+
+    def post(self, request, *args, **kwargs):
+        if not self._permitido(request.user):
+            return JsonResponse({"error": "Acceso restringido."}, status=403)
+        registro_metricas.reiniciar()
+        return JsonResponse({"reiniciado": True})
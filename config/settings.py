@@ -42,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero, para medir también el resto de los middlewares.
+    'Core.instrumentacion.InstrumentacionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,6 +53,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Métricas por vista (tiempo, consultas, duplicadas). Apagado por defecto; el
+# resumen queda en /metricas/instrumentacion/ para administradores.
+INSTRUMENTACION_ACTIVA = False
+INSTRUMENTACION_SERVER_TIMING = False
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -123,6 +130,11 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Reportes exportados: fuera de MEDIA_ROOT, sólo se descargan a través de
+# la vista (ver Core.models.AlmacenamientoExportaciones).
+EXPORTACIONES_ROOT = BASE_DIR / "exportaciones"
+EXPORTACIONES_RETENCION_DIAS = 7
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,28 @@
+"""Perfil de settings para correr los tests.
+
+Uso::
+
+    python manage.py test --settings=config.settings_pruebas
+
+PBKDF2 está pensado para ser lento y cada ``create_user`` o ``login`` paga
+cientos de milisegundos de CPU. Acá las contraseñas nuevas se hashean con
+MD5, que no sirve para producción; PBKDF2 sigue habilitado para verificar
+hashes existentes, que al iniciar sesión Django convierte a MD5. Como los
+settings normales no aceptan MD5, el perfil usa su propia base,
+``db_pruebas.sqlite3``, para que esos hashes nunca lleguen a ``db.sqlite3``.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db_pruebas.sqlite3",
+    }
+}
+
+PASSWORD_HASHERS = [
+    "django.contrib.auth.hashers.MD5PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+]